@@ -0,0 +1,58 @@
+import subprocess
+import unittest
+
+from validation_framework.deployer.target_device.batch import build_batch_script, parse_batch_output
+
+
+def _output(token: str, index: int, out: str, err: str, exit_code: int, start: float, end: float) -> tuple[str, str]:
+    return (f'__VF_BEGIN_{token}_{index}__\n{out}\n__VF_END_{token}_{index}_{exit_code}_{start}_{end}__\n',
+            f'__VF_BEGIN_{token}_{index}__\n{err}\n__VF_END_{token}_{index}__\n')
+
+
+class TestParseBatchOutput(unittest.TestCase):
+
+    def test_results_split_by_markers(self):
+        commands = ['uname', 'cat /missing', 'false']
+        first = _output('abc', 0, 'Linux', '', 0, 100.5, 100.75)
+        second = _output('abc', 1, 'line 1\nline 2', 'No such file', -2, 101, 103.5)
+        results = parse_batch_output(commands, 'abc', first[0] + second[0], first[1] + second[1])
+
+        self.assertEqual([r.command for r in results], commands)
+        self.assertEqual([r.exit_code for r in results], [0, -2, None])
+        self.assertEqual(results[0].stdout, 'Linux')
+        self.assertEqual(results[0].duration, 0.25)
+        self.assertEqual((results[1].stdout, results[1].stderr), ('line 1\nline 2', 'No such file'))
+        self.assertTrue(results[1].failed)
+        self.assertTrue(results[2].skipped)
+
+    def test_markers_of_other_batches_are_ignored(self):
+        stdout, stderr = _output('other', 0, 'Linux', '', 0, 1, 2)
+        self.assertTrue(parse_batch_output(['uname'], 'abc', stdout, stderr)[0].skipped)
+
+    def test_missing_stderr(self):
+        stdout, _ = _output('abc', 0, 'Linux', '', 0, 1, 2)
+        result = parse_batch_output(['uname'], 'abc', stdout, '')[0]
+        self.assertEqual((result.exit_code, result.stderr), (0, ''))
+
+
+class TestBatchScript(unittest.TestCase):
+
+    def run_batch(self, commands: list[str], stop_on_failure: bool):
+        command, token = build_batch_script(commands, stop_on_failure)
+        process = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=30)
+        return parse_batch_output(commands, token, process.stdout, process.stderr)
+
+    def test_round_trip(self):
+        results = self.run_batch(['echo out; echo err >&2', 'exit 3', 'printf "a\\nb\\n"'], False)
+        self.assertEqual([r.exit_code for r in results], [0, 3, 0])
+        self.assertEqual((results[0].stdout, results[0].stderr), ('out\n', 'err\n'))
+        self.assertEqual(results[2].stdout, 'a\nb\n')
+        self.assertTrue(all(r.duration >= 0 for r in results))
+
+    def test_stop_on_failure(self):
+        results = self.run_batch(['true', 'false', 'echo never'], True)
+        self.assertEqual([r.exit_code for r in results], [0, 1, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
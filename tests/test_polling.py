@@ -0,0 +1,75 @@
+import unittest
+
+from validation_framework.common.metrics import metrics
+from validation_framework.common.polling import poll_until
+
+
+class _Probe:
+    """
+    Returns the given values in order, raising the exceptions among them
+    """
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+
+    def __call__(self):
+        value = self.values[min(self.calls, len(self.values) - 1)]
+        self.calls += 1
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+class TestPollUntil(unittest.TestCase):
+
+    def setUp(self):
+        metrics.start_scope(self.id())
+
+    def tearDown(self):
+        metrics.end_scope()
+
+    def poll(self, probe, **kwargs):
+        kwargs.setdefault('timeout', 5)
+        return poll_until(probe, name='test', interval=0.001, max_interval=0.005, jitter=0, **kwargs)
+
+    def test_condition(self):
+        result = self.poll(_Probe('', '', 'ready'))
+        self.assertTrue(result)
+        self.assertEqual((result.value, result.attempts, result.aborted), ('ready', 3, False))
+
+    def test_terminal_value(self):
+        probe = _Probe('PENDING', 'FAILED', 'SUCCESS')
+        result = self.poll(probe, condition=lambda v: v == 'SUCCESS', terminal=lambda v: v == 'FAILED')
+        self.assertFalse(result)
+        self.assertTrue(result.aborted)
+        self.assertEqual((result.value, probe.calls), ('FAILED', 2))
+        self.assertEqual(metrics.end_scope()['counters'], {'test.aborted': 1})
+
+    def test_timeout(self):
+        result = self.poll(_Probe(False), timeout=0.05)
+        self.assertFalse(result)
+        self.assertFalse(result.aborted)
+        self.assertGreater(result.attempts, 1)
+        self.assertGreaterEqual(result.elapsed, 0.05)
+        self.assertEqual(metrics.end_scope()['counters'], {'test.timeouts': 1})
+
+    def test_handled_errors(self):
+        result = self.poll(_Probe(ConnectionError('down'), ConnectionError('down'), 'up'), errors=(ConnectionError,))
+        self.assertTrue(result)
+        self.assertEqual((result.value, result.attempts, result.error), ('up', 3, None))
+
+    def test_last_error_is_kept(self):
+        error = ConnectionError('down')
+        result = self.poll(_Probe(error), timeout=0.02, errors=(ConnectionError,))
+        self.assertFalse(result)
+        self.assertIs(result.error, error)
+        self.assertIsNone(result.value)
+
+    def test_other_errors_are_raised(self):
+        with self.assertRaises(ValueError):
+            self.poll(_Probe(ValueError('bad')), errors=(ConnectionError,))
+
+
+if __name__ == '__main__':
+    unittest.main()
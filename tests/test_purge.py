@@ -0,0 +1,32 @@
+import unittest
+
+from validation_framework.deployer.coe.purge import PurgeReport
+
+
+class TestPurgeReport(unittest.TestCase):
+
+    def test_removed_resources(self):
+        report = PurgeReport.from_output('nuvlaedge_validator_0',
+                                         'container agent\ncontainer job-engine\n  volume data  \n',
+                                         '', 1.234)
+        self.assertEqual(report.removed, {'container': ['agent', 'job-engine'], 'volume': ['data']})
+        self.assertEqual(report.duration, 1.23)
+
+    def test_blank_names_are_ignored(self):
+        report = PurgeReport.from_output('p', 'network\nnetwork \n\n   \nnetwork default\n', '', 0)
+        self.assertEqual(report.removed, {'network': ['default']})
+
+    def test_time_lines(self):
+        report = PurgeReport.from_output('p', 'time release/nuvlaedge 12.5\ntime namespace/nuvlaedge\n'
+                                              'namespace nuvlaedge\n', '', 0)
+        self.assertEqual(report.timings, {'release/nuvlaedge': 12.5, 'namespace/nuvlaedge': 0.0})
+        self.assertEqual(report.removed, {'namespace': ['nuvlaedge']})
+
+    def test_errors(self):
+        report = PurgeReport.from_output('p', '', 'Error: no such volume\n\n  \nError: in use\n', 0)
+        self.assertEqual(report.errors, ['Error: no such volume', 'Error: in use'])
+        self.assertIn('2 errors', report.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from validation_framework.validators.scheduler import (DEFAULT_DURATION, DurationHistory, TestRequirements,
+                                                       schedule, transitions)
+
+
+class TestDurationHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / 'target.json'
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_unknown_validator_expects_default(self):
+        history = DurationHistory(self.path)
+        self.assertEqual(history.expected('A'), DEFAULT_DURATION)
+
+    def test_first_measurement_is_taken_as_is(self):
+        history = DurationHistory(self.path)
+        history.record('A', 100)
+        self.assertEqual(history.expected('A'), 100)
+
+    def test_measurements_are_smoothed(self):
+        history = DurationHistory(self.path, smoothing=0.25)
+        history.record('A', 100)
+        history.record('A', 200)
+        self.assertAlmostEqual(history.expected('A'), 0.25 * 200 + 0.75 * 100)
+
+    def test_saved_history_is_loaded(self):
+        history = DurationHistory(self.path)
+        history.record('A', 42)
+        history.save()
+        self.assertEqual(DurationHistory(self.path).expected('A'), 42)
+        self.assertEqual(list(self.path.parent.iterdir()), [self.path])
+
+    def test_unreadable_history_is_empty(self):
+        self.path.write_text('{"A": 4')
+        with self.assertLogs('validation_framework.validators.scheduler', 'WARNING'):
+            history = DurationHistory(self.path)
+        self.assertEqual(history.expected('A'), DEFAULT_DURATION)
+
+
+class TestSchedule(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.history = DurationHistory(Path(self.folder.name) / 'target.json')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def durations(self, **seconds: float):
+        for name, value in seconds.items():
+            self.history.record(name, value)
+
+    def test_other_coe_is_skipped(self):
+        plan = schedule({'A': TestRequirements(),
+                         'K': TestRequirements(coe='kubernetes'),
+                         'D': TestRequirements(coe='docker')}, self.history, 'docker')
+        self.assertEqual(plan.skipped, ['K'])
+        self.assertCountEqual(plan.sequential, ['A', 'D'])
+
+    def test_concurrent_split(self):
+        self.durations(A=10, B=30, C=20)
+        plan = schedule({'R': TestRequirements(reboots=True),
+                         'A': TestRequirements(),
+                         'X': TestRequirements(exclusive=True),
+                         'B': TestRequirements(),
+                         'C': TestRequirements()}, self.history, 'docker', max_engines=2)
+        self.assertEqual(plan.concurrent, ['B', 'C', 'A'])
+        # Device disrupting validators run alone, reboots last
+        self.assertEqual(plan.sequential, ['X', 'R'])
+
+    def test_single_engine_runs_everything_sequentially(self):
+        plan = schedule({'R': TestRequirements(reboots=True),
+                         'A': TestRequirements(),
+                         'X': TestRequirements(exclusive=True)}, self.history, 'docker')
+        self.assertEqual(plan.concurrent, [])
+        self.assertEqual(plan.sequential, ['A', 'X', 'R'])
+
+    def test_engine_configurations_are_grouped(self):
+        self.durations(A=10, B=20, U=5, N=1)
+        plan = schedule({'U': TestRequirements(version='releases'),
+                         'A': TestRequirements(destroys_state=False),
+                         'N': TestRequirements(peripherals=('Network',)),
+                         'B': TestRequirements()}, self.history, 'docker')
+        # Version under validation first, engines kept by non-destructive validators reused
+        self.assertEqual(plan.sequential, ['A', 'B', 'N', 'U'])
+
+    def test_expected_duration(self):
+        self.durations(A=10, B=20)
+        plan = schedule({'A': TestRequirements(), 'B': TestRequirements()}, self.history, 'docker')
+        self.assertEqual(plan.expected, 30)
+
+
+class TestTransitions(unittest.TestCase):
+
+    def test_shared_engines_save_installs(self):
+        requirements = {'A': TestRequirements(destroys_state=False),
+                        'B': TestRequirements(destroys_state=False),
+                        'U': TestRequirements(version='releases'),
+                        'R': TestRequirements(reboots=True)}
+        shared = transitions(['A', 'B', 'U', 'R'], requirements, shared_engine=True)
+        self.assertEqual((shared.installs, shared.version_changes, shared.reboots), (3, 2, 1))
+        isolated = transitions(['A', 'B', 'U', 'R'], requirements, shared_engine=False)
+        self.assertEqual(isolated.installs, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,11 @@ Validator entrypoint python script
 import argparse
 import io
 import json
+import multiprocessing
+import queue
 import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
 from datetime import datetime
 import logging
 import time
@@ -19,7 +23,13 @@ import xml.etree.ElementTree as ET
 from validation_framework.common import utils
 from validation_framework.common.schemas.target_device import TargetDeviceConfig
 import validation_framework.common.constants as cte
-from validation_framework.common.logging_config import config_logger
+from validation_framework.deployer.chart_cache import chart_cache
+from validation_framework.deployer.coe.image_cache import image_cache
+from validation_framework.deployer.compose_cache import compose_cache
+from validation_framework.common.logging_config import config_logger, config_target_logger
+from validation_framework.common.thread_streams import ThreadCapturingResult, thread_streams
+from validation_framework.validators.scheduler import DurationHistory, Schedule, TestRequirements, schedule
+from validation_framework.validators.shared_engine import shared_engines
 from validation_framework.validators.validation_base import ParametrizedTests
 
 # Dynamically import validators
@@ -32,6 +42,51 @@ exit_code: int = 0
 active_validators: dict = {}
 
 
+@dataclass
+class TargetOutcome:
+    """
+    Result of the validation of a target device
+    """
+    target: str
+    exit_code: int
+    tests: int = 0
+    failures: int = 0
+    errors: int = 0
+    skipped: int = 0
+    elapsed: float = 0
+    log_file: str = ''
+    # Error preventing the validation of the target, if any
+    error: str = ''
+
+
+def target_name(target: str) -> str:
+    """
+    :param target: Target device configuration file (e.g. rpi4_docker.toml)
+    :return: Target name (e.g. rpi4_docker)
+    """
+    return Path(target).stem
+
+
+def resolve_targets(arguments: argparse.Namespace) -> list[str]:
+    """
+    :return: Target device configuration files of the run. --targets entries may be
+    glob patterns, relative to the devices configuration folder
+    """
+    targets: list[str] = []
+    for pattern in arguments.targets or [arguments.target]:
+        if any(c in pattern for c in '*?['):
+            matches: list[str] = sorted(str(f.relative_to(cte.DEVICE_CONFIG_PATH))
+                                        for f in cte.DEVICE_CONFIG_PATH.glob(pattern) if f.is_file())
+            if not matches:
+                raise ValueError(f'No target configuration matching {pattern} in {cte.DEVICE_CONFIG_PATH}')
+            targets.extend(matches)
+        elif pattern:
+            targets.append(pattern)
+    if not targets:
+        raise ValueError('No target provided, use --target or --targets')
+    return list(dict.fromkeys(targets))
+
+
 def parse_results(results: list[io.BytesIO]) -> list[tuple[bytes, dict]]:
     """
     Converts a bytes stream xml formatted into a dict
@@ -49,42 +104,124 @@ def parse_results(results: list[io.BytesIO]) -> list[tuple[bytes, dict]]:
     return parsed_data
 
 
-def run_test_on_device(arguments: argparse.Namespace, validator: callable) -> list[io.BytesIO]:
-    # Results holder
-    test_results: list[io.BytesIO] = []
+def build_suite(arguments: argparse.Namespace, validator: callable, name: str, target: str,
+                project_name: str = cte.PROJECT_NAME) -> unittest.TestSuite:
+    """
+    :param arguments: Parsed arguments
+    :param validator: Validator getter
+    :param name: Validator name
+    :param target: Target device configuration file
+    :param project_name: Project of the engines of the tests
+    :return: The suite of the validator tests
+    """
+    suite = unittest.TestSuite()
+    suite.addTest(ParametrizedTests.parametrize(validator(name),
+                                                target_device_config=target,
+                                                nuvla_api_key=arguments.key,
+                                                nuvla_api_secret=arguments.secret,
+                                                nuvlaedge_version=arguments.nuvlaedge_version,
+                                                nuvlaedge_branch=arguments.nuvlaedge_branch,
+                                                deployment_branch=arguments.deployment_branch,
+                                                retrieve_logs=arguments.retrieve_logs,
+                                                project_name=project_name))
+    return suite
+
+
+def run_suite(suite: unittest.TestSuite) -> io.BytesIO:
+    """
+    :return: The XML report of the suite
+    """
+    test_report: io.BytesIO = io.BytesIO()
+    runner = xmlrunner.XMLTestRunner(output=test_report, verbosity=1, resultclass=ThreadCapturingResult)
+    runner.run(suite)
+    return test_report
+
+
+def run_validator(arguments: argparse.Namespace, validator: callable, name: str, target: str,
+                  history: DurationHistory, project_name: str = cte.PROJECT_NAME) -> io.BytesIO:
+    """
+    Runs a validator, recording its duration in the history of the target
+    :return: The XML report of the validator
+    """
+    start: float = time.monotonic()
+    try:
+        return run_suite(build_suite(arguments, validator, name, target, project_name))
+    finally:
+        history.record(name, time.monotonic() - start)
+
+
+def run_concurrent_suites(arguments: argparse.Namespace, validator: callable, names: list[str], target: str,
+                          max_engines: int, history: DurationHistory) -> dict[str, io.BytesIO]:
+    """
+    Runs the validators concurrently in the same device, up to max_engines at once and in
+    the given order. Each running validator holds an engine slot, its engines being
+    isolated in the compose project (or Helm release) of the slot
+    :return: Validator name: XML report
+    """
+    slots: queue.Queue = queue.Queue()
+    for slot in range(1, max_engines + 1):
+        slots.put(slot)
 
+    def run_in_slot(name: str) -> io.BytesIO:
+        slot: int = slots.get()
+        try:
+            logger.info(f'Running {name} in engine slot {slot} of {target}')
+            return run_validator(arguments, validator, name, target, history,
+                                 cte.TENANT_PROJECT_NAME.format(slot=slot))
+        finally:
+            slots.put(slot)
+
+    # Each slot captures the output of its own tests
+    with thread_streams(), ThreadPoolExecutor(max_workers=max_engines, thread_name_prefix='engine') as pool:
+        return dict(zip(names, pool.map(run_in_slot, names)))
+
+
+def run_test_on_device(arguments: argparse.Namespace, validator: callable, target: str | None = None) -> list[io.BytesIO]:
     # Target version
-    device_config_file: str = arguments.target
+    device_config_file: str = target or arguments.target
     device_config: TargetDeviceConfig = utils.get_model_from_toml(TargetDeviceConfig, cte.DEVICE_CONFIG_PATH / device_config_file)
 
-    for name, v in active_validators.items():
+    requirements: dict[str, TestRequirements] = {}
+    for name in active_validators:
         if name in device_config.excluded_tests:
             logger.info(f"Skipping test {name} for device: {device_config.alias}")
             continue
-
-        test_report: io.BytesIO = io.BytesIO()
-        runner = xmlrunner.XMLTestRunner(output=test_report, verbosity=1)
-
-        suite = unittest.TestSuite()
-        suite.addTest(ParametrizedTests.parametrize(validator(name),
-                                                    target_device_config=device_config_file,
-                                                    nuvla_api_key=arguments.key,
-                                                    nuvla_api_secret=arguments.secret,
-                                                    nuvlaedge_version=arguments.nuvlaedge_version,
-                                                    nuvlaedge_branch=arguments.nuvlaedge_branch,
-                                                    deployment_branch=arguments.deployment_branch,
-                                                    retrieve_logs=arguments.retrieve_logs))
-        result = runner.run(suite)
-        test_results.append(test_report)
-    return test_results
-
-
-def save_results(results: list, target_device: str, test_type: str) -> list:
+        requirements[name] = validator(name).requirements()
+
+    # Validators are ordered to minimize the engine installations, version changes and
+    # reboots, the longest first. Those disrupting the whole device run alone at the end
+    history: DurationHistory = DurationHistory(cte.DURATIONS_PATH / f'{target_name(device_config_file)}.json')
+    plan: Schedule = schedule(requirements, history, device_config.coe,
+                              max_engines=device_config.max_concurrent_engines,
+                              shared_engine=shared_engines.enabled)
+    for name in plan.skipped:
+        logger.info(f'Skipping test {name}, not applicable to {device_config.coe} in {device_config.alias}')
+
+    reports: dict[str, io.BytesIO] = {}
+    try:
+        if plan.concurrent:
+            logger.info(f'Running {len(plan.concurrent)} validators with up to '
+                        f'{device_config.max_concurrent_engines} concurrent engines in {device_config.alias}')
+            reports = run_concurrent_suites(arguments, validator, plan.concurrent, device_config_file,
+                                            device_config.max_concurrent_engines, history)
+            # Engines kept by the concurrent validators would share the device
+            shared_engines.close()
+
+        for name in plan.sequential:
+            reports[name] = run_validator(arguments, validator, name, device_config_file, history)
+    finally:
+        shared_engines.close()
+        history.save()
+    return [reports[name] for name in requirements if name in reports]
+
+
+def save_results(results: list, target_device: str, test_type: str, prefix: str = '') -> list:
     """
 
     :param test_type:
     :param results:
     :param target_device:
+    :param prefix: Prefix of the result files, so results of several targets do not collide
     :return:
     """
 
@@ -100,7 +237,7 @@ def save_results(results: list, target_device: str, test_type: str) -> list:
 
         logger.info(f'{json.dumps(res[1], indent=4)} ')
         json_location = cte.JSON_RESULTS_PATH / (
-                json_results.get('testsuites').get('testsuite').get(
+                prefix + json_results.get('testsuites').get('testsuite').get(
                     '@name').split('.')[-1] + '.json')
         json_results['target_device'] = target_device
         json_results['test_type'] = test_type
@@ -110,7 +247,7 @@ def save_results(results: list, target_device: str, test_type: str) -> list:
             json.dump(json_results, file, indent=4)
 
         xml_location = cte.XML_RESULTS_PATH / (
-                json_results.get('testsuites').get('testsuite').get(
+                prefix + json_results.get('testsuites').get('testsuite').get(
                     '@name').split('.')[-1] + '.xml')
         with xml_location.open('wb') as file:
             tree = ET.ElementTree(ET.fromstring(xml_results))
@@ -123,6 +260,9 @@ def parse_arguments() -> argparse.Namespace:
     arguments: argparse.ArgumentParser = argparse.ArgumentParser()
     # Validator target device and target tests
     arguments.add_argument("--target")
+    # Several targets (configuration files or glob patterns), validated in worker processes
+    arguments.add_argument("--targets", nargs='+', default=None)
+    arguments.add_argument("--parallel", type=int, default=1)
     arguments.add_argument("--validator")
 
     # Until deployment and nuvlaedge are aligned we need both inputs
@@ -142,9 +282,55 @@ def parse_arguments() -> argparse.Namespace:
     # TODO: Future implementation
     arguments.add_argument("--retrieve_logs", default=False)
 
+    # Air-gapped runners, deployment files are only taken from the runner cache
+    arguments.add_argument("--offline", action='store_true')
+    # Engine images are transferred to the devices from the runner image cache
+    arguments.add_argument("--seed_images", action='store_true')
+    # Non-destructive tests share a commissioned engine instead of installing their own
+    arguments.add_argument("--shared_engine", action='store_true')
+
     return arguments.parse_args()
 
 
+def count_results(json_results: list) -> dict[str, int]:
+    """
+    :param json_results: Results as returned by save_results
+    :return: Number of tests, failures, errors and skipped tests
+    """
+    counts: dict[str, int] = {'tests': 0, 'failures': 0, 'errors': 0, 'skipped': 0}
+    for r in json_results:
+        suites = r.get('testsuites', {}).get('testsuite', [])
+        for suite in suites if isinstance(suites, list) else [suites]:
+            for k in counts:
+                counts[k] += int(suite.get(f'@{k}', 0))
+    return counts
+
+
+def validate_target(arguments: argparse.Namespace, validator: callable, target: str,
+                    prefix: str = '') -> TargetOutcome:
+    """
+    Runs the selected validators on a target device and stores their results
+    :param arguments: Parsed arguments
+    :param validator: Validator getter
+    :param target: Target device configuration file
+    :param prefix: Prefix of the result files
+    :return: The outcome of the validation
+    """
+    elapsed_time: float = time.time()
+    logger.info(f'Starting validation process in {target}')
+    test_report: list = run_test_on_device(arguments, validator, target)
+    results = parse_results(test_report)
+
+    json_results: list = save_results(results, target, arguments.validator, prefix)
+    counts: dict[str, int] = count_results(json_results)
+
+    # If any failed, return 1
+    return TargetOutcome(target=target,
+                         exit_code=1 if counts['failures'] or counts['errors'] else 0,
+                         elapsed=time.time() - elapsed_time,
+                         **counts)
+
+
 def main(arguments: argparse.Namespace, validator: callable):
     """
     Main script for test running. Its main functionality is selecting the test parsed as parameter
@@ -158,12 +344,7 @@ def main(arguments: argparse.Namespace, validator: callable):
 
     # Run validation
     time.sleep(2)
-    logger.info(f'Starting validation process in {arguments.target}')
-    test_report: list = run_test_on_device(arguments, validator)
-    results = parse_results(test_report)
-
-    json_results: list = save_results(results, arguments.target,
-                                      arguments.validator)
+    outcome: TargetOutcome = validate_target(arguments, validator, arguments.target)
 
     validation_time = time.process_time() - validation_time
     elapsed_time = time.time() - elapsed_time
@@ -171,12 +352,70 @@ def main(arguments: argparse.Namespace, validator: callable):
         f'Successfully finishing validation in {validation_time}s with a total of '
         f'{elapsed_time}s elapsed')
 
-    # Assess exit code by reading the json results. If any failed, return 1.
-    for r in json_results:
-        for k, v in r.get("testsuites", {}).items():
-            if v.get("@failures") != "0" or v.get("@errors") != "0":
-                exit_code = 1
-                break
+    exit_code = max(exit_code, outcome.exit_code)
+
+
+def _target_worker(arguments: argparse.Namespace, target: str) -> TargetOutcome:
+    """
+    Validates a target in a worker process, with its own log file and result files
+    """
+    global active_validators
+    log_file: Path = cte.RUNNER_LOGS_RESULTS_PATH / f'{target_name(target)}.log'
+    config_target_logger(target_name(target), log_file, logging.getLevelName(arguments.log_level))
+    logging.getLogger("paramiko").setLevel(logging.WARNING)
+    configure_caches(arguments)
+
+    try:
+        get_validator, active_validators = get_validator_type(arguments.validator)
+        outcome: TargetOutcome = validate_target(arguments, get_validator, target,
+                                                 prefix=f'{target_name(target)}.')
+    except Exception as ex:
+        logger.exception(f'Validation of {target} failed')
+        outcome = TargetOutcome(target=target, exit_code=1, error=str(ex))
+    outcome.log_file = str(log_file)
+    return outcome
+
+
+def main_targets(arguments: argparse.Namespace, targets: list[str]):
+    """
+    Validates several targets concurrently, up to --parallel at once, each one in its own
+    worker process. The run lasts as long as the slowest target instead of the sum of all
+    :param arguments: Parsed arguments
+    :param targets: Target device configuration files
+    """
+    global exit_code
+    workers: int = max(1, min(arguments.parallel, len(targets)))
+    logger.info(f'Starting Validator framework at {datetime.now()} on {len(targets)} targets, '
+                f'{workers} in parallel')
+    elapsed_time: float = time.time()
+
+    outcomes: list[TargetOutcome] = []
+    # Spawned workers do not inherit the threads and connections of this process
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(_target_worker, arguments, target): target for target in targets}
+        for future in as_completed(futures):
+            try:
+                outcome: TargetOutcome = future.result()
+            except Exception as ex:
+                outcome = TargetOutcome(target=futures[future], exit_code=1, error=f'Worker failed: {ex}')
+            logger.info(f'Target {outcome.target} finished in {outcome.elapsed:.0f}s with exit code '
+                        f'{outcome.exit_code}')
+            outcomes.append(outcome)
+
+    outcomes.sort(key=lambda o: targets.index(o.target))
+    elapsed_time = time.time() - elapsed_time
+    summary: list[str] = [f'Validation of {len(targets)} targets finished in {elapsed_time:.0f}s']
+    for o in outcomes:
+        summary.append(f'  {o.target}: {"FAILED" if o.exit_code else "PASSED"} - {o.tests} tests, '
+                       f'{o.failures} failures, {o.errors} errors, {o.skipped} skipped in {o.elapsed:.0f}s'
+                       + (f' ({o.error})' if o.error else '') + f' - logs {o.log_file}')
+    logger.info('\n'.join(summary))
+
+    cte.RESULTS_PATH.mkdir(exist_ok=True, parents=True)
+    with (cte.RESULTS_PATH / 'summary.json').open('w') as file:
+        json.dump({'elapsed': elapsed_time, 'targets': [asdict(o) for o in outcomes]}, file, indent=4)
+
+    exit_code = max([exit_code] + [o.exit_code for o in outcomes])
 
 
 def get_validator_type(validator_name: str) -> tuple[callable, dict]:
@@ -201,6 +440,14 @@ def get_validator_type(validator_name: str) -> tuple[callable, dict]:
     return get_validator, active_validators
 
 
+def configure_caches(arguments: argparse.Namespace):
+    compose_cache.offline = arguments.offline
+    chart_cache.offline = arguments.offline
+    image_cache.offline = arguments.offline
+    image_cache.enabled = arguments.seed_images
+    shared_engines.enabled = arguments.shared_engine
+
+
 def entrypoint():
     global active_validators
 
@@ -211,6 +458,14 @@ def entrypoint():
 
     logger.info(f'Parsed arguments: {args}')
 
+    targets: list[str] = resolve_targets(args)
+    if len(targets) > 1:
+        main_targets(args, targets)
+        exit(exit_code)
+
+    args.target = targets[0]
+    configure_caches(args)
+
     validator_type = args.validator
 
     get_validator, active_validators = get_validator_type(validator_type)
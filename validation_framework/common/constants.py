@@ -11,6 +11,8 @@ NUVLAEDGE_RELEASES_LINK: str = 'https://api.github.com/repos/nuvlaedge/nuvlaedge
 RELEASE_DOWNLOAD_LINK: str = 'https://github.com/nuvlaedge/deployment/releases/' \
                              'download/{version}/{file}'
 DEPLOYMENT_FILES_LINK: str = 'https://raw.githubusercontent.com/nuvlaedge/deployment/{branch_name}/{file}'
+DEPLOYMENT_BRANCH_COMMIT_LINK: str = 'https://api.github.com/repos/nuvlaedge/deployment/commits/{branch}'
+DEPLOYMENT_ARCHIVE_LINK: str = 'https://codeload.github.com/nuvlaedge/deployment/tar.gz/{sha}'
 
 ENGINE_BASE_FILE_NAME: str = 'docker-compose.yml'
 PERIPHERAL_BASE_FILE_NAME: str = 'docker-compose.{peripheral}.yml'
@@ -21,6 +23,7 @@ DEPLOYMENT_GIT_CLONE: str = 'git clone --single-branch --depth 1 --branch {branc
 
 # Kubernetes
 NUVLAEDGE_KUBE_REPO: str = 'https://nuvlaedge.github.io/deployment'
+NUVLAEDGE_KUBE_REPO_INDEX: str = NUVLAEDGE_KUBE_REPO + '/index.yaml'
 NUVLAEDGE_KUBE_LOCAL_REPO_NAME: str = 'nuvlaedge'
 NUVLAEDGE_KUBE_LOCAL_CHART_NAME: str = 'nuvlaedge'
 NUVLAEDGE_KUBE_INSTALL_IMAGE: str = ('sudo helm install nuvlaedge-{uuid} {chart} '
@@ -33,6 +36,13 @@ NUVLAEDGE_KUBE_CERTIFICATE_MANAGER: str = 'kubernetes-credentials-manager'
 NUVLAEDGE_KUBE_CSR_NAME_KEY: str = 'CSR_NAME'
 NUVLAEDGE_KUBE_CREDENTIAL_CHECK_INTERVAL: int = 5  # seconds
 
+# Nuvla
+NUVLA_ENDPOINT: str = 'https://nuvla.io'
+NUVLA_POOL_SIZE: int = 16  # Keep-alive connections per session
+NUVLA_SESSION_REFRESH_MARGIN: float = 5 * 60  # seconds
+NUVLA_CACHE_TTL: float = 2  # Seconds a cached resource is served without revalidation
+NUVLA_CACHE_MAX_ENTRIES: int = 512
+
 # File locations
 GENERAL_CONFIG_PATH: Path = Path('./conf/').resolve()
 DEVICE_CONFIG_PATH: Path = GENERAL_CONFIG_PATH / 'targets'
@@ -51,6 +61,8 @@ COMPOSE_DOWN: str = 'docker compose -p {project_name} -f {files} down -d'
 
 # NuvlaEdge engine configuration constants
 PROJECT_NAME: str = 'nuvlaedge_validator'
+# Project of each engine when several run concurrently in the same device
+TENANT_PROJECT_NAME: str = PROJECT_NAME + '_{slot}'
 NUVLAEDGE_NAME: str = '[{device}] Validation'
 DOCKER_REPOSITORY_NAME: str = 'nuvlaedge'
 
@@ -58,7 +70,27 @@ DOCKER_REPOSITORY_NAME: str = 'nuvlaedge'
 RESULTS_PATH: Path = Path('./results/temp/').resolve()
 JSON_RESULTS_PATH: Path = RESULTS_PATH / 'json'
 XML_RESULTS_PATH: Path = RESULTS_PATH / 'xml'
+METRICS_RESULTS_PATH: Path = RESULTS_PATH / 'metrics'
+ENGINE_LOGS_RESULTS_PATH: Path = RESULTS_PATH / 'logs'
+RUNNER_LOGS_RESULTS_PATH: Path = RESULTS_PATH / 'runner_logs'
+
+# Runner side caches
+CACHE_PATH: Path = Path('./cache/').resolve()
+COMPOSE_CACHE_PATH: Path = CACHE_PATH / 'compose'
+CHART_CACHE_PATH: Path = CACHE_PATH / 'charts'
+IMAGE_CACHE_PATH: Path = CACHE_PATH / 'images'
+# Image pull times, per device
+PULL_TIMES_PATH: Path = CACHE_PATH / 'pull_times'
+# Expected duration of the validators, per target
+DURATIONS_PATH: Path = CACHE_PATH / 'durations'
 
 # Timeouts
 DEFAULT_JOBS_TIMEOUT: int = 3 * 60
 DEFAULT_DEPLOYMENTS_TIMEOUT: int = 5 * 60
+COMMISSIONING_TIMEOUT: int = 15 * 60
+OPERATIONAL_TIMEOUT: int = 10 * 60
+# Maximum seconds for a shared engine to pass its health check before a test uses it
+SHARED_ENGINE_HEALTH_TIMEOUT: int = 60
+
+# Seconds between two polls of the state of the tracked NuvlaEdges
+NUVLA_STATE_POLL_INTERVAL: float = 2
@@ -1,8 +1,10 @@
 """
 Hardcodes the configuration of the system root logger
 """
+import copy
 import logging
 from logging.config import dictConfig
+from pathlib import Path
 
 logging_config = {'version': 1,
                   'formatters':
@@ -30,3 +32,28 @@ def config_logger(logger: logging.Logger | None = None,
             logging_config['root']['level'] = level
         # Means we are configuring root logger
         dictConfig(logging_config)
+
+
+def config_target_logger(target: str, log_file: Path, level=None):
+    """
+    Configures the root logger of a worker process validating a single target. Records
+    are prefixed with the target and also written into the target log file
+    :param target: Target device configuration name
+    :param log_file: Log file of the target
+    :param level: Logging level
+    :return:
+    """
+    log_file.parent.mkdir(exist_ok=True, parents=True)
+    config: dict = copy.deepcopy(logging_config)
+    config['formatters']['f']['format'] = f'[{target}] ' + config['formatters']['f']['format']
+    config['handlers']['file'] = {'class': 'logging.FileHandler',
+                                  'formatter': 'f',
+                                  'filename': str(log_file),
+                                  'mode': 'w',
+                                  'level': logging.DEBUG}
+    config['root']['handlers'].append('file')
+    if level:
+        config['handlers']['h']['level'] = level
+        config['handlers']['file']['level'] = level
+        config['root']['level'] = level
+    dictConfig(config)
@@ -0,0 +1,184 @@
+"""
+Process wide counters and timings gathered by the validation framework. Values are
+accumulated globally and, while a test is running, also inside the scope of that test
+so they can be stored next to its results.
+
+Scopes belong to the thread running the test, so tests running concurrently keep their
+metrics apart. Helper threads started by a test (see bind) record into the scope of the
+test. Values recorded by other threads without a scope (e.g. shared pollers) only belong
+to a test while it runs alone, otherwise they are only accumulated globally.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+
+metrics_logger: logging.Logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Scope:
+    name: str | None
+    counters: dict[str, float] = field(default_factory=dict)
+    timings: dict[str, list[float]] = field(default_factory=dict)
+
+
+class Metrics:
+    """
+    Thread safe registry of counters (monotonically increasing values) and timings
+    (lists of measured values, usually seconds).
+    """
+
+    def __init__(self):
+        self._lock: threading.Lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._timings: dict[str, list[float]] = {}
+
+        # Per-test scopes by thread id, started and finished by the ValidationBase
+        self._scopes: dict[int, _Scope] = {}
+        # Scopes adopted by helper threads, by thread id
+        self._adopted: dict[int, _Scope] = {}
+
+    def _thread_scope(self) -> _Scope | None:
+        ident: int = threading.get_ident()
+        return self._scopes.get(ident) or self._adopted.get(ident)
+
+    def _active_scopes(self) -> list[_Scope]:
+        scope: _Scope | None = self._thread_scope()
+        if scope is not None:
+            return [scope]
+        # Unrelated to any test, attributed to the only running one
+        return list(self._scopes.values()) if len(self._scopes) == 1 else []
+
+    def increment(self, name: str, value: float = 1, scoped: bool = True) -> None:
+        """
+        Increments the counter identified by name
+        :param name: Counter name, dot separated (e.g. ssh.pool.hits)
+        :param value: Amount to add to the counter
+        :param scoped: Whether to add it to the active scopes too, or only globally
+        :return: None
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            for scope in self._active_scopes() if scoped else []:
+                scope.counters[name] = scope.counters.get(name, 0) + value
+
+    def record(self, name: str, value: float, scoped: bool = True) -> None:
+        """
+        Appends a new measurement to the timing identified by name
+        :param name: Timing name, dot separated (e.g. ssh.pool.connect_time)
+        :param value: Measured value
+        :param scoped: Whether to add it to the active scopes too, or only globally
+        :return: None
+        """
+        with self._lock:
+            self._timings.setdefault(name, []).append(value)
+            for scope in self._active_scopes() if scoped else []:
+                scope.timings.setdefault(name, []).append(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Records the time spent within the context as a timing named name
+        :param name: Timing name
+        """
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def current_scope(self) -> _Scope | None:
+        """
+        :return: The scope the calling thread records into, to be adopted by its helpers
+        """
+        with self._lock:
+            return self._thread_scope()
+
+    @contextmanager
+    def adopt_scope(self, scope: _Scope | None):
+        """
+        Records the values of the calling thread into the given scope (usually the one of
+        the thread that started it) within the context
+        :param scope: Scope as returned by current_scope. None records globally only
+        """
+        ident: int = threading.get_ident()
+        with self._lock:
+            if scope is not None:
+                self._adopted[ident] = scope
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._adopted.pop(ident, None)
+
+    def bind(self, function: Callable) -> Callable:
+        """
+        :param function: Target of a helper thread
+        :return: The function, recording into the scope of the calling thread wherever it runs
+        """
+        scope: _Scope | None = self.current_scope()
+
+        def scoped(*args, **kwargs):
+            with self.adopt_scope(scope):
+                return function(*args, **kwargs)
+        return scoped
+
+    def start_scope(self, scope: str) -> None:
+        """
+        Starts gathering metrics for the given scope (usually a test id) in the calling
+        thread. Any previous scope of the thread is discarded
+        :param scope: Scope identifier
+        :return: None
+        """
+        with self._lock:
+            self._scopes[threading.get_ident()] = _Scope(scope)
+
+    def end_scope(self) -> dict:
+        """
+        Finishes the scope of the calling thread
+        :return: The metrics gathered while the scope was active
+        """
+        with self._lock:
+            scope: _Scope = self._scopes.pop(threading.get_ident(), None) or _Scope(None)
+        data: dict = self._summary(scope.counters, scope.timings)
+        data['scope'] = scope.name
+        return data
+
+    def snapshot(self) -> dict:
+        """
+        :return: Global metrics gathered since the start of the process
+        """
+        with self._lock:
+            return self._summary(self._counters, self._timings)
+
+    @staticmethod
+    def _summary(counters: dict[str, float], timings: dict[str, list[float]]) -> dict:
+        return {
+            'counters': dict(counters),
+            'timings': {k: {'count': len(v),
+                            'total': sum(v),
+                            'min': min(v),
+                            'max': max(v)} for k, v in timings.items() if v}
+        }
+
+
+metrics: Metrics = Metrics()
+
+
+def save_metrics(data: dict, file_location: Path) -> None:
+    """
+    Stores the provided metrics in json format
+    :param data: Metrics as returned by Metrics.end_scope or Metrics.snapshot
+    :param file_location: Destination file
+    :return: None
+    """
+    file_location.parent.mkdir(exist_ok=True, parents=True)
+    with file_location.open('w') as file:
+        json.dump(data, file, indent=4)
+    metrics_logger.debug(f'Metrics stored in {file_location}')
@@ -0,0 +1,215 @@
+"""
+Read-through cache of Nuvla resources, keyed by resource id and selected fields.
+
+Entries are served as they are for a short time (ttl), which also coalesces identical
+concurrent requests into a single one. Past that time, whole documents are revalidated
+by fetching only their 'updated' timestamp and refetched only if it changed. Selected
+fields are refetched along with 'updated', which in turn revalidates the other entries
+of the same resource. A cached whole document also serves any selection of its fields.
+
+Waits must observe the latest state and bypass the cache (fresh=True).
+"""
+import copy
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+from nuvla.api import Api as NuvlaClient
+from nuvla.api.models import CimiResource
+
+from validation_framework.common import constants as cte
+from validation_framework.common.metrics import metrics
+
+# Fields always returned by Nuvla, whatever the selection
+_BASE_FIELDS: tuple = ('id', 'resource-type')
+
+
+@dataclass
+class _Entry:
+    data: dict
+    # 'updated' timestamp of the resource, None if the resource has none
+    updated: str | None
+    # Monotonic time the entry was fetched or last revalidated
+    validated: float
+
+
+class NuvlaResourceCache:
+    """
+    Thread safe resource cache of a Nuvla client
+    """
+
+    def __init__(self, client: NuvlaClient, ttl: float = cte.NUVLA_CACHE_TTL,
+                 max_entries: int = cte.NUVLA_CACHE_MAX_ENTRIES):
+        """
+        :param client: Authenticated Nuvla client
+        :param ttl: Seconds an entry is served without revalidation
+        :param max_entries: Maximum number of entries, the least recently used are evicted
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.client: NuvlaClient = client
+        self.ttl: float = ttl
+        self.max_entries: int = max_entries
+
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        # Resource id: (last seen 'updated', monotonic time it was seen)
+        self._updated: dict[str, tuple[str | None, float]] = {}
+        self._inflight: dict[tuple, Future] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def _key(resource_id: str, select: list[str] | None) -> tuple:
+        return resource_id, tuple(sorted(set(select))) if select else None
+
+    @staticmethod
+    def _resource(data: dict, select: tuple | None) -> CimiResource:
+        if select is not None:
+            data = {k: v for k, v in data.items() if k in select or k in _BASE_FIELDS}
+        return CimiResource(copy.deepcopy(data))
+
+    # ------------------------------------------------------------------------
+    # Entries
+    # ------------------------------------------------------------------------
+    def _valid(self, entry: _Entry, resource_id: str, now: float) -> bool:
+        if now - entry.validated < self.ttl:
+            return True
+        # Revalidated by a more recent fetch of the same resource
+        updated, seen = self._updated.get(resource_id, (None, 0))
+        if entry.updated is not None and entry.updated == updated and now - seen < self.ttl:
+            entry.validated = seen
+            return True
+        return False
+
+    def _cached(self, key: tuple, now: float) -> tuple[_Entry | None, _Entry | None]:
+        """
+        :return: The entry serving the key if valid, and the expired whole document to
+        revalidate, if any
+        """
+        resource_id, select = key
+        candidates: list[tuple] = [key] if select is None else [key, (resource_id, None)]
+        stale: _Entry | None = None
+        for candidate in candidates:
+            entry: _Entry | None = self._entries.get(candidate)
+            if entry is None:
+                continue
+            self._entries.move_to_end(candidate)
+            if self._valid(entry, resource_id, now):
+                return entry, None
+            # A selection is refetched directly, at the cost of a revalidation
+            if select is None:
+                stale = entry
+        return None, stale
+
+    def _store(self, key: tuple, data: dict) -> _Entry:
+        now: float = time.monotonic()
+        entry: _Entry = _Entry(data=data, updated=data.get('updated'), validated=now)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._updated[key[0]] = (entry.updated, now)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                if not any(k[0] == evicted[0] for k in self._entries):
+                    self._updated.pop(evicted[0], None)
+        return entry
+
+    # ------------------------------------------------------------------------
+    # Remote
+    # ------------------------------------------------------------------------
+    def _fetch(self, key: tuple, stale: _Entry | None) -> _Entry:
+        resource_id, select = key
+        if stale is not None and stale.updated is not None:
+            updated: str | None = self.client.get(resource_id, select=['updated']).data.get('updated')
+            if updated == stale.updated:
+                metrics.increment('nuvla.cache.revalidated')
+                with self._lock:
+                    stale.validated = time.monotonic()
+                    self._updated[resource_id] = (updated, stale.validated)
+                return stale
+
+        if select is None:
+            data: dict = self.client.get(resource_id).data
+        else:
+            data = self.client.get(resource_id, select=list(select) + ['updated']).data
+        return self._store(key, data)
+
+    def get(self, resource_id: str, select: list[str] | None = None, fresh: bool = False) -> CimiResource:
+        """
+        :param resource_id: Nuvla resource id
+        :param select: Fields to retrieve, the whole document if None
+        :param fresh: Bypass the cache and read the current resource (e.g. waits)
+        :return: The resource, restricted to the selected fields
+        """
+        key: tuple = self._key(resource_id, select)
+        if fresh:
+            metrics.increment('nuvla.cache.bypasses')
+            return self._resource(self._fetch(key, None).data, key[1])
+
+        with self._lock:
+            entry, stale = self._cached(key, time.monotonic())
+            if entry is not None:
+                self.hits += 1
+                metrics.increment('nuvla.cache.hits')
+                return self._resource(entry.data, key[1])
+
+            # Identical requests in flight are coalesced into a single one
+            future: Future | None = self._inflight.get(key)
+            owner: bool = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+                metrics.increment('nuvla.cache.misses')
+            else:
+                self.hits += 1
+                metrics.increment('nuvla.cache.coalesced')
+
+        if owner:
+            try:
+                future.set_result(self._fetch(key, stale))
+            except Exception as ex:
+                future.set_exception(ex)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        return self._resource(future.result().data, key[1])
+
+    def invalidate(self, resource_id: str) -> None:
+        """
+        Drops the entries of a resource. To be called after modifying it
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == resource_id]:
+                del self._entries[key]
+            self._updated.pop(resource_id, None)
+
+    def report(self) -> dict:
+        """
+        :return: Hits, misses and hit rate of the cache
+        """
+        with self._lock:
+            total: int = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / total if total else 0.0,
+                    'entries': len(self._entries)}
+
+
+_caches: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_caches_lock: threading.Lock = threading.Lock()
+
+
+def resource_cache(client: NuvlaClient) -> NuvlaResourceCache:
+    """
+    :param client: Nuvla client
+    :return: The resource cache of the client, shared by all its users
+    """
+    with _caches_lock:
+        cache: NuvlaResourceCache | None = _caches.get(client)
+        if cache is None:
+            cache = _caches[client] = NuvlaResourceCache(client)
+        return cache
@@ -0,0 +1,146 @@
+"""
+Process wide authenticated Nuvla sessions. One client is logged in per credential pair
+and shared by every test case and thread of the process, reusing its keep-alive
+connection pool instead of opening a new session (and login) per test.
+
+Sessions are refreshed before their cookie expires, and logged in again when Nuvla
+rejects them. Concurrent refreshes are serialized so only one login is sent. Every
+request is counted and timed per endpoint (resource type and operation) in the metrics.
+"""
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from nuvla.api import Api as NuvlaClient
+from nuvla.api.api import SessionStore, to_login_params
+from requests.adapters import HTTPAdapter
+
+from validation_framework.common import constants as cte
+from validation_framework.common.metrics import metrics
+
+
+def endpoint_name(url: str) -> str:
+    """
+    :param url: Nuvla API request url (e.g. https://nuvla.io/api/nuvlabox/<uuid>/reboot)
+    :return: Metrics name of the endpoint (e.g. nuvlabox.reboot)
+    """
+    parts: list[str] = urlparse(url).path.strip('/').split('/')[1:]
+    if not parts:
+        return 'cloud-entry-point'
+    return '.'.join([parts[0]] + parts[2:3])
+
+
+class _MeteredAdapter(HTTPAdapter):
+    """
+    Connection pool adapter counting and timing the requests per endpoint
+    """
+
+    def send(self, request, **kwargs):
+        name: str = f'{endpoint_name(request.url)}.{request.method.lower()}'
+        metrics.increment(f'nuvla.requests.{name}')
+        start: float = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            metrics.increment(f'nuvla.requests.{name}.errors')
+            raise
+        metrics.record(f'nuvla.request_time.{name}', time.perf_counter() - start)
+        if response.status_code >= 400:
+            metrics.increment(f'nuvla.requests.{name}.errors')
+        return response
+
+
+class _SharedSessionStore(SessionStore):
+    """
+    Session store shared between threads. Logins are serialized: a thread whose request
+    was rejected while another thread was logging in reuses that login
+    """
+
+    def __init__(self, endpoint: str, login_params: dict):
+        super().__init__(endpoint, persist_cookie=False, cookie_file=None, reauthenticate=True,
+                         login_params=login_params)
+        adapter: _MeteredAdapter = _MeteredAdapter(pool_connections=1, pool_maxsize=cte.NUVLA_POOL_SIZE)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+        self._login_lock: threading.Lock = threading.Lock()
+        self._logins: int = 0
+        self._last_login = None
+        # Expiration (epoch) of the session cookie, None if unknown
+        self.expires: float | None = None
+
+    def cimi_login(self, login_params):
+        logins: int = self._logins
+        with self._login_lock:
+            if self._logins != logins:
+                return self._last_login
+            response = super().cimi_login(login_params)
+            if response is not None and response.status_code == 201:
+                self._logins += 1
+                self._last_login = response
+                self.expires = min((c.expires for c in self.cookies if c.expires), default=None)
+                metrics.increment('nuvla.session.logins')
+            return response
+
+    def expiring(self, margin: float) -> bool:
+        return self.expires is not None and time.time() > self.expires - margin
+
+
+class NuvlaSessionManager:
+    """
+    Thread safe registry of the authenticated Nuvla clients, one per credential pair
+    """
+
+    def __init__(self, endpoint: str = cte.NUVLA_ENDPOINT, refresh_margin: float = cte.NUVLA_SESSION_REFRESH_MARGIN):
+        """
+        :param endpoint: Nuvla endpoint
+        :param refresh_margin: Seconds before the session expiration it is refreshed
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.endpoint: str = endpoint
+        self.refresh_margin: float = refresh_margin
+
+        self._clients: dict[tuple[str, str], NuvlaClient] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def _login(self, client: NuvlaClient) -> None:
+        response = client.session.cimi_login(client.session.login_params)
+        if response is None or response.status_code != 201:
+            raise PermissionError(f'Nuvla login failed in {self.endpoint} '
+                                  f'({response.status_code if response is not None else "no credentials"})')
+
+    def client(self, key: str, secret: str) -> NuvlaClient:
+        """
+        :param key: API key id
+        :param secret: API key secret
+        :return: The authenticated client of the credential pair, logged in on first use
+        and refreshed if its session is about to expire
+        """
+        with self._lock:
+            client: NuvlaClient | None = self._clients.get((key, secret))
+            if client is None:
+                client = NuvlaClient(endpoint=self.endpoint, persist_cookie=False)
+                client.session = _SharedSessionStore(self.endpoint, to_login_params({'key': key, 'secret': secret}))
+                self.logger.info(f'Opening Nuvla session in {self.endpoint} with key {key}')
+                self._login(client)
+                self._clients[(key, secret)] = client
+                return client
+
+        if client.session.expiring(self.refresh_margin):
+            self.logger.info(f'Refreshing Nuvla session of key {key}')
+            metrics.increment('nuvla.session.refreshes')
+            self._login(client)
+        return client
+
+    def close(self) -> None:
+        """
+        Closes the connection pools of all the sessions
+        """
+        with self._lock:
+            for client in self._clients.values():
+                client.session.close()
+            self._clients.clear()
+
+
+nuvla_sessions: NuvlaSessionManager = NuvlaSessionManager()
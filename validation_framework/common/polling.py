@@ -0,0 +1,113 @@
+"""
+Deadline bound polling with adaptive backoff. A probe is called until its value
+satisfies the condition, reaches a terminal state or the deadline expires. The delay
+between attempts starts short and grows geometrically up to a maximum, with jitter so
+many pollers do not query the same service in lockstep.
+
+Attempts, wall time, timeouts and aborts are recorded in the metrics under the name of
+the poll.
+"""
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Generic, TypeVar
+
+from validation_framework.common.metrics import metrics
+
+T = TypeVar('T')
+
+polling_logger: logging.Logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PollResult(Generic[T]):
+    """
+    Outcome of a poll. Evaluates to True if the condition was satisfied
+    """
+    success: bool
+    # Last value returned by the probe, None if every attempt failed
+    value: T | None
+    attempts: int
+    elapsed: float
+    # Whether the poll finished on a terminal value instead of the condition or the deadline
+    aborted: bool = False
+    # Last exception raised by the probe, if any
+    error: Exception | None = None
+
+    def __bool__(self) -> bool:
+        return self.success
+
+
+def backoff_delays(interval: float, max_interval: float, factor: float, jitter: float):
+    """
+    Infinite generator of delays, growing from interval to max_interval
+    :param interval: First delay
+    :param max_interval: Upper bound of the delays
+    :param factor: Growth factor between consecutive delays
+    :param jitter: Fraction (0 to 1) of each delay randomly removed
+    """
+    delay: float = interval
+    while True:
+        yield delay * (1 - random.uniform(0, jitter))
+        delay = min(delay * factor, max_interval)
+
+
+def poll_until(probe: Callable[[], T],
+               condition: Callable[[T], bool] = bool,
+               timeout: float = 60,
+               name: str = 'poll',
+               interval: float = 1,
+               max_interval: float = 10,
+               factor: float = 1.5,
+               jitter: float = 0.2,
+               terminal: Callable[[T], bool] | None = None,
+               errors: tuple[type[Exception], ...] = ()) -> PollResult[T]:
+    """
+    Calls the probe until its value satisfies the condition, the value is terminal or the
+    deadline expires. The probe runs right away and once more at the deadline
+    :param probe: Reads the polled value
+    :param condition: Whether the value is the awaited one
+    :param timeout: Maximum seconds to poll
+    :param name: Metrics prefix of the poll (e.g. nuvla.job)
+    :param interval: Delay after the first attempt
+    :param max_interval: Upper bound of the delay between attempts
+    :param factor: Growth factor of the delay between attempts
+    :param jitter: Fraction (0 to 1) of each delay randomly removed
+    :param terminal: Whether the value is a final state that will not satisfy the condition
+    :param errors: Probe exceptions handled as failed attempts. Others are raised
+    :return: The outcome of the poll
+    """
+    start: float = time.monotonic()
+    deadline: float = start + timeout
+    delays = backoff_delays(interval, max_interval, factor, jitter)
+    result: PollResult[T] = PollResult(success=False, value=None, attempts=0, elapsed=0)
+
+    while True:
+        result.attempts += 1
+        try:
+            result.value = probe()
+            result.error = None
+            if condition(result.value):
+                result.success = True
+                break
+            if terminal is not None and terminal(result.value):
+                result.aborted = True
+                metrics.increment(f'{name}.aborted')
+                polling_logger.debug(f'Poll {name} aborted on terminal value {result.value}')
+                break
+        except errors as ex:
+            result.error = ex
+            polling_logger.debug(f'Poll {name} attempt {result.attempts} failed: {ex}')
+
+        remaining: float = deadline - time.monotonic()
+        if remaining <= 0:
+            metrics.increment(f'{name}.timeouts')
+            polling_logger.debug(f'Poll {name} timed out after {result.attempts} attempts')
+            break
+        time.sleep(min(next(delays), remaining))
+
+    result.elapsed = time.monotonic() - start
+    metrics.record(f'{name}.attempts', result.attempts)
+    metrics.record(f'{name}.time', result.elapsed)
+    return result
@@ -0,0 +1,76 @@
+"""
+Kubernetes cluster state snapshot, parsed in the runner from a single multi-kind
+'kubectl get -o json' listing (namespaces, deployments, pods and certificate signing
+requests).
+"""
+from pydantic import BaseModel, ConfigDict
+
+from validation_framework.common.schemas.device_snapshot import DeploymentState, PodState
+
+# Resource kinds of the listing, in kubectl notation
+CLUSTER_SNAPSHOT_KINDS: tuple = ('namespaces', 'deployments', 'pods', 'certificatesigningrequests')
+
+
+class ClusterPodState(PodState):
+    # Literal environmental variables of the pod containers (valueFrom ones excluded)
+    env: dict[str, str] = {}
+
+
+class ClusterSnapshot(BaseModel):
+    """
+    Cluster state snapshot schema
+    """
+    model_config = ConfigDict(extra='ignore')
+
+    timestamp: float
+
+    namespaces: list[str] = []
+    pods: list[ClusterPodState] = []
+    deployments: list[DeploymentState] = []
+    # Certificate signing request name: type of its first condition (None if pending)
+    csrs: dict[str, str | None] = {}
+
+    @classmethod
+    def from_kubectl(cls, data: dict, timestamp: float) -> 'ClusterSnapshot':
+        """
+        :param data: Decoded List document printed by kubectl get -o json
+        :param timestamp: Time the listing was taken
+        :return: The cluster snapshot
+        """
+        snapshot: ClusterSnapshot = cls(timestamp=timestamp)
+        for item in data.get('items', []):
+            kind: str = item.get('kind', '')
+            metadata: dict = item.get('metadata', {})
+            name: str = metadata.get('name', '')
+            if kind == 'Namespace':
+                snapshot.namespaces.append(name)
+            elif kind == 'Pod':
+                env: dict[str, str] = {e['name']: e['value']
+                                       for c in item.get('spec', {}).get('containers', [])
+                                       for e in c.get('env') or [] if 'value' in e}
+                snapshot.pods.append(ClusterPodState(namespace=metadata.get('namespace', ''), name=name,
+                                                     phase=item.get('status', {}).get('phase', ''),
+                                                     env=env))
+            elif kind == 'Deployment':
+                snapshot.deployments.append(DeploymentState(namespace=metadata.get('namespace', ''), name=name,
+                                                            replicas=item.get('spec', {}).get('replicas')))
+            elif kind == 'CertificateSigningRequest':
+                conditions: list = (item.get('status') or {}).get('conditions') or []
+                snapshot.csrs[name] = conditions[0].get('type') if conditions else None
+        return snapshot
+
+    def running_pods(self, namespace: str) -> list[str]:
+        return [p.name for p in self.pods if p.namespace == namespace and p.phase == 'Running']
+
+    def active_deployments(self, namespace: str) -> list[str]:
+        return [d.name for d in self.deployments if d.namespace == namespace and d.replicas != 0]
+
+    def pod(self, namespace: str, name: str) -> ClusterPodState | None:
+        return next((p for p in self.pods if p.namespace == namespace and p.name == name), None)
+
+    def pod_name(self, namespace: str, app_name: str, phase: str = 'Running') -> str:
+        """
+        :return: First pod of the namespace in the phase whose name contains app_name, '' if none
+        """
+        return next((p.name for p in self.pods
+                     if p.namespace == namespace and p.phase == phase and app_name in p.name), '')
@@ -0,0 +1,56 @@
+"""
+Device state snapshot, as reported by the device agent in a single JSON document.
+Sections not requested, or not available in the device, are None.
+"""
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class PodState(BaseModel):
+    namespace: str
+    name: str
+    phase: str
+
+
+class DeploymentState(BaseModel):
+    namespace: str
+    name: str
+    replicas: int | None = None
+
+
+class DeviceSnapshot(BaseModel):
+    """
+    Device state snapshot schema
+    """
+    model_config = ConfigDict(extra='ignore')
+
+    timestamp: float
+
+    uptime: float | None = None
+    boot_id: str | None = None
+    # Docker ps JSON entries (ID, Image, Names, State, Status, Labels, ...)
+    containers: list[dict] | None = None
+    authorized_keys: str | None = None
+
+    namespaces: list[str] | None = None
+    pods: list[PodState] | None = None
+    deployments: list[DeploymentState] | None = None
+
+    @classmethod
+    def from_agent(cls, data: dict) -> 'DeviceSnapshot':
+        if data.get('namespaces') is not None:
+            data['namespaces'] = [n['name'] for n in data['namespaces']]
+        for deployment in data.get('deployments') or []:
+            # Custom columns print <none> for unset replicas
+            if not deployment['replicas'].isdigit():
+                deployment['replicas'] = None
+        return cls.model_validate(data)
+
+    def running_containers(self) -> list[dict]:
+        return [c for c in self.containers or []
+                if c.get('State', '') == 'running' or c.get('Status', '').startswith('Up')]
+
+    def running_pods(self, namespace: str) -> list[str]:
+        return [p.name for p in self.pods or [] if p.namespace == namespace and p.phase == 'Running']
+
+    def active_deployments(self, namespace: str) -> list[str]:
+        return [d.name for d in self.deployments or [] if d.namespace == namespace and d.replicas != 0]
@@ -26,6 +26,8 @@ class TargetDeviceConfig(BaseModel):
 
     alias: str
     coe: str
+    # How the framework reaches the device: 'ssh' or 'local' (engine on the runner host)
+    transport: str = 'ssh'
 
     # Network data
     address: str
@@ -42,3 +44,12 @@ class TargetDeviceConfig(BaseModel):
     password: str | None = None
 
     excluded_tests: list[str] = Field(default_factory=list)
+
+    # Reachability probing. Seconds to wait for the device to come online and seconds
+    # a reachability check result is reused
+    reachability_budget: float = 30.0
+    reachability_cache_ttl: float = 5.0
+
+    # Engines run concurrently in the device, each one in its own compose project or
+    # Helm release. Tests disrupting the whole device always run alone
+    max_concurrent_engines: int = Field(default=1, ge=1)
@@ -0,0 +1,79 @@
+"""
+Standard outputs dispatched per thread, so test suites running concurrently capture
+their own output.
+
+The XML runner captures the output of each test by replacing sys.stdout and sys.stderr,
+which concurrent suites would overwrite for each other. While thread streams are
+installed, the test results redirect the output of their own thread instead.
+"""
+import sys
+import threading
+from contextlib import contextmanager
+
+from xmlrunner.result import _DuplicateWriter, _XMLTestResult
+
+
+class ThreadStream:
+    """
+    Writes to the stream redirected by the calling thread, or to the default one
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self._local: threading.local = threading.local()
+
+    @property
+    def target(self):
+        return getattr(self._local, 'stream', None) or self.default
+
+    def redirect(self, stream) -> None:
+        """
+        :param stream: Destination of the writes of the calling thread. None for the default
+        """
+        self._local.stream = stream
+
+    def write(self, data: str) -> int:
+        return self.target.write(data)
+
+    def flush(self) -> None:
+        self.target.flush()
+
+    def __getattr__(self, item):
+        return getattr(self.default, item)
+
+
+@contextmanager
+def thread_streams():
+    """
+    Installs thread streams as sys.stdout and sys.stderr within the context
+    """
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = ThreadStream(stdout), ThreadStream(stderr)
+    try:
+        yield
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+
+class ThreadCapturingResult(_XMLTestResult):
+    """
+    XML test result capturing the output of the tests through the thread streams, if
+    installed
+    """
+    _redirected: bool = False
+
+    def _setupStdout(self):
+        if not (isinstance(sys.stdout, ThreadStream) and isinstance(sys.stderr, ThreadStream)):
+            super()._setupStdout()
+            return
+        sys.stdout.redirect(_DuplicateWriter(sys.stdout.default, self._stdout_capture))
+        sys.stderr.redirect(_DuplicateWriter(sys.stderr.default, self._stderr_capture))
+        self._redirected = True
+
+    def _restoreStdout(self):
+        if self._redirected:
+            sys.stdout.redirect(None)
+            sys.stderr.redirect(None)
+            self._redirected = False
+        # Clears the captures, nothing else to restore if redirected
+        super()._restoreStdout()
@@ -0,0 +1,138 @@
+"""
+Runner-side cache of the engine Helm charts, packaged as .tgz archives.
+
+Release charts are downloaded from the NuvlaEdge Helm repository, deployment branch
+charts are packaged from the helm folder of the archive of the branch head commit.
+Charts are pushed to the devices only when their hash changed and installed from the
+local file, so the devices need neither the Helm repository nor git.
+"""
+import gzip
+import io
+import re
+import tarfile
+from pathlib import Path
+from urllib.parse import urljoin
+
+from validation_framework.common import constants as cte
+from validation_framework.deployer.compose_cache import ComposeCache, ComposeCacheMiss
+
+# Folder of the chart in the deployment repository
+_CHART_FOLDER: str = 'helm'
+
+
+def _version_tuple(version: str) -> tuple:
+    return tuple(int(p) if p.isdigit() else p for p in re.split(r'[.\-]', version))
+
+
+class ChartCache(ComposeCache):
+    """
+    Same layout as the compose cache, entries being <key>/<chart>-<version>.tgz
+    """
+    metrics_name: str = 'chart_cache'
+
+    def __init__(self, cache_path: Path = cte.CHART_CACHE_PATH, offline: bool = False,
+                 chart: str = cte.NUVLAEDGE_KUBE_LOCAL_CHART_NAME):
+        """
+        :param cache_path: Local folder of the cache
+        :param offline: If true, never reaches the network
+        :param chart: Name of the chart
+        """
+        super().__init__(cache_path, offline)
+        self.chart: str = chart
+        # Helm repository index, downloaded at most once per session
+        self._repo_index: str | None = None
+
+    def _index(self) -> str:
+        if self._repo_index is None:
+            self._repo_index = self._download(cte.NUVLAEDGE_KUBE_REPO_INDEX).decode()
+        return self._repo_index
+
+    def _chart_links(self) -> dict[str, str]:
+        """
+        Archive links of the chart versions. The index is not parsed as YAML, the archive
+        links are matched by their name (<chart>-<version>.tgz)
+        :return: Version: link
+        """
+        pattern: re.Pattern = re.compile(rf'^\s*-\s*(\S*/?{re.escape(self.chart)}-([0-9][^/\s]*)\.tgz)\s*$',
+                                         re.MULTILINE)
+        return {version: urljoin(cte.NUVLAEDGE_KUBE_REPO + '/', link)
+                for link, version in pattern.findall(self._index())}
+
+    def _resolve_version(self, version: str | None) -> str:
+        if version and version != 'latest':
+            return version
+
+        if self.offline:
+            with self._lock:
+                versions: list[str] = [k.split('/')[1] for k in self._read_index() if k.startswith('release/')]
+        else:
+            versions = list(self._chart_links())
+
+        # Pre-releases are only used if explicitly requested
+        versions = [v for v in versions if '-' not in v]
+        if not versions and self.offline:
+            raise ComposeCacheMiss('No chart release cached and running offline')
+        if not versions:
+            raise ValueError(f'No release of chart {self.chart} found in {cte.NUVLAEDGE_KUBE_REPO}')
+        return max(versions, key=_version_tuple)
+
+    def release_chart(self, version: str | None) -> Path:
+        """
+        :param version: Chart version. The latest release if None or latest
+        :return: Local path of the chart archive
+        """
+        version = self._resolve_version(version)
+
+        def download() -> bytes:
+            link: str | None = self._chart_links().get(version)
+            if link is None:
+                raise ValueError(f'Chart {self.chart} {version} not found in {cte.NUVLAEDGE_KUBE_REPO}')
+            self.logger.info(f'Fetching chart {self.chart} {version} from {link}')
+            return self._download(link)
+
+        return self._fetch(f'{self.release_key(version)}/{self.chart}-{version}.tgz', download)
+
+    def branch_chart(self, branch: str) -> Path:
+        """
+        :param branch: Deployment repository branch
+        :return: Local path of the chart archive packaged from the branch head commit
+        """
+        key: str | None = self.branch_key(branch)
+        # Unresolved branch commits are packaged from the branch head, uncached
+        ref: str = self.branch_sha(key) if key is not None else branch
+
+        def download() -> bytes:
+            link: str = cte.DEPLOYMENT_ARCHIVE_LINK.format(sha=ref)
+            self.logger.info(f'Packaging chart {self.chart} from {link}')
+            return self._package(self._download(link))
+
+        return self._fetch(f'{key}/{self.chart}-{ref[:12]}.tgz' if key is not None else None, download)
+
+    def _package(self, archive: bytes) -> bytes:
+        """
+        Packages the chart folder of the repository archive as a chart archive. Members
+        are sorted and timestamps cleared, so the same commit always yields the same hash
+        :param archive: Repository archive (<repo>-<sha>/...)
+        :return: The chart archive (<chart>/...)
+        """
+        output: io.BytesIO = io.BytesIO()
+        packaged: int = 0
+        with tarfile.open(fileobj=io.BytesIO(archive), mode='r:gz') as source, \
+                gzip.GzipFile(fileobj=output, mode='wb', mtime=0) as compressed, \
+                tarfile.open(fileobj=compressed, mode='w') as chart:
+            members: list[tarfile.TarInfo] = sorted(source.getmembers(), key=lambda m: m.name)
+            for member in members:
+                parts: list[str] = member.name.split('/', 2)
+                if len(parts) < 3 or parts[1] != _CHART_FOLDER or not (member.isfile() or member.isdir()):
+                    continue
+                info: tarfile.TarInfo = tarfile.TarInfo(f'{self.chart}/{parts[2]}')
+                info.type, info.mode, info.size, info.mtime = member.type, member.mode, member.size, 0
+                chart.addfile(info, source.extractfile(member) if member.isfile() else None)
+                packaged += 1
+
+        if not packaged:
+            raise ValueError(f'No chart found in folder {_CHART_FOLDER} of the deployment archive')
+        return output.getvalue()
+
+
+chart_cache: ChartCache = ChartCache()
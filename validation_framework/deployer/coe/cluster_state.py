@@ -0,0 +1,78 @@
+"""
+Cached view of the Kubernetes cluster of a device. Namespaces, deployments, pods and
+certificate signing requests are listed in a single kubectl call and parsed in the
+runner (no jq needed in the device).
+
+Snapshots are reused for a short time (ttl), so the several checks of a readiness loop
+or a teardown share one remote call. Mutations of the cluster must invalidate the
+cached snapshot so the following query observes them.
+"""
+import json
+import logging
+import threading
+import time
+
+from validation_framework.common.metrics import metrics
+from validation_framework.common.schemas.cluster_snapshot import CLUSTER_SNAPSHOT_KINDS, ClusterSnapshot
+from validation_framework.deployer.target_device.target import TargetDevice
+
+CLUSTER_SNAPSHOT_TTL: float = 2
+
+
+class ClusterState:
+    """
+    Thread safe cache of the cluster snapshot of a device
+    """
+
+    def __init__(self, device: TargetDevice, envs: dict, ttl: float = CLUSTER_SNAPSHOT_TTL):
+        """
+        :param device: Device running the cluster
+        :param envs: Environmental variables of kubectl (e.g. KUBECONFIG)
+        :param ttl: Seconds a snapshot is reused
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.device: TargetDevice = device
+        self.envs: dict = envs
+        self.ttl: float = ttl
+
+        self._snapshot: ClusterSnapshot | None = None
+        # Bumped on invalidation, so listings taken before a mutation are not cached
+        self._generation: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def _command() -> str:
+        return f'sudo kubectl get {",".join(CLUSTER_SNAPSHOT_KINDS)} -A -o json'
+
+    def _cached(self) -> ClusterSnapshot | None:
+        if self._snapshot is not None and time.time() - self._snapshot.timestamp < self.ttl:
+            metrics.increment('kubernetes.snapshot.hits')
+            return self._snapshot
+        return None
+
+    def _store(self, stdout: str, timestamp: float, generation: int) -> ClusterSnapshot:
+        snapshot: ClusterSnapshot = ClusterSnapshot.from_kubectl(json.loads(stdout), timestamp)
+        metrics.increment('kubernetes.snapshot.fetches')
+        if generation == self._generation:
+            self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self) -> ClusterSnapshot:
+        """
+        :return: The cached snapshot, or a new one if expired or invalidated. Raises
+        if the cluster cannot be listed
+        """
+        with self._lock:
+            if (cached := self._cached()) is not None:
+                return cached
+            timestamp, generation = time.time(), self._generation
+            with metrics.timer('kubernetes.snapshot.time'):
+                stdout: str = self.device.run_sudo_command(self._command(), envs=self.envs).stdout
+            return self._store(stdout, timestamp, generation)
+
+    def invalidate(self) -> None:
+        """
+        Discards the cached snapshot. To be called after any change to the cluster
+        """
+        self._generation += 1
+        self._snapshot = None
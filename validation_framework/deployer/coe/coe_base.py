@@ -1,9 +1,18 @@
+import asyncio
 import logging
 from abc import ABC, abstractmethod
 
 from validation_framework.common import constants
 from validation_framework.common.nuvla_uuid import NuvlaUUID
+from validation_framework.common.metrics import metrics
+from validation_framework.common.polling import poll_until
+from validation_framework.common.schemas.device_snapshot import DeviceSnapshot
 from validation_framework.common.schemas.engine import EngineEnvsConfiguration
+from validation_framework.deployer.coe.log_stream import LogStreamWriter, build_log_stream_script
+from validation_framework.deployer.coe.purge import PurgeReport
+from validation_framework.deployer.target_device import async_target_factory
+from validation_framework.deployer.target_device.agent import DeviceAgent
+from validation_framework.deployer.target_device.async_target import AsyncTargetDevice
 from validation_framework.deployer.target_device.target import TargetDevice
 
 from fabric import Result
@@ -15,11 +24,17 @@ class COEBase(ABC):
     def __init__(self, device: TargetDevice, logger: logging.Logger, **kwargs):
         self.logger: logging.Logger = logger
         self.device: TargetDevice = device
+        self._async_device: AsyncTargetDevice | None = None
+        self._agent: DeviceAgent | None = None
 
         self.project_name: str = kwargs.get('project_name', constants.PROJECT_NAME)
+        # Engines with a project of their own share the device with other engines, so
+        # they only stop and purge their own resources
+        self.isolated: bool = self.project_name != constants.PROJECT_NAME
         self.engine_env: list[str] = []
 
-        self.engine_configuration: EngineEnvsConfiguration = EngineEnvsConfiguration()
+        self.engine_configuration: EngineEnvsConfiguration = EngineEnvsConfiguration(
+            compose_project_name=self.project_name)
         nuvlaedge_branch: str = kwargs.get('nuvlaedge_branch', '')
         nuvlaedge_version: str = kwargs.get('nuvlaedge_version', '')
         deployment_branch: str = kwargs.get('deployment_branch', '')
@@ -62,11 +77,22 @@ class COEBase(ABC):
         # Whether deployment branch is provided
         self.deployment_link: str = ''
 
+    @property
+    def async_device(self) -> AsyncTargetDevice:
+        """
+        Asyncio counterpart of the device, lazily created. As any asyncio resource, it
+        must only be used from the event loop that first used it
+        :return: The asynchronous target device
+        """
+        if self._async_device is None:
+            self._async_device = async_target_factory(self.device.target_config)
+        return self._async_device
+
     @abstractmethod
     def start_engine(self,
                      uuid: NuvlaUUID,
                      remove_old_installation: bool = True,
-                     project_name: str = constants.PROJECT_NAME,
+                     project_name: str | None = None,
                      extra_envs: dict = None):
         """
 
@@ -75,6 +101,26 @@ class COEBase(ABC):
         """
         pass
 
+    def _agent_options(self) -> dict:
+        """
+        :return: DeviceAgent keyword arguments required by the COE
+        """
+        return {}
+
+    @property
+    def agent(self) -> DeviceAgent:
+        if self._agent is None:
+            self._agent = DeviceAgent(self.device, **self._agent_options())
+        return self._agent
+
+    def snapshot(self, *sections: str) -> DeviceSnapshot:
+        """
+        Gathers the requested sections of the device state in a single round trip. See
+        agent.SNAPSHOT_SECTIONS
+        :return: The device snapshot
+        """
+        return self.agent.snapshot(*sections)
+
     @abstractmethod
     def add_peripheral(self):
         pass
@@ -88,9 +134,45 @@ class COEBase(ABC):
         pass
 
     @abstractmethod
-    def get_engine_logs(self):
+    def get_engine_logs(self, path: Path = None) -> dict[str, Path]:
+        """
+        Retrieves the logs of all the engine components in a single compressed stream
+        :param path: Local folder where to store the logs. Defaults to
+        /tmp/<project>/logs
+        :return: The local log file of each component
+        """
         pass
 
+    def _default_logs_path(self) -> Path:
+        return Path(f'/tmp/{self.engine_configuration.compose_project_name}/logs')
+
+    def _stream_logs(self, list_command: str, logs_command: str, path: Path | None,
+                     sudo: bool = False, envs: dict | None = None) -> dict[str, Path]:
+        """
+        Streams the logs of the components listed by list_command into path. See
+        log_stream.build_log_stream_script
+        """
+        command, token = build_log_stream_script(list_command, logs_command)
+        if sudo:
+            command = f'sudo {command}'
+        path = path if path is not None else self._default_logs_path()
+
+        try:
+            with metrics.timer('coe.logs.collect_time'), LogStreamWriter(token, path) as writer:
+                exit_code: int = self.device.stream_command(command, writer, envs=envs, sudo=sudo)
+        except Exception as ex:
+            self.logger.warning(f'Unable to retrieve engine logs from {self.device}: {ex}')
+            return {}
+        return self._log_stream_result(writer, exit_code, path)
+
+    def _log_stream_result(self, writer: LogStreamWriter, exit_code: int, path: Path) -> dict[str, Path]:
+        metrics.record('coe.logs.compressed_bytes', writer.compressed_bytes)
+        if exit_code != 0:
+            self.logger.warning(f'Engine logs stream exited with code {exit_code}, logs might be incomplete')
+        self.logger.info(f'Retrieved logs of {len(writer.files)} components into {path} '
+                         f'({writer.compressed_bytes} compressed bytes)')
+        return writer.files
+
     @abstractmethod
     def get_container_logs(self, container, download_to_local=False, path: Path = None):
         pass
@@ -100,11 +182,11 @@ class COEBase(ABC):
         pass
 
     @abstractmethod
-    def remove_engine(self, uuid: NuvlaUUID = None, black_list: list = None):
+    def remove_engine(self, uuid: NuvlaUUID = None, black_list: list = None) -> PurgeReport:
         pass
 
     @abstractmethod
-    def purge_engine(self, uuid: NuvlaUUID = None):
+    def purge_engine(self, uuid: NuvlaUUID = None) -> PurgeReport:
         pass
 
     @abstractmethod
@@ -115,20 +197,67 @@ class COEBase(ABC):
     def peripherals_running(self, peripherals: set) -> bool:
         pass
 
-    @abstractmethod
-    def get_authorized_keys(self):
-        pass
+    def wait_for_peripherals(self, peripherals: set, timeout: float = 60, interval: float = 5) -> bool:
+        """
+        Waits until all the peripherals are running
+        :param peripherals: Expected peripherals, in lowercase
+        :param timeout: Maximum seconds to wait
+        :param interval: Maximum seconds between checks
+        :return: Whether all the peripherals are running within the timeout
+        """
+        return poll_until(lambda: self.peripherals_running(set(peripherals)), timeout=timeout,
+                          name='coe.peripherals.wait', max_interval=interval).success
 
     @abstractmethod
     def finish_tasks(self):
         pass
 
     def restart_system(self) -> Result:
-        return self.device.run_sudo_command('sudo shutdown -r now')
+        if not self.device.supports_reboot:
+            raise NotImplementedError(f'Device {self.device} does not support reboots')
+        try:
+            return self.device.run_sudo_command('sudo shutdown -r now')
+        finally:
+            # Pooled connections won't survive the reboot
+            self.device.reset_connections()
+
+    def get_authorized_keys(self) -> str:
+        """
+        :return: Content of the authorized keys file used by the engine
+        """
+        return self.snapshot('authorized_keys').authorized_keys or ''
 
     def get_system_up_time(self) -> float:
-        result: Result = self.device.run_command("awk '{print $1}' /proc/uptime")
-        if result.stdout:
-            up_time = float(result.stdout)
-            return up_time
-        return 0.0
+        up_time: float | None = self.snapshot('uptime').uptime
+        return up_time if up_time is not None else 0.0
+
+    # ------------------------------------------------------------------------
+    # Asynchronous operations
+    # ------------------------------------------------------------------------
+    # Event loop friendly variants of the engine operations. They run the synchronous
+    # implementation in a worker thread, so each operation has a single implementation
+    async def start_engine_async(self,
+                                 uuid: NuvlaUUID,
+                                 remove_old_installation: bool = True,
+                                 project_name: str | None = None,
+                                 extra_envs: dict = None):
+        await asyncio.to_thread(self.start_engine, uuid, remove_old_installation=remove_old_installation,
+                                project_name=project_name, extra_envs=extra_envs)
+
+    async def stop_engine_async(self):
+        await asyncio.to_thread(self.stop_engine)
+
+    async def get_engine_logs_async(self, path: Path = None) -> dict[str, Path]:
+        return await asyncio.to_thread(self.get_engine_logs, path)
+
+    async def engine_running_async(self) -> bool:
+        return await asyncio.to_thread(self.engine_running)
+
+    async def purge_engine_async(self, uuid: NuvlaUUID = None) -> PurgeReport:
+        return await asyncio.to_thread(self.purge_engine, uuid)
+
+    async def finish_tasks_async(self):
+        await asyncio.to_thread(self.finish_tasks)
+
+    async def get_system_up_time_async(self) -> float:
+        return await asyncio.to_thread(self.get_system_up_time)
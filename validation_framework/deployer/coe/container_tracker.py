@@ -0,0 +1,261 @@
+"""
+Event driven tracking of the engine containers. A long-lived subscription to the docker
+events of the engine compose project keeps an in-memory table with the state of each
+container, so checks and waits are answered without querying the device.
+
+The table is seeded from the container list and then updated from the events stream,
+which is resubscribed (replaying the events since the last one seen) whenever the
+stream idles out or the connection is lost.
+"""
+import copy
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+from validation_framework.common.metrics import metrics
+from validation_framework.deployer.coe.docker_api import TRANSPORT_ERRORS, DockerAPIClient, DockerAPIError
+
+# A container dying this many times within the window is considered crash looping
+CRASH_LOOP_DEATHS: int = 3
+CRASH_LOOP_WINDOW: float = 120
+
+
+@dataclass
+class ContainerState:
+    """
+    Last known state of a container. status is one of created, running, exited or
+    removed. health is None for containers without health check
+    """
+    id: str
+    name: str
+    image: str = ''
+    status: str = 'created'
+    health: str | None = None
+    exit_code: int | None = None
+    oom_killed: bool = False
+    created_at: float | None = None
+    started_at: float | None = None
+    finished_at: float | None = None
+    restarts: int = 0
+    deaths: deque = field(default_factory=lambda: deque(maxlen=CRASH_LOOP_DEATHS))
+
+    @property
+    def running(self) -> bool:
+        return self.status == 'running'
+
+    @property
+    def healthy(self) -> bool:
+        return self.running and self.health in (None, 'healthy')
+
+    @property
+    def crash_looping(self) -> bool:
+        return len(self.deaths) == CRASH_LOOP_DEATHS and self.deaths[-1] - self.deaths[0] <= CRASH_LOOP_WINDOW
+
+
+def health_from_status(status: str) -> str | None:
+    """
+    :param status: Container status as listed (e.g. Up 2 minutes (healthy))
+    :return: Health of the container, None if it has no health check
+    """
+    for health in ('healthy', 'unhealthy', 'starting'):
+        if f'({health})' in status or f'(health: {health})' in status:
+            return 'healthy' if health == 'healthy' else health
+    return None
+
+
+class ContainerTracker(threading.Thread):
+    """
+    Daemon thread tracking the containers of a compose project
+    """
+
+    def __init__(self, api: DockerAPIClient, project: str, idle_timeout: float = 30):
+        """
+        :param api: Docker Engine API client of the device
+        :param project: Compose project whose containers are tracked
+        :param idle_timeout: Seconds without events before resubscribing to the stream
+        """
+        super().__init__(daemon=True, name=f'container-tracker-{project}')
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.api: DockerAPIClient = api
+        self.project: str = project
+        self.idle_timeout: float = idle_timeout
+        # Metrics of the tracker belong to the test that started it
+        self._scope = metrics.current_scope()
+
+        self._containers: dict[str, ContainerState] = {}
+        self._condition: threading.Condition = threading.Condition()
+        self._exit: threading.Event = threading.Event()
+        self._synced: threading.Event = threading.Event()
+        self._last_event: float = 0
+
+    @property
+    def synced(self) -> bool:
+        """
+        :return: Whether the table is up to date (stream connected)
+        """
+        return self._synced.is_set() and self.is_alive()
+
+    def wait_synced(self, timeout: float = 10) -> bool:
+        return self._synced.wait(timeout)
+
+    def stop(self) -> None:
+        self._exit.set()
+        self._synced.clear()
+
+    # ------------------------------------------------------------------------
+    # Event stream
+    # ------------------------------------------------------------------------
+    def _filters(self) -> dict:
+        return {'type': ['container'], 'label': [f'com.docker.compose.project={self.project}']}
+
+    def _seed(self) -> None:
+        # Daemon time, taken before listing so no later event is missed
+        now: float = self.api.system_time()
+        containers: list[dict] = self.api.containers(filters={'label': self._filters()['label']})
+        with self._condition:
+            seen: set[str] = set()
+            for c in containers:
+                state: ContainerState = self._containers.setdefault(
+                    c['Id'], ContainerState(id=c['Id'], name=c['Names'][0].lstrip('/'), created_at=c.get('Created')))
+                state.image = c.get('Image', '')
+                state.status = 'running' if c.get('State') == 'running' else c.get('State', 'created')
+                state.health = health_from_status(c.get('Status', ''))
+                if state.running and state.started_at is None:
+                    state.started_at = now
+                seen.add(c['Id'])
+            for container_id, state in self._containers.items():
+                if container_id not in seen:
+                    state.status = 'removed'
+            self._condition.notify_all()
+        self._last_event = max(self._last_event, now)
+
+    def run(self) -> None:
+        with metrics.adopt_scope(self._scope):
+            self._track()
+
+    def _track(self) -> None:
+        backoff: float = 1
+        while not self._exit.is_set():
+            try:
+                if not self._synced.is_set():
+                    self._seed()
+                self._follow()
+                ex: Exception = ConnectionError('stream closed by the daemon')
+            except TimeoutError:
+                # No events within the idle timeout, resubscribe
+                backoff = 1
+                continue
+            except (DockerAPIError, *TRANSPORT_ERRORS, ValueError) as error:
+                ex = error
+
+            if self._exit.is_set():
+                break
+            self.logger.debug(f'Events stream of {self.project} lost ({ex}), resubscribing in {backoff}s')
+            self._synced.clear()
+            self._exit.wait(backoff)
+            backoff = min(backoff * 2, 30)
+        self.logger.debug(f'Container tracker of {self.project} finished')
+
+    def _follow(self) -> None:
+        # Events are replayed from the last one seen, duplicates are discarded by time
+        events = self.api.events(filters=self._filters(), since=self._last_event, timeout=self.idle_timeout)
+        try:
+            self._synced.set()
+            for event in events:
+                if self._exit.is_set():
+                    return
+                self._apply(event)
+        finally:
+            events.close()
+
+    def _apply(self, event: dict) -> None:
+        timestamp: float = event.get('timeNano', event.get('time', 0) * 1e9) / 1e9
+        if timestamp <= self._last_event:
+            return
+        self._last_event = timestamp
+
+        action: str = event.get('Action', '')
+        attributes: dict = event.get('Actor', {}).get('Attributes', {})
+        container_id: str = event.get('Actor', {}).get('ID', event.get('id', ''))
+
+        with self._condition:
+            state: ContainerState = self._containers.setdefault(
+                container_id, ContainerState(id=container_id, name=attributes.get('name', container_id)))
+            state.image = attributes.get('image', state.image)
+
+            if action == 'create':
+                state.status, state.created_at = 'created', timestamp
+            elif action == 'start':
+                if state.started_at is not None:
+                    state.restarts += 1
+                    metrics.increment('docker.containers.restarts')
+                    self.logger.info(f'Container {state.name} restarted ({state.restarts} restarts)')
+                state.status, state.started_at, state.health = 'running', timestamp, None
+            elif action == 'die':
+                looping: bool = state.crash_looping
+                state.status, state.finished_at = 'exited', timestamp
+                state.exit_code = int(attributes.get('exitCode', 0))
+                state.deaths.append(timestamp)
+                if state.crash_looping and not looping:
+                    metrics.increment('docker.containers.crash_loops')
+                    self.logger.warning(f'Container {state.name} crash looping, last exit code {state.exit_code}')
+            elif action == 'oom':
+                state.oom_killed = True
+            elif action.startswith('health_status'):
+                state.health = action.split(':', 1)[1].strip()
+            elif action == 'destroy':
+                state.status = 'removed'
+            else:
+                return
+            self._condition.notify_all()
+
+    # ------------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------------
+    def containers(self) -> list[ContainerState]:
+        """
+        :return: Copy of the state of the tracked containers, removed ones excluded
+        """
+        with self._condition:
+            return [copy.deepcopy(s) for s in self._containers.values() if s.status != 'removed']
+
+    def running_names(self) -> set[str]:
+        with self._condition:
+            return {s.name for s in self._containers.values() if s.running}
+
+    def wait_for(self, predicate: Callable[[dict[str, ContainerState]], bool], timeout: float) -> bool:
+        """
+        Blocks until the predicate, evaluated on the container table indexed by name, holds
+        :param predicate: Condition on the container states
+        :param timeout: Maximum seconds to wait
+        :return: Whether the predicate holds
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: predicate({s.name: s for s in self._containers.values()}), timeout)
+
+    def wait_for_containers(self, names: set[str], healthy: bool = False, timeout: float = 60) -> bool:
+        """
+        Waits until all the containers are running (and healthy if requested)
+        :param names: Container names
+        :param healthy: Also wait for their health checks to pass
+        :param timeout: Maximum seconds to wait
+        :return: Whether all of them are running within the timeout
+        """
+        def ready(table: dict[str, ContainerState]) -> bool:
+            return all(n in table and (table[n].healthy if healthy else table[n].running) for n in names)
+        return self.wait_for(ready, timeout)
+
+    def report(self) -> dict:
+        """
+        :return: Restarts, crash loops and exit codes of the tracked containers
+        """
+        with self._condition:
+            return {s.name: {'status': s.status,
+                             'health': s.health,
+                             'restarts': s.restarts,
+                             'crash_looping': s.crash_looping,
+                             'exit_code': s.exit_code,
+                             'oom_killed': s.oom_killed} for s in self._containers.values()}
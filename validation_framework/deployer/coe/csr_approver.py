@@ -0,0 +1,187 @@
+"""
+Watch based approval of the certificate signing requests (CSR) of the engine. A
+'kubectl get csr --watch' stream reports every CSR as soon as it is created or updated,
+so the engine CSR is approved right away instead of polling the cluster for it.
+
+The engine CSR is the one named after the NuvlaEdge id or requested by a service
+account of the engine namespace. The latency from its creation to its approval, in the
+cluster clock, is recorded in the metrics.
+"""
+import codecs
+import json
+import logging
+import shlex
+import threading
+from datetime import datetime
+from typing import Callable
+
+from validation_framework.common.metrics import metrics
+from validation_framework.deployer.target_device.target import TargetDevice
+
+# Seconds each watch runs before being restarted, bounds the shutdown time of the approver
+CSR_WATCH_SLICE: int = 10
+# Exit codes of a watch finished by its time slice
+_WATCH_SLICE_END: tuple = (0, 124)
+
+
+class _JSONStreamSink:
+    """
+    Sink decoding the concatenated JSON documents written into it, as printed by
+    kubectl get --watch -o json
+    """
+
+    def __init__(self, callback: Callable[[dict], None]):
+        self._callback: Callable[[dict], None] = callback
+        self._decoder: json.JSONDecoder = json.JSONDecoder()
+        self._text: codecs.IncrementalDecoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._buffer: str = ''
+
+    def write(self, data: bytes) -> int:
+        self._buffer = (self._buffer + self._text.decode(data)).lstrip()
+        while self._buffer:
+            try:
+                document, end = self._decoder.raw_decode(self._buffer)
+            except ValueError:
+                # Incomplete document, wait for more data
+                break
+            self._buffer = self._buffer[end:].lstrip()
+            self._callback(document)
+        return len(data)
+
+
+def _cluster_time(timestamp: str) -> float:
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+
+
+class CSRApprover:
+    """
+    Approves the engine CSR from a background thread (start/stop)
+    """
+
+    def __init__(self, device: TargetDevice, namespace: str, uuid: str, envs: dict | None = None):
+        """
+        :param device: Device running the cluster
+        :param namespace: Namespace of the engine
+        :param uuid: NuvlaEdge id (without resource type)
+        :param envs: Environmental variables of kubectl (e.g. KUBECONFIG)
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.device: TargetDevice = device
+        self.namespace: str = namespace
+        self.uuid: str = uuid
+        self.envs: dict = envs or {}
+
+        # CSR name: seconds from its creation to its approval
+        self.approved: dict[str, float] = {}
+        self._requested: set[str] = set()
+        self._exit: threading.Event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ------------------------------------------------------------------------
+    # Commands
+    # ------------------------------------------------------------------------
+    def _sudo(self, command: str) -> str:
+        # sudo resets the environment, variables are passed through env instead
+        envs: str = ' '.join(f'{k}={shlex.quote(str(v))}' for k, v in self.envs.items())
+        return f'sudo env {envs} {command}'
+
+    def _watch_command(self) -> str:
+        return self._sudo(f'timeout {CSR_WATCH_SLICE} kubectl get certificatesigningrequests --watch -o json')
+
+    def _approve_command(self, name: str) -> str:
+        return self._sudo(f'kubectl certificate approve {shlex.quote(name)}')
+
+    # ------------------------------------------------------------------------
+    # CSR events
+    # ------------------------------------------------------------------------
+    def _is_engine_csr(self, csr: dict) -> bool:
+        name: str = csr.get('metadata', {}).get('name', '')
+        username: str = csr.get('spec', {}).get('username', '')
+        return self.uuid in name or username.startswith(f'system:serviceaccount:{self.namespace}:')
+
+    def _on_csr(self, csr: dict) -> str | None:
+        """
+        Tracks the state of the CSR
+        :return: The name of the CSR if it has to be approved
+        """
+        if csr.get('kind') != 'CertificateSigningRequest' or not self._is_engine_csr(csr):
+            return None
+
+        name: str = csr['metadata']['name']
+        conditions: list[dict] = (csr.get('status') or {}).get('conditions') or []
+        approved: dict | None = next((c for c in conditions if c.get('type') == 'Approved'), None)
+        if approved is None:
+            if any(c.get('type') in ('Denied', 'Failed') for c in conditions):
+                self.logger.warning(f'Certificate {name} was {conditions[0]["type"].lower()}')
+                return None
+            return None if name in self._requested else name
+
+        if name not in self.approved:
+            created: str = csr['metadata'].get('creationTimestamp', '')
+            approved_at: str = approved.get('lastUpdateTime', '')
+            latency: float = (_cluster_time(approved_at) - _cluster_time(created)) if created and approved_at else 0
+            self.approved[name] = latency
+            metrics.record('kubernetes.csr.approval_latency', latency)
+            self.logger.info(f'Certificate {name} approved {latency:.0f}s after its creation')
+        return None
+
+    def _approved(self, name: str, ex: Exception | None) -> None:
+        if ex is not None:
+            self._requested.discard(name)
+            self.logger.warning(f'Approval of csr {name} failed : {ex}')
+            return
+        metrics.increment('kubernetes.csr.approved')
+        self.logger.info(f'Approved certificate {name}')
+
+    # ------------------------------------------------------------------------
+    # Thread
+    # ------------------------------------------------------------------------
+    def start(self) -> None:
+        self._exit.clear()
+        self._thread = threading.Thread(target=metrics.bind(self._run), daemon=True, name=f'csr-approver-{self.uuid}')
+        self._thread.start()
+
+    def stop(self, timeout: float | None = CSR_WATCH_SLICE + 5) -> None:
+        """
+        Stops the approver, waiting for the running watch to finish
+        """
+        self._exit.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _approve(self, csr: dict) -> None:
+        name: str | None = self._on_csr(csr)
+        if name is None:
+            return
+        self._requested.add(name)
+        try:
+            self.device.run_sudo_command(self._approve_command(name))
+            self._approved(name, None)
+        except Exception as ex:
+            self._approved(name, ex)
+
+    def _run(self) -> None:
+        backoff: float = 1
+        while not self._exit.is_set():
+            try:
+                exit_code: int = self.device.stream_command(self._watch_command(), _JSONStreamSink(self._approve),
+                                                            sudo=True)
+                if exit_code in _WATCH_SLICE_END:
+                    backoff = 1
+                    continue
+                self.logger.debug(f'CSR watch exited with code {exit_code}, restarting in {backoff}s')
+            except Exception as ex:
+                self.logger.debug(f'CSR watch failed in {self.device} ({ex}), restarting in {backoff}s')
+            self._exit.wait(backoff)
+            backoff = min(backoff * 2, 30)
+        self.logger.debug('Exiting certificate approver')
+
+    # ------------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------------
+    def report(self) -> dict[str, float]:
+        """
+        :return: Seconds from creation to approval of each approved engine CSR
+        """
+        return dict(self.approved)
@@ -1,12 +1,22 @@
 import logging
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 import invoke
 import requests
 
+from validation_framework.common.metrics import metrics
+from validation_framework.common.polling import poll_until
 from validation_framework.common.nuvla_uuid import NuvlaUUID
-from validation_framework.deployer.coe import COEBase
+from validation_framework.deployer.coe import COEBase, image_pull
+from validation_framework.deployer.coe.container_tracker import ContainerTracker, health_from_status
+from validation_framework.deployer.coe.docker_api import TRANSPORT_ERRORS, DockerAPIClient, DockerAPIError
+from validation_framework.deployer.coe.image_cache import DOCKER_LOADER, image_cache
+from validation_framework.deployer.coe.purge import PurgeReport, docker_purge_command
+from validation_framework.deployer.compose_cache import compose_cache
 from validation_framework.deployer.target_device.target import TargetDeviceConfig
-from validation_framework.deployer.target_device.ssh_target import SSHTarget
+from validation_framework.deployer.target_device import target_factory
 from validation_framework.common import constants as cte
 from fabric import Result
 from pathlib import Path
@@ -17,7 +27,10 @@ class DockerCOE(COEBase):
 
     def __init__(self, device_config: TargetDeviceConfig, **kwargs):
         self.engine_folder: str = ''
-        self.device = SSHTarget(device_config)
+        self.device = target_factory(device_config)
+        self._api: DockerAPIClient | None = None
+        self._api_available: bool = True
+        self.tracker: ContainerTracker | None = None
         super().__init__(self.device, logging.getLogger(__name__), **kwargs)
 
         self.assess_nuvlaedge_sourcecode_configuration()
@@ -65,24 +78,13 @@ class DockerCOE(COEBase):
                 version=self.nuvlaedge_version,
                 file='{file}')
 
-    def start_engine(self,
-                     uuid: NuvlaUUID,
-                     remove_old_installation: bool = True,
-                     extra_envs: dict = None,
-                     project_name: str = cte.PROJECT_NAME):
-
-        if remove_old_installation:
-            self.purge_engine()
-        engine_base_link = self.deployment_link.format(file=cte.ENGINE_BASE_FILE_NAME)
-        files_path = self.download_files(engine_base_link, self.nuvlaedge_version)
+    def _start_command(self, files_path: list[str], project_name: str) -> str:
         files: str = ' -f '.join(files_path)
-        start_command: str = cte.COMPOSE_UP.format(prepend='nohup',
-                                                   project_name=project_name,
-                                                   files=files)
-        self.project_name = project_name
-
-        self.logger.debug(f'Starting engine with command: \n\n\t{start_command}\n')
+        return cte.COMPOSE_UP.format(prepend='nohup',
+                                     project_name=project_name,
+                                     files=files)
 
+    def _engine_envs(self, uuid: NuvlaUUID, extra_envs: dict = None) -> dict:
         self.engine_configuration.nuvlabox_uuid = uuid
         self.engine_configuration.nuvlaedge_uuid = uuid
 
@@ -94,9 +96,33 @@ class DockerCOE(COEBase):
         self.logger.info(f'Starting NuvlaEdge with UUID: {uuid} with'
                          f' configuration: '
                          f'\n\n {json.dumps(envs_configuration, indent=4)} \n')
+        return envs_configuration
+
+    def start_engine(self,
+                     uuid: NuvlaUUID,
+                     remove_old_installation: bool = True,
+                     extra_envs: dict = None,
+                     project_name: str | None = None):
+
+        if remove_old_installation:
+            self.purge_engine()
+        engine_base_link = self.deployment_link.format(file=cte.ENGINE_BASE_FILE_NAME)
+        files_path = self.download_files(engine_base_link, self.nuvlaedge_version)
+        self._set_project(project_name)
+        start_command: str = self._start_command(files_path, self.project_name)
+
+        self.logger.debug(f'Starting engine with command: \n\n\t{start_command}\n')
+
+        envs_configuration: dict = self._engine_envs(uuid, extra_envs)
+        self._start_tracker()
         self.device.run_command(start_command, envs=envs_configuration)
         self.logger.info('Device start command executed')
 
+    def _set_project(self, project_name: str | None) -> None:
+        if project_name:
+            self.project_name = project_name
+            self.engine_configuration.compose_project_name = project_name
+
     def add_peripheral(self):
         pass
 
@@ -104,66 +130,155 @@ class DockerCOE(COEBase):
         pass
 
 
+    def _stop_command(self) -> str:
+        return (f'docker ps -q --filter label=com.docker.compose.project={self.project_name} | '
+                'xargs -r docker stop')
+
+    @property
+    def api(self) -> DockerAPIClient:
+        """
+        Docker Engine API client of the device, through the target transport
+        """
+        if self._api is None:
+            self._api = DockerAPIClient(self.device.open_docker_socket)
+        return self._api
+
+    def _use_api(self, query: Callable, fallback: Callable):
+        """
+        Runs the query through the Docker Engine API. If the API cannot be reached (e.g.
+        docker system dial-stdio not available in the device), the CLI based fallback
+        is used from then on
+        """
+        if self._api_available:
+            try:
+                return query()
+            except TRANSPORT_ERRORS as ex:
+                self.logger.warning(f'Docker Engine API not available in {self.device}, '
+                                    f'falling back to the CLI: {ex}')
+                self._api_available = False
+        return fallback()
+
+    def _start_tracker(self) -> None:
+        """
+        Subscribes to the container events of the engine project, so its state is
+        answered from memory. Without Docker Engine API the state keeps being queried
+        """
+        self._stop_tracker()
+        if not self._api_available:
+            return
+
+        tracker: ContainerTracker = ContainerTracker(self.api, self.project_name)
+        tracker.start()
+        if not tracker.wait_synced(10):
+            self.logger.warning(f'Unable to track the containers of {self.device}, querying them instead')
+            tracker.stop()
+            return
+        self.tracker = tracker
+
+    def _stop_tracker(self) -> None:
+        if self.tracker is None:
+            return
+        self.logger.debug(f'Engine containers report: {json.dumps(self.tracker.report(), indent=4)}')
+        self.tracker.stop()
+        self.tracker = None
+
+    @property
+    def _tracking(self) -> bool:
+        return self.tracker is not None and self.tracker.synced
+
+    def _project_filter(self) -> dict:
+        return {'label': [f'com.docker.compose.project={self.project_name}']}
+
+    def _running_containers(self) -> list[dict]:
+        """
+        :return: Running containers, with the docker ps fields (Names, Image, State...)
+        """
+        def query() -> list[dict]:
+            return [{'ID': c['Id'],
+                     'Names': ','.join(n.lstrip('/') for n in c.get('Names', [])),
+                     'Image': c.get('Image', ''),
+                     'State': c.get('State', ''),
+                     'Status': c.get('Status', '')}
+                    for c in self.api.containers(all_containers=False)]
+
+        return self._use_api(query, lambda: self.snapshot('containers').running_containers())
+
+    def _stop_containers(self) -> None:
+        containers: list[dict] = self.api.containers(all_containers=False, filters=self._project_filter())
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(metrics.bind(lambda c: self.api.stop(c['Id'])), containers))
+
     def stop_engine(self):
-        command = 'docker stop $(docker ps -a --format "{{.ID}} {{.Names}}" | grep -vE "nuvlaedge-agent|sshgateway|shellinabox" | awk "{print $1}")'
         try:
-            self.device.run_command(command)
+            self._use_api(self._stop_containers, lambda: self.device.run_command(self._stop_command()))
         except invoke.exceptions.UnexpectedExit:
             self.logger.debug("No containers to stop")
             pass
         except Exception as ex:
             self.logger.warning(f'Unable to run commands on {self.device} {ex} ')
 
-    def get_authorized_keys(self):
-        return self.device.run_command("cat ~/.ssh/authorized_keys")
-
     def peripherals_running(self, peripherals: set) -> bool:
-        cont_filter: dict = {"Names": "{{ .Names }}"}
-
-        data: list[dict] = self.device.get_remote_containers(
-            containers_filter=cont_filter)
+        running: set[str] = self.tracker.running_names() if self._tracking else \
+            {c.get('Names') for c in self._running_containers()}
 
-        # Find network container in list
-        self.logger.debug('Removing ')
-        for c in data:
-            if peripherals.__contains__(c):
-                peripherals.remove(c.get("Names"))
+        # Remove the running peripherals from the expected ones
+        self.logger.debug(f'Running containers: {running}')
+        peripherals.difference_update(running)
         return not bool(peripherals)
 
-    def get_remote_containers(self, containers_filter: dict = None) -> list:
-        return self.device.get_remote_containers(containers_filter)
+    def wait_for_peripherals(self, peripherals: set, timeout: float = 60, interval: float = 5) -> bool:
+        if not self._tracking:
+            return super().wait_for_peripherals(peripherals, timeout, interval)
+        return self.tracker.wait_for(lambda table: all(p in table and table[p].running for p in peripherals),
+                                     timeout)
 
-    def get_engine_logs(self):
-        self.logger.info(f'Retrieving Log files from engine run with UUID: {self.engine_configuration.nuvlaedge_uuid}')
-        # 1. Retrieve deployment containers ID's
-        result: Result = self.device.run_command(
-            "docker ps -a --format '{\"ID\":\"{{ .ID }}\", \"Image\": \"{{ .Image }}\", \"Names\":\"{{ .Names }}\"}' "
-            f"--filter label=com.docker.compose.project={self.engine_configuration.compose_project_name} | jq --tab -s .")
+    def wait_for_containers(self, names: set[str], healthy: bool = False, timeout: float = 60) -> bool:
+        """
+        Waits until the engine containers are running, and healthy if requested
+        :param names: Container names
+        :param healthy: Also wait for their health checks to pass
+        :param timeout: Maximum seconds to wait
+        :return: Whether all of them are ready within the timeout
+        """
+        if self._tracking:
+            return self.tracker.wait_for_containers(names, healthy, timeout)
 
-        self.logger.debug(f'Extracting logs from: \n\n\t{result.stdout}\n')
-        containers = json.loads(result.stdout)
+        def ready() -> set[str]:
+            return {c['Names'] for c in self._running_containers()
+                    if not healthy or health_from_status(c.get('Status', '')) in (None, 'healthy')}
+        return poll_until(ready, lambda running: names <= running, timeout=timeout,
+                          name='docker.containers.wait', max_interval=5).success
 
-        # 2. Iteratively copy files from /var/docker/logs/<container_id>.log to
-        # /tmp/<new_folder> and chmod before transferring it the running machine
-        self.device.run_command(
-            f'mkdir -p /tmp/{self.engine_configuration.compose_project_name}/logs')
-        local_tmp_path: Path = Path(f'/tmp/{self.engine_configuration.compose_project_name}/logs')
-        local_tmp_path.mkdir(parents=True, exist_ok=True)
+    def get_remote_containers(self, containers_filter: dict = None) -> list:
+        if containers_filter is not None:
+            return self.device.get_remote_containers(containers_filter)
+        return self._use_api(
+            lambda: [{c['ID']: {'Image': c['Image'], 'Names': c['Names']}} for c in self._running_containers()],
+            lambda: self.device.get_remote_containers())
 
-        self.device.run_sudo_command(
-            f'sudo chmod 777 /tmp/{self.engine_configuration.compose_project_name}/logs'
-        )
+    def _engine_containers_command(self) -> str:
+        return (f"docker ps -a --format '{{{{ .Names }}}}' "
+                f"--filter label=com.docker.compose.project={self.project_name}")
 
-        for c in containers:
-            # 3. Download and transfer back the files
-            self.get_container_logs(c, True, local_tmp_path)
+    def _running_engine_command(self) -> str:
+        return f'docker ps -q --filter label=com.docker.compose.project={self.project_name}'
 
-        # 4. Remove remote temporal folder
-        self.device.run_sudo_command(
-            f'sudo rm -r /tmp/{self.engine_configuration.compose_project_name}/')
+    def get_engine_logs(self, path: Path = None) -> dict[str, Path]:
+        self.logger.info(f'Retrieving Log files from engine run with UUID: {self.engine_configuration.nuvlaedge_uuid}')
+        return self._stream_logs(self._engine_containers_command(), 'docker logs "$name"', path)
 
     def get_container_logs(self, container, download_to_local=False, path: Path = None):
         c_name = container.get('Names')
+        if download_to_local and path is not None and self._api_available:
+            # Streamed straight into the local file, no copy left in the device
+            try:
+                with (path / (c_name + '.log')).open('ab') as log_file:
+                    for _, data in self.api.logs(c_name):
+                        log_file.write(data)
+                return
+            except (DockerAPIError, *TRANSPORT_ERRORS) as ex:
+                self.logger.warning(f'Unable to stream logs of {c_name} through the Docker Engine API: {ex}')
+
         get_logs_cmd = f'sudo docker logs {c_name} >> /tmp/{self.engine_configuration.compose_project_name}/{c_name}.log'
 
         self.logger.debug(f'Processing logs for nuvlaedge {c_name}')
@@ -179,42 +294,45 @@ class DockerCOE(COEBase):
                 local_file_path=path / (c_name + '.log'))
 
     def engine_running(self) -> bool:
+        if self._tracking:
+            return bool(self.tracker.running_names())
+        # Only the containers of the engine project, other engines may share the device
         try:
-            result: Result = self.device.run_command(f'docker ps | grep {cte.PROJECT_NAME}')
-        except invoke.exceptions.UnexpectedExit:
+            return bool(self._use_api(
+                lambda: self.api.containers(all_containers=False, filters=self._project_filter()),
+                lambda: self.device.run_command(self._running_engine_command()).stdout.split()))
+        except Exception as ex:
+            self.logger.warning(f'Unable to gather containers from {self.device}: {ex}')
             return False
-        return result.stdout.strip() != ''
 
     def _get_all_containers(self) -> list[dict]:
-        result: Result = self.device.run_command('docker ps --all --format=json')
-        containers = []
-        try:
-            containers: list[dict] = [json.loads(entry) for entry in result.stdout.split("\n")]
-        except:
-            pass
-        return containers
+        return self.api.containers()
 
-    def remove_engine(self, uuid: NuvlaUUID = None, black_list: list = None):
+    def remove_engine(self, uuid: NuvlaUUID = None, black_list: list = None) -> PurgeReport:
         """
-        Removes docker containers, services, volumes and networks from the device
-        :return: None
+        Removes the containers, networks and volumes of the engine compose project from
+        the device. Images and resources of other projects are kept
+        :return: Report of the removed resources
         """
-        self.logger.info(f'Purging engine in device {self.device}')
-
-        command_list: list = ['docker service rm $(docker service ls -q)',
-                              'docker rm $(docker ps -a -q)',
-                              'docker network prune --force',
-                              'docker volume rm $(docker volume ls -q)']
+        self._stop_tracker()
+        self.logger.info(f'Purging engine {self.project_name} in device {self.device}')
+        start_time: float = time.perf_counter()
+        try:
+            result: Result = self.device.run_command(docker_purge_command(self.project_name))
+        except Exception as ex:
+            self.logger.warning(f'Unable to run commands on {self.device} {ex}')
+            return PurgeReport(project=self.project_name, errors=[str(ex)])
 
-        for cmd in command_list:
-            try:
-                result = self.device.run_command(cmd)
+        return self._purge_report(result, time.perf_counter() - start_time)
 
-                self.logger.info(f'Command {cmd} result: {result.stdout}')
-            except invoke.exceptions.UnexpectedExit:
-                pass
-            except Exception as ex:
-                self.logger.warning(f'Unable to run commands on {self.device} {ex}')
+    def _purge_report(self, result: Result, duration: float) -> PurgeReport:
+        report: PurgeReport = PurgeReport.from_output(self.project_name, result.stdout, result.stderr, duration)
+        metrics.record('coe.purge.time', report.duration)
+        metrics.increment('coe.purge.removed', report.total_removed)
+        self.logger.info(report.summary())
+        for error in report.errors:
+            self.logger.debug(f'Purge error: {error}')
+        return report
 
     def get_coe_type(self):
         return "docker"
@@ -222,20 +340,51 @@ class DockerCOE(COEBase):
     def finish_tasks(self):
         pass
 
-    def purge_engine(self, uuid: NuvlaUUID = None, black_list: list = None):
-        self.stop_engine()
-        self.remove_engine(uuid, black_list=black_list)
+    def purge_engine(self, uuid: NuvlaUUID = None, black_list: list = None) -> PurgeReport:
+        # Containers are force removed, no need to stop them first
+        return self.remove_engine(uuid, black_list=black_list)
+
+    def _pull_command(self, services: list[str] | None = None) -> str:
+        return f'docker compose -f {self._compose_file()} pull {" ".join(services or [])}'.rstrip()
+
+    def _config_command(self) -> str:
+        return f'docker compose -f {self._compose_file()} config --format json'
+
+    def _fetch_compose_file(self, source: str) -> Path:
+        """
+        :param source: Download link of the engine compose file
+        :return: Local path of the compose file, from the runner compose cache
+        """
+        if self.deployment_branch:
+            return compose_cache.fetch_branch(self.deployment_branch, cte.ENGINE_BASE_FILE_NAME, source)
+        return compose_cache.fetch(source, compose_cache.release_key(str(self.nuvlaedge_version)),
+                                   cte.ENGINE_BASE_FILE_NAME)
+
+    def _engine_folder(self, version) -> str:
+        folder: str = cte.ROOT_PATH + cte.ENGINE_PATH + str(version)
+        # Concurrent engines do not overwrite the compose file in use by another one
+        return f'{folder}_{self.project_name}' if self.isolated else folder
+
+    def _compose_file(self) -> str:
+        return self.engine_folder + '/' + cte.ENGINE_BASE_FILE_NAME
 
     def download_files(self, source, version) -> list[str]:
-        self.engine_folder = cte.ROOT_PATH + cte.ENGINE_PATH + version
+        """
+        Fetches the deployment files through the runner compose cache and pushes them to
+        the device, skipping the transfer if the device already holds the same content
+        :param source: Download link of the engine compose file
+        :param version: NuvlaEdge version, naming the engine folder in the device
+        :return: The compose files in the device. Empty if unavailable
+        """
+        self.engine_folder = self._engine_folder(version)
         self.device.run_command(f'mkdir -p {self.engine_folder}')
-        self.logger.info(f'Downloading deployment files into {self.engine_folder}')
-        # Download deployment files
-        if not self.device.download_file(link=source,
-                                         file_name=cte.ENGINE_BASE_FILE_NAME,
-                                         directory=self.engine_folder):
+        self.logger.info(f'Pushing deployment files into {self.engine_folder}')
+        try:
+            local_file: Path = self._fetch_compose_file(source)
+            compose_cache.push(self.device, local_file, self._compose_file())
+        except (OSError, ValueError, requests.RequestException) as ex:
             self.logger.error(f'Deployment file {cte.ENGINE_BASE_FILE_NAME} could not'
-                              f' be downloaded from {source}')
+                              f' be provided from {source}: {ex}')
             return []
 
         # TODO: iterate here when peripheral validation is implemented to download the
@@ -243,9 +392,61 @@ class DockerCOE(COEBase):
         # ------------------------------------------------------------------------
         # Pull nuvlaedge image(s)
         # ------------------------------------------------------------------------
-        pull_result: Result = self.device.run_command(f'docker compose -f '
-                                                      f'{self.engine_folder + "/" + cte.ENGINE_BASE_FILE_NAME} '
-                                                      f'pull',
-                                                      envs=self.engine_configuration.model_dump(
-                                                          by_alias=True))
-        return [self.engine_folder + '/' + cte.ENGINE_BASE_FILE_NAME] if not pull_result.failed else []
+        return [self._compose_file()] if self._pull_images() else []
+
+    def _pull_images(self) -> bool:
+        """
+        Pulls the images of the engine services missing or outdated in the device. Compose
+        pulls the services in parallel
+        :return: True if the images are available in the device
+        """
+        envs: dict = self.engine_configuration.model_dump(by_alias=True)
+        try:
+            services: dict[str, str] = image_pull.compose_images(
+                self.device.run_command(self._config_command(), envs=envs).stdout)
+            local: dict = image_pull.local_digests(self.device.run_command(image_pull.LIST_IMAGES_COMMAND).stdout)
+        except (invoke.exceptions.UnexpectedExit, ValueError) as ex:
+            self.logger.warning(f'Unable to resolve the engine images, pulling all of them: {ex}')
+            return not self.device.run_command(self._pull_command(), envs=envs).failed
+
+        stale: list[str] = self._seed_images(services, image_pull.stale_services(services, local), local)
+        start_time: float = time.perf_counter()
+        if stale:
+            self.logger.info(f'Pulling services {stale}')
+            if self.device.run_command(self._pull_command(stale), envs=envs).failed:
+                return False
+        self._record_pull(services, stale, time.perf_counter() - start_time)
+        return True
+
+    def _seed_images(self, services: dict[str, str], stale: list[str], local: dict) -> list[str]:
+        """
+        Transfers the images of the stale services from the runner image cache, if enabled
+        :param services: Image of each service
+        :param stale: Services whose image is missing or outdated in the device
+        :param local: Local images, as returned by image_pull.local_digests
+        :return: The services still to be pulled
+        """
+        if not stale or not image_cache.enabled:
+            return stale
+        present: dict[str, set[str]] = {services[s]: local.get(image_pull.parse_image(services[s]), set())
+                                        for s in stale}
+        seeded: set[str] = image_cache.seed(self.device, list(present), DOCKER_LOADER, present=present)
+        return [s for s in stale if services[s] not in seeded]
+
+    def _record_pull(self, services: dict[str, str], stale: list[str], elapsed: float) -> None:
+        device: str = self.device.target_config.alias
+        pulled: list[str] = [services[s] for s in stale]
+        skipped: list[str] = [i for s, i in services.items() if s not in stale]
+
+        metrics.increment('docker.pull.pulled', len(pulled))
+        metrics.increment('docker.pull.skipped', len(skipped))
+        if pulled:
+            metrics.record('docker.pull.time', elapsed)
+            image_pull.pull_times.update(device, pulled, elapsed)
+
+        # Skipped images would have been pulled in parallel with the pulled ones
+        estimate: float | None = image_pull.pull_times.estimate(device, skipped)
+        if estimate is not None:
+            saved: float = max(0.0, estimate - elapsed) if pulled else estimate
+            metrics.record('docker.pull.saved_time', saved)
+            self.logger.info(f'Skipped pulling {len(skipped)} up to date images, saving {saved:.1f}s')
@@ -0,0 +1,279 @@
+"""
+Docker Engine HTTP API client reaching the daemon of the device through the target
+transport (docker system dial-stdio over the SSH connection, or the local unix socket).
+
+Queries return the structured responses of the API, no CLI is started in the device nor
+any text is parsed. Connections are kept alive and reused, streaming requests (logs,
+events) use a dedicated connection for as long as the stream is consumed.
+"""
+import http.client
+import io
+import json
+import logging
+import queue
+import socket
+import struct
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator
+from urllib.parse import quote, urlencode
+
+from validation_framework.common.metrics import metrics
+
+# Multiplexed streams of the logs of containers without TTY
+STDOUT: int = 1
+STDERR: int = 2
+
+# Errors reaching the daemon, as opposed to error responses of the API (DockerAPIError)
+TRANSPORT_ERRORS: tuple = (OSError, http.client.HTTPException, NotImplementedError)
+
+
+class DockerAPIError(Exception):
+    """
+    Error response of the Docker Engine API
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f'Docker API error {status}: {message}')
+        self.status: int = status
+        self.message: str = message
+
+
+class _ChannelReader(io.RawIOBase):
+    """
+    Raw reader over the recv of a socket like object lacking recv_into (e.g. SSH
+    channels), so responses are read through a regular buffered reader
+    """
+
+    def __init__(self, channel):
+        super().__init__()
+        self._channel = channel
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data: bytes = self._channel.recv(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class _ChannelSocket:
+    def __init__(self, channel):
+        self._channel = channel
+
+    def __getattr__(self, item):
+        return getattr(self._channel, item)
+
+    def makefile(self, mode: str = 'rb', *args, **kwargs) -> io.BufferedReader:
+        return io.BufferedReader(_ChannelReader(self._channel))
+
+
+class _SocketHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over an already connected, socket like, object
+    """
+
+    def __init__(self, opener: Callable, timeout: float):
+        super().__init__('docker', timeout=timeout)
+        self._opener: Callable = opener
+
+    def connect(self):
+        sock = self._opener()
+        self.sock = sock if isinstance(sock, socket.socket) else _ChannelSocket(sock)
+        self.sock.settimeout(self.timeout)
+
+
+class DockerAPIClient:
+    """
+    Thread safe client, each concurrent request uses its own connection
+    """
+
+    def __init__(self, opener: Callable, timeout: float = 60, max_idle: int = 4):
+        """
+        :param opener: Opens a new socket like connection to the daemon (e.g.
+        TargetDevice.open_docker_socket)
+        :param timeout: Socket timeout of the non-streaming requests
+        :param max_idle: Idle connections kept for reuse
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self._opener: Callable = opener
+        self.timeout: float = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=max_idle)
+
+    def _new_connection(self, timeout: float | None) -> _SocketHTTPConnection:
+        metrics.increment('docker.api.connections')
+        return _SocketHTTPConnection(self._opener, timeout)
+
+    @contextmanager
+    def _connection(self):
+        try:
+            connection: _SocketHTTPConnection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = self._new_connection(self.timeout)
+
+        try:
+            yield connection
+        except BaseException:
+            connection.close()
+            raise
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    @staticmethod
+    def _url(path: str, params: dict | None) -> str:
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        for k, v in params.items():
+            if isinstance(v, bool):
+                params[k] = int(v)
+            elif isinstance(v, dict):
+                params[k] = json.dumps(v)
+        return f'{path}?{urlencode(params)}' if params else path
+
+    @staticmethod
+    def _check(response: http.client.HTTPResponse) -> None:
+        if response.status < 400:
+            return
+        body: bytes = response.read()
+        try:
+            message: str = json.loads(body).get('message', '')
+        except ValueError:
+            message = body.decode(errors='replace')
+        raise DockerAPIError(response.status, message)
+
+    def request(self, method: str, path: str, params: dict | None = None, body: dict | None = None):
+        """
+        Runs a request and returns its decoded JSON body (None if empty). Connections
+        found closed by the daemon (e.g. idle ones) are reopened once
+        :param method: HTTP method
+        :param path: API path (e.g. /containers/json)
+        :param params: Query parameters, dictionaries are JSON encoded (e.g. filters)
+        :param body: JSON body
+        :return: Decoded response
+        """
+        url: str = self._url(path, params)
+        payload: bytes | None = json.dumps(body).encode() if body is not None else None
+        headers: dict = {'Content-Type': 'application/json'} if payload is not None else {}
+
+        for attempt in range(2):
+            try:
+                with metrics.timer('docker.api.request_time'), self._connection() as connection:
+                    connection.request(method, url, body=payload, headers=headers)
+                    response: http.client.HTTPResponse = connection.getresponse()
+                    self._check(response)
+                    data: bytes = response.read()
+                    return json.loads(data) if data.strip() else None
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError, EOFError) as ex:
+                if attempt:
+                    raise
+                self.logger.debug(f'Docker API connection lost ({ex}), reconnecting')
+
+    @contextmanager
+    def stream(self, method: str, path: str, params: dict | None = None, timeout: float | None = None):
+        """
+        Runs a streaming request on a dedicated connection, closed when leaving the context
+        :param timeout: Socket timeout while waiting for data. None waits forever
+        :return: The HTTP response, to be read as it arrives
+        """
+        connection: _SocketHTTPConnection = self._new_connection(timeout)
+        try:
+            connection.request(method, self._url(path, params))
+            response: http.client.HTTPResponse = connection.getresponse()
+            self._check(response)
+            yield response
+        finally:
+            connection.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    # ------------------------------------------------------------------------
+    # Containers
+    # ------------------------------------------------------------------------
+    def containers(self, all_containers: bool = True, filters: dict | None = None) -> list[dict]:
+        """
+        :param all_containers: Include stopped containers
+        :param filters: API filters (e.g. {'label': ['com.docker.compose.project=x']})
+        :return: Container summaries (Id, Names, Image, State, Status, Labels...)
+        """
+        return self.request('GET', '/containers/json', {'all': all_containers, 'filters': filters})
+
+    def inspect(self, container: str) -> dict:
+        return self.request('GET', f'/containers/{quote(container)}/json')
+
+    def stop(self, container: str, timeout: int | None = None) -> None:
+        """
+        Stops the container. Already stopped containers are ignored
+        :param timeout: Seconds to wait before killing it
+        """
+        # Already stopped containers are answered with 304 (not an error)
+        self.request('POST', f'/containers/{quote(container)}/stop', {'t': timeout})
+
+    def remove(self, container: str, force: bool = False, volumes: bool = False) -> None:
+        self.request('DELETE', f'/containers/{quote(container)}', {'force': force, 'v': volumes})
+
+    def logs(self, container: str, tail: int | None = None, timestamps: bool = False) -> Iterator[tuple[int, bytes]]:
+        """
+        Streams the logs of the container as they are read from the daemon
+        :param tail: Number of lines from the end of the logs. All of them if None
+        :param timestamps: Prefix each line with its timestamp
+        :return: Iterator of (stream, data) chunks, stream being STDOUT or STDERR
+        """
+        tty: bool = self.inspect(container).get('Config', {}).get('Tty', False)
+        params: dict = {'stdout': True, 'stderr': True, 'timestamps': timestamps,
+                        'tail': tail if tail is not None else 'all'}
+        with self.stream('GET', f'/containers/{quote(container)}/logs', params, timeout=self.timeout) as response:
+            if tty:
+                while data := response.read1(65536):
+                    yield STDOUT, data
+                return
+
+            # Multiplexed stream: 8 bytes header (stream, 0, 0, 0, uint32 size) + payload
+            while header := response.read(8):
+                if len(header) < 8:
+                    return
+                stream, size = struct.unpack('>BxxxL', header)
+                yield stream, response.read(size)
+
+    # ------------------------------------------------------------------------
+    # System
+    # ------------------------------------------------------------------------
+    def events(self, filters: dict | None = None, since: float | None = None,
+               until: float | None = None, timeout: float | None = None) -> Iterator[dict]:
+        """
+        Streams the daemon events. Without until, the stream only finishes when the
+        iterator is closed or the connection lost
+        :param filters: API filters (e.g. {'type': ['container'], 'label': [...]})
+        :param since: Daemon timestamp of the first event, allows replaying past events
+        :param until: Daemon timestamp of the last event
+        :param timeout: Seconds without events before raising TimeoutError
+        :return: Iterator of the decoded events
+        """
+        params: dict = {'filters': filters,
+                        'since': f'{since:.9f}' if since is not None else None,
+                        'until': f'{until:.9f}' if until is not None else None}
+        with self.stream('GET', '/events', params, timeout=timeout) as response:
+            while line := response.readline():
+                if line.strip():
+                    yield json.loads(line)
+
+    def system_time(self) -> float:
+        """
+        :return: Current time of the daemon, the reference of the events timestamps
+        """
+        return datetime.fromisoformat(self.request('GET', '/info')['SystemTime']).timestamp()
+
+    def ping(self) -> bool:
+        try:
+            with self._connection() as connection:
+                connection.request('GET', '/_ping')
+                response: http.client.HTTPResponse = connection.getresponse()
+                return response.status == 200 and response.read() == b'OK'
+        except (OSError, http.client.HTTPException):
+            return False
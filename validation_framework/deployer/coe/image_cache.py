@@ -0,0 +1,332 @@
+"""
+Runner-side cache of the container images of the engine, used to seed the devices
+instead of having each of them pull the images through its own uplink.
+
+Images are downloaded once from their registries (manifest, config and layers) and their
+blobs stored by digest, so layers shared between images are stored once. Images missing
+in a device are streamed to it as a docker archive, loaded with 'docker load' or
+imported into the k3s containerd. No container runtime is needed in the runner.
+
+Cached images are refreshed when their tag points to a new digest in the registry. In
+offline mode the cached images are used as they are.
+"""
+import hashlib
+import json
+import logging
+import os
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+import requests
+
+from validation_framework.common import constants as cte
+from validation_framework.common.metrics import metrics
+from validation_framework.deployer.coe.image_pull import MANIFEST_MEDIA_TYPES, bearer_token, parse_image, \
+    remote_digest
+from validation_framework.deployer.target_device.target import TargetDevice
+
+# Architectures reported by uname -m and their OCI platform (architecture, variant)
+_PLATFORMS: dict[str, tuple[str, str]] = {
+    'x86_64': ('amd64', ''),
+    'amd64': ('amd64', ''),
+    'aarch64': ('arm64', ''),
+    'arm64': ('arm64', ''),
+    'armv7l': ('arm', 'v7'),
+    'armv6l': ('arm', 'v6')}
+
+_CHUNK_SIZE: int = 1024 * 1024
+
+# Loaders of the docker archives in the devices
+DOCKER_LOADER: str = 'docker'
+K3S_LOADER: str = 'k3s'
+
+
+class ImageCacheMiss(FileNotFoundError):
+    """
+    Raised in offline mode when the requested image is not cached
+    """
+
+
+@dataclass
+class CachedImage:
+    """
+    Image of a platform stored in the cache
+    """
+    image: str
+    platform: str
+    # Digest the tag pointed to when cached (index or manifest)
+    digest: str
+    config: str
+    layers: list[str] = field(default_factory=list)
+
+
+def device_platform(device: TargetDevice) -> str:
+    """
+    :return: OCI platform of the device (e.g. linux/amd64, linux/arm/v7)
+    """
+    machine: str = device.run_command('uname -m').stdout.strip()
+    architecture, variant = _PLATFORMS.get(machine, (machine, ''))
+    return f'linux/{architecture}/{variant}' if variant else f'linux/{architecture}'
+
+
+class ImageCache:
+    """
+    Cache layout:
+        <cache_path>/blobs/<sha256>   Configs and layers
+        <cache_path>/index.json       {<image>@<platform>: CachedImage}
+    """
+
+    def __init__(self, cache_path: Path = cte.IMAGE_CACHE_PATH, offline: bool = False, enabled: bool = False):
+        """
+        :param cache_path: Local folder of the cache
+        :param offline: If true, never reaches the registries
+        :param enabled: Whether the COEs seed the devices from the cache
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.cache_path: Path = cache_path
+        self.offline: bool = offline
+        self.enabled: bool = enabled
+
+        self._lock: threading.Lock = threading.Lock()
+        # Images being fetched, so concurrent seeds of the same image download it once
+        self._fetching: dict[str, threading.Lock] = {}
+        self._tokens: dict[tuple[str, str], str] = {}
+
+    @property
+    def _blobs_path(self) -> Path:
+        return self.cache_path / 'blobs'
+
+    @property
+    def _index_path(self) -> Path:
+        return self.cache_path / 'index.json'
+
+    def _blob(self, digest: str) -> Path:
+        return self._blobs_path / digest.split(':', 1)[1]
+
+    def _read_index(self) -> dict[str, dict]:
+        if not self._index_path.is_file():
+            return {}
+        return json.loads(self._index_path.read_text())
+
+    def _cached(self, key: str) -> CachedImage | None:
+        with self._lock:
+            entry: dict | None = self._read_index().get(key)
+        if entry is None:
+            return None
+        cached: CachedImage = CachedImage(**entry)
+        if all(self._blob(d).is_file() for d in [cached.config, *cached.layers]):
+            return cached
+        return None
+
+    def _store(self, key: str, cached: CachedImage) -> None:
+        with self._lock:
+            index: dict[str, dict] = self._read_index()
+            index[key] = asdict(cached)
+            tmp_path: Path = self._index_path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp_path.write_text(json.dumps(index, indent=4, sort_keys=True))
+            tmp_path.replace(self._index_path)
+
+    # ------------------------------------------------------------------------
+    # Registry
+    # ------------------------------------------------------------------------
+    def _get(self, image: str, path: str, accept: str | None = None, stream: bool = False) -> requests.Response:
+        registry, repository, _ = parse_image(image)
+        url: str = f'https://{registry}/v2/{repository}/{path}'
+        headers: dict = {'Accept': accept} if accept else {}
+        if (registry, repository) in self._tokens:
+            headers['Authorization'] = f'Bearer {self._tokens[registry, repository]}'
+
+        response: requests.Response = requests.get(url, headers=headers, stream=stream, timeout=30)
+        challenge: str = response.headers.get('WWW-Authenticate', '')
+        if response.status_code == 401 and 'Bearer' in challenge:
+            token: str | None = bearer_token(challenge, timeout=30)
+            if token:
+                self._tokens[registry, repository] = token
+                headers['Authorization'] = f'Bearer {token}'
+                response = requests.get(url, headers=headers, stream=stream, timeout=30)
+        response.raise_for_status()
+        return response
+
+    def _manifest(self, image: str, platform: str) -> dict:
+        """
+        :return: The image manifest of the platform, resolving multi-platform indexes
+        """
+        _, _, reference = parse_image(image)
+        manifest: dict = self._get(image, f'manifests/{reference}', MANIFEST_MEDIA_TYPES).json()
+        if 'manifests' not in manifest:
+            return manifest
+
+        os_name, architecture, *variant = platform.split('/')
+        for candidate in manifest['manifests']:
+            target: dict = candidate.get('platform', {})
+            if target.get('os') == os_name and target.get('architecture') == architecture and \
+                    (not variant or target.get('variant') == variant[0]):
+                return self._get(image, f'manifests/{candidate["digest"]}', MANIFEST_MEDIA_TYPES).json()
+        raise ValueError(f'Image {image} not available for {platform}')
+
+    def _download_blob(self, image: str, digest: str) -> int:
+        """
+        Downloads the blob verifying its digest, unless already cached
+        :return: Downloaded bytes
+        """
+        blob_path: Path = self._blob(digest)
+        if blob_path.is_file():
+            return 0
+
+        self._blobs_path.mkdir(parents=True, exist_ok=True)
+        tmp_path: Path = blob_path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        sha256 = hashlib.sha256()
+        size: int = 0
+        with self._get(image, f'blobs/{digest}', stream=True) as response, tmp_path.open('wb') as blob:
+            for chunk in response.iter_content(_CHUNK_SIZE):
+                sha256.update(chunk)
+                blob.write(chunk)
+                size += len(chunk)
+
+        if f'sha256:{sha256.hexdigest()}' != digest:
+            tmp_path.unlink(missing_ok=True)
+            raise ValueError(f'Blob {digest} of {image} corrupted while downloading')
+        tmp_path.replace(blob_path)
+        return size
+
+    # ------------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------------
+    def fetch(self, image: str, platform: str) -> CachedImage:
+        """
+        Returns the cached image, downloading it if missing or if its tag points to a new
+        digest. Concurrent fetches of the same image download it once
+        :param image: Image reference
+        :param platform: OCI platform (see device_platform)
+        :return: The cached image
+        """
+        key: str = f'{image}@{platform}'
+        with self._lock:
+            fetching: threading.Lock = self._fetching.setdefault(key, threading.Lock())
+
+        with fetching:
+            cached: CachedImage | None = self._cached(key)
+            if self.offline:
+                if cached is None:
+                    raise ImageCacheMiss(f'Image {image} ({platform}) not cached and running offline')
+                metrics.increment('image_cache.hits')
+                return cached
+
+            digest: str | None = remote_digest(image)
+            if cached is not None and digest in (None, cached.digest):
+                metrics.increment('image_cache.hits')
+                return cached
+            if digest is None:
+                raise ValueError(f'Registry of image {image} not reachable')
+
+            metrics.increment('image_cache.misses')
+            self.logger.info(f'Fetching image {image} ({platform}) into the runner image cache')
+            manifest: dict = self._manifest(image, platform)
+            cached = CachedImage(image=image, platform=platform, digest=digest,
+                                 config=manifest['config']['digest'],
+                                 layers=[layer['digest'] for layer in manifest['layers']])
+            with metrics.timer('image_cache.fetch_time'):
+                fetched: int = sum(self._download_blob(image, d) for d in [cached.config, *cached.layers])
+            metrics.increment('image_cache.fetched_bytes', fetched)
+            self._store(key, cached)
+            return cached
+
+    def archive(self, cached: CachedImage) -> Iterator[bytes]:
+        """
+        Streams the image as a docker archive (docker save format), tagged as the image
+        reference. Layers are kept compressed, as stored in the registry
+        :param cached: Cached image
+        :return: Iterator of the archive chunks
+        """
+        files: list[tuple[str, Path]] = [(f'{cached.config.split(":", 1)[1]}.json', self._blob(cached.config))]
+        files += [(f'{d.split(":", 1)[1]}/layer.tar', self._blob(d)) for d in cached.layers]
+        manifest: bytes = json.dumps([{'Config': files[0][0],
+                                       'RepoTags': [cached.image],
+                                       'Layers': [name for name, _ in files[1:]]}]).encode()
+
+        def header(name: str, size: int) -> bytes:
+            info: tarfile.TarInfo = tarfile.TarInfo(name)
+            info.size, info.mode, info.mtime = size, 0o644, 0
+            return info.tobuf(format=tarfile.USTAR_FORMAT)
+
+        def padding(size: int) -> bytes:
+            return b'\0' * (-size % tarfile.BLOCKSIZE)
+
+        yield header('manifest.json', len(manifest)) + manifest + padding(len(manifest))
+        for name, path in files:
+            size: int = path.stat().st_size
+            yield header(name, size)
+            with path.open('rb') as blob:
+                while chunk := blob.read(_CHUNK_SIZE):
+                    yield chunk
+            yield padding(size)
+        yield b'\0' * (2 * tarfile.BLOCKSIZE)
+
+    # ------------------------------------------------------------------------
+    # Devices
+    # ------------------------------------------------------------------------
+    def _load(self, device: TargetDevice, cached: CachedImage, loader: str) -> bool:
+        if loader == DOCKER_LOADER:
+            return device.feed_command('docker load -q', self.archive(cached)) == 0
+
+        # containerd imports need super user, the archive is transferred first
+        archive_file: str = f'/tmp/{cached.config.split(":", 1)[1]}.tar'
+        if device.feed_command(f'cat > {archive_file}', self.archive(cached)) != 0:
+            return False
+        try:
+            return not device.run_sudo_command(f'sudo k3s ctr images import {archive_file}').failed
+        finally:
+            device.run_command(f'rm -f {archive_file}')
+
+    def seed(self, device: TargetDevice, images: list[str], loader: str = DOCKER_LOADER,
+             present: dict[str, set[str]] | None = None, platform: str | None = None) -> set[str]:
+        """
+        Transfers the images from the runner cache to the device
+        :param device: Target device
+        :param images: Image references
+        :param loader: DOCKER_LOADER or K3S_LOADER
+        :param present: Image IDs (config digests) present in the device under the tag of
+        each image. Images already present are not transferred
+        :param platform: Platform of the device, queried if not provided
+        :return: The images available in the device, either transferred or present
+        """
+        platform = platform or device_platform(device)
+        available: set[str] = set()
+        for image in images:
+            try:
+                cached: CachedImage = self.fetch(image, platform)
+                if cached.config in (present or {}).get(image, set()):
+                    self.logger.debug(f'Image {image} already in {device}')
+                    available.add(image)
+                    continue
+
+                start_time: float = time.perf_counter()
+                if self._load(device, cached, loader):
+                    available.add(image)
+                    metrics.increment('image_cache.seeded')
+                    metrics.record('image_cache.seed_time', time.perf_counter() - start_time)
+                    self.logger.info(f'Seeded image {image} into {device} in '
+                                     f'{time.perf_counter() - start_time:.1f}s')
+                else:
+                    self.logger.warning(f'Image {image} could not be loaded in {device}')
+            except (OSError, ValueError, KeyError, requests.RequestException) as ex:
+                self.logger.warning(f'Image {image} not available from the runner image cache: {ex}')
+        return available
+
+    def seed_devices(self, devices: list[TargetDevice], images: list[str],
+                     loader: str = DOCKER_LOADER) -> dict[str, set[str]]:
+        """
+        Seeds the images into several devices in parallel. Each image is fetched once
+        :return: Images available in each device, by device alias
+        """
+        with ThreadPoolExecutor(max_workers=max(len(devices), 1)) as executor:
+            results = executor.map(metrics.bind(lambda d: self.seed(d, images, loader)), devices)
+            return {d.target_config.alias: seeded for d, seeded in zip(devices, results)}
+
+
+image_cache: ImageCache = ImageCache()
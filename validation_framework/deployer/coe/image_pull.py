@@ -0,0 +1,224 @@
+"""
+Digest aware image pulls. Compares the digests of the images already present in a device
+with the ones their tags point to in the registries, so only missing or stale services
+are pulled. Registries are queried for the manifest digest only, with HEAD requests,
+which do not count towards the Docker Hub pull rate limits.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+
+import requests
+
+from validation_framework.common import constants as cte
+
+DOCKER_HUB_REGISTRY: str = 'registry-1.docker.io'
+MANIFEST_MEDIA_TYPES: str = ', '.join([
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.oci.image.manifest.v1+json',
+    'application/vnd.docker.distribution.manifest.v2+json'])
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def parse_image(image: str) -> tuple[str, str, str]:
+    """
+    Splits an image reference into its registry, repository and tag (or digest),
+    normalised the same way docker does (e.g. redis -> registry-1.docker.io,
+    library/redis, latest)
+    :param image: Image reference
+    :return: registry, repository and tag or digest
+    """
+    name, _, reference = image.partition('@')
+    if not reference:
+        reference = 'latest'
+        if ':' in name.rsplit('/', 1)[-1]:
+            name, reference = name.rsplit(':', 1)
+
+    first, _, rest = name.partition('/')
+    if rest and ('.' in first or ':' in first or first == 'localhost'):
+        registry, repository = first, rest
+    else:
+        registry, repository = DOCKER_HUB_REGISTRY, name
+
+    if registry == 'docker.io':
+        registry = DOCKER_HUB_REGISTRY
+    if registry == DOCKER_HUB_REGISTRY and '/' not in repository:
+        repository = f'library/{repository}'
+    return registry, repository, reference
+
+
+def bearer_token(challenge: str, timeout: float) -> str | None:
+    params: dict = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+    realm: str | None = params.pop('realm', None)
+    if not realm:
+        return None
+    response: requests.Response = requests.get(realm, params=params, timeout=timeout)
+    response.raise_for_status()
+    body: dict = response.json()
+    return body.get('token') or body.get('access_token')
+
+
+def remote_digest(image: str, timeout: float = 5) -> str | None:
+    """
+    Gathers the digest the tag of the image points to in its registry. Anonymous access
+    only, as used by the devices to pull the NuvlaEdge images
+    :param image: Image reference
+    :param timeout: Timeout of each request
+    :return: The manifest (or index) digest. None if it cannot be retrieved
+    """
+    registry, repository, reference = parse_image(image)
+    if reference.startswith('sha256:'):
+        return reference
+
+    url: str = f'https://{registry}/v2/{repository}/manifests/{reference}'
+    headers: dict = {'Accept': MANIFEST_MEDIA_TYPES}
+    try:
+        response: requests.Response = requests.head(url, headers=headers, timeout=timeout)
+        if response.status_code == 401 and 'Bearer' in response.headers.get('WWW-Authenticate', ''):
+            token: str | None = bearer_token(response.headers['WWW-Authenticate'], timeout)
+            if token:
+                headers['Authorization'] = f'Bearer {token}'
+                response = requests.head(url, headers=headers, timeout=timeout)
+    except requests.RequestException as ex:
+        logger.debug(f'Registry not available for {image}: {ex}')
+        return None
+
+    if not response.ok:
+        logger.debug(f'Digest of {image} not available, registry answered {response.status_code}')
+        return None
+    return response.headers.get('Docker-Content-Digest')
+
+
+# Local images, one JSON document per line (Repository, Tag, Digest, ID...)
+LIST_IMAGES_COMMAND: str = "docker images --digests --no-trunc --format '{{json .}}'"
+
+
+def compose_images(config_output: str) -> dict[str, str]:
+    """
+    :param config_output: Output of docker compose config --format json
+    :return: Image of each of the compose services
+    """
+    services: dict = json.loads(config_output).get('services', {})
+    return {name: service['image'] for name, service in services.items() if service.get('image')}
+
+
+def chart_images(template_output: str) -> list[str]:
+    """
+    :param template_output: Manifests rendered by helm template
+    :return: Images of the containers of the manifests
+    """
+    pattern: re.Pattern = re.compile(r'^\s*(?:-\s*)?image:\s*["\']?([^"\'\s]+)["\']?\s*$', re.MULTILINE)
+    return sorted(set(pattern.findall(template_output)))
+
+
+def local_digests(images_output: str) -> dict[tuple[str, str, str], set[str]]:
+    """
+    :param images_output: Output of LIST_IMAGES_COMMAND
+    :return: Digests of the local images, indexed by registry, repository and tag. Image
+    IDs are included, as images loaded from archives have no repository digest
+    """
+    digests: dict[tuple[str, str, str], set[str]] = {}
+    for line in images_output.splitlines():
+        if not line.strip():
+            continue
+        entry: dict = json.loads(line)
+        repository, tag, digest = entry.get('Repository'), entry.get('Tag'), entry.get('Digest', '')
+        if not repository or repository == '<none>':
+            continue
+        registry, repository, _ = parse_image(repository)
+        found: set[str] = set()
+        if digest.startswith('sha256:'):
+            found.add(digest)
+        if entry.get('ID', '').startswith('sha256:'):
+            found.add(entry['ID'])
+        if tag and tag != '<none>':
+            digests.setdefault((registry, repository, tag), set()).update(found)
+        # Images are also addressable by their digest
+        if digest.startswith('sha256:'):
+            digests.setdefault((registry, repository, digest), set()).update(found)
+    return digests
+
+
+def stale_services(services: dict[str, str], local: dict[tuple[str, str, str], set[str]]) -> list[str]:
+    """
+    Services whose image is missing in the device, or whose tag points to a different
+    digest in the registry. Present images are considered up to date when the registry
+    cannot be reached (e.g. air-gapped runners)
+    :param services: Image of each service, as returned by compose_images
+    :param local: Local images, as returned by local_digests
+    :return: Services to pull
+    """
+    stale: list[str] = []
+    for service, image in services.items():
+        present: set[str] | None = local.get(parse_image(image))
+        if present is None:
+            logger.debug(f'Image {image} of {service} not present')
+            stale.append(service)
+            continue
+
+        expected: str | None = remote_digest(image)
+        if expected is not None and expected not in present:
+            logger.debug(f'Image {image} of {service} outdated, registry digest {expected}')
+            stale.append(service)
+    return stale
+
+
+class PullTimes:
+    """
+    Last measured pull time of the images in each device, stored in the runner cache to
+    estimate the time saved when pulls are skipped. Each device has its own file, so
+    targets validated in parallel processes do not overwrite each other
+    """
+
+    def __init__(self, path: Path = cte.PULL_TIMES_PATH):
+        """
+        :param path: Folder of the pull times files, one per device
+        """
+        self.path: Path = path
+        self._lock: threading.Lock = threading.Lock()
+
+    def _file(self, device: str) -> Path:
+        return self.path / f'{re.sub(r"[^A-Za-z0-9_.-]", "_", device)}.json'
+
+    def _read(self, device: str) -> dict[str, float]:
+        try:
+            return json.loads(self._file(device).read_text())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as ex:
+            logger.warning(f'Unable to read the pull times of {device}: {ex}')
+            return {}
+
+    def update(self, device: str, images: list[str], seconds: float) -> None:
+        """
+        Images are pulled in parallel, the pull time is attributed to each of them
+        """
+        with self._lock:
+            times: dict[str, float] = self._read(device)
+            times.update({image: seconds for image in images})
+            file: Path = self._file(device)
+            # Unique per process, replaced atomically so readers never see a torn file
+            tmp_path: Path = file.with_suffix(f'.{os.getpid()}.tmp')
+            try:
+                file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path.write_text(json.dumps(times, indent=4))
+                tmp_path.replace(file)
+            except OSError as ex:
+                logger.warning(f'Unable to save the pull times of {device}: {ex}')
+
+    def estimate(self, device: str, images: list[str]) -> float | None:
+        """
+        :return: Time it would take to pull (in parallel) the images. None if unknown
+        """
+        with self._lock:
+            known: dict[str, float] = self._read(device)
+        measured: list[float] = [known[i] for i in images if i in known]
+        return max(measured) if measured else None
+
+
+pull_times: PullTimes = PullTimes()
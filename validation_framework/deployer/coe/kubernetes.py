@@ -1,39 +1,54 @@
 import logging
-import invoke
 
 from validation_framework.deployer.coe import COEBase
+from validation_framework.deployer.chart_cache import chart_cache
+from validation_framework.deployer.coe.cluster_state import ClusterState
+from validation_framework.deployer.coe.csr_approver import CSRApprover
+from validation_framework.deployer.coe.image_cache import K3S_LOADER, image_cache
+from validation_framework.deployer.coe.image_pull import chart_images, parse_image
+from validation_framework.deployer.coe.purge import PurgeReport, kubernetes_purge_command
+from validation_framework.common.metrics import metrics
 from validation_framework.common.nuvla_uuid import NuvlaUUID
-from validation_framework.deployer.target_device.ssh_target import SSHTarget
+from validation_framework.common.schemas.cluster_snapshot import ClusterPodState, ClusterSnapshot
+from validation_framework.deployer.target_device.batch import BatchCommandResult
+from validation_framework.deployer.target_device import target_factory
 from validation_framework.deployer.target_device.target import TargetDeviceConfig, TargetDevice
 from validation_framework.common import constants as cte
 from fabric import Result
+import invoke
 import json
+import requests
 import time
-from threading import Event, Thread
 import re
 from pathlib import Path
 
 
 _KUBECONFIG_ENV = {"KUBECONFIG": "/etc/rancher/k3s/k3s.yaml"}
 
+# Helm releases of the validation engines (see NUVLAEDGE_KUBE_INSTALL_IMAGE)
+_RELEASE_PREFIX = 'nuvlaedge-'
+
+def _is_engine_namespace(namespace: str) -> bool:
+    return not (namespace.__contains__('kube') or namespace == 'default')
+
+
 class KubernetesCOE(COEBase):
     
     def __init__(self, device_config: TargetDeviceConfig, **kwargs):
         self.namespaces_running = []
         self.engine_folder: str = ''
-        self.device = SSHTarget(device_config)
+        self.device = target_factory(device_config)
         self.nuvla_uuid = ''
         self.namespace = ''
         self.certificate_manager_pod = ''
-        self.cred_check_thread: CertificateSignCheck = None
+        self.csr_approver: CSRApprover | None = None
         super().__init__(self.device, logging.getLogger(__name__), **kwargs)
-
-        self.project_name: str = ''
+        self.cluster: ClusterState = ClusterState(self.device, _KUBECONFIG_ENV)
 
     def start_engine(self,
                      uuid: NuvlaUUID,
                      remove_old_installation: bool = True,
-                     project_name: str = cte.PROJECT_NAME,
+                     project_name: str | None = None,
                      extra_envs: dict = None):
         """
         Pulls the correct kubernetes image
@@ -48,6 +63,55 @@ class KubernetesCOE(COEBase):
         idparts = uuid.split('/')
         self.nuvla_uuid = idparts[1]
 
+        chart: str | None = self._cached_chart()
+        if chart is None:
+            chart = self._repository_chart()
+
+        self.project_name = project_name or self.project_name
+        install_image_cmd = self._install_command(chart)
+        envs_configuration: dict = self._engine_envs(extra_envs)
+        self._seed_images(install_image_cmd, envs_configuration)
+        self.device.run_sudo_command(install_image_cmd, envs=envs_configuration)
+        self.cluster.invalidate()
+
+        self.namespace = self.__get_current_nuvlaedge_namespace_running()
+
+        if self.csr_approver is None:
+            self.csr_approver = CSRApprover(self.device, self.namespace, self.nuvla_uuid, _KUBECONFIG_ENV)
+            self.csr_approver.start()
+
+        self.logger.info('Device start command executed')
+
+    def _chart_cache_file(self) -> Path:
+        if self.deployment_branch:
+            return chart_cache.branch_chart(self.deployment_branch)
+        return chart_cache.release_chart(self.nuvlaedge_version)
+
+    @staticmethod
+    def _remote_chart(local_file: Path) -> str:
+        return f'{cte.ROOT_PATH}{cte.ENGINE_PATH}charts/{local_file.name}.tgz'
+
+    def _cached_chart(self) -> str | None:
+        """
+        Provides the chart through the runner chart cache, transferring it to the device
+        only if not already there
+        :return: The chart archive in the device. None if the cache cannot provide it
+        """
+        try:
+            local_file: Path = self._chart_cache_file()
+            remote_file: str = self._remote_chart(local_file)
+            self.device.run_command(f'mkdir -p {cte.ROOT_PATH}{cte.ENGINE_PATH}charts')
+            chart_cache.push(self.device, local_file, remote_file)
+        except (OSError, ValueError, requests.RequestException, invoke.exceptions.UnexpectedExit) as ex:
+            self.logger.warning(f'Chart not available from the chart cache, using the repository: {ex}')
+            return None
+        return remote_file
+
+    def _repository_chart(self) -> str:
+        """
+        Configures the Helm repository in the device, or clones the deployment branch
+        :return: The chart to install
+        """
         add_repo_cmd = f'helm repo add {cte.NUVLAEDGE_KUBE_LOCAL_REPO_NAME} {cte.NUVLAEDGE_KUBE_REPO}'
         result: Result = self.device.run_sudo_command(add_repo_cmd, envs=_KUBECONFIG_ENV)
         if result.failed:
@@ -63,12 +127,16 @@ class KubernetesCOE(COEBase):
             self.device.run_sudo_command(f'sudo rm -Rf {path}', envs=_KUBECONFIG_ENV)
             self.device.run_command(cte.DEPLOYMENT_GIT_CLONE.format(branch=self.deployment_branch,
                                                                     path=path))
-            chart = f'{path}/helm'
-        else:
-            chart = f'{cte.NUVLAEDGE_KUBE_LOCAL_REPO_NAME}/{cte.NUVLAEDGE_KUBE_LOCAL_CHART_NAME}'
-            if self.nuvlaedge_version and self.nuvlaedge_version != 'latest':
-                chart += f' --version={self.nuvlaedge_version}'
+            return f'{path}/helm'
+        return self._release_chart()
+
+    def _release_chart(self) -> str:
+        chart = f'{cte.NUVLAEDGE_KUBE_LOCAL_REPO_NAME}/{cte.NUVLAEDGE_KUBE_LOCAL_CHART_NAME}'
+        if self.nuvlaedge_version and self.nuvlaedge_version != 'latest':
+            chart += f' --version={self.nuvlaedge_version}'
+        return chart
 
+    def _install_command(self, chart: str) -> str:
         install_image_cmd = cte.NUVLAEDGE_KUBE_INSTALL_IMAGE.format(
             uuid=self.nuvla_uuid,
             chart=chart,
@@ -76,13 +144,36 @@ class KubernetesCOE(COEBase):
             organization=self.engine_configuration.ne_image_organization,
             version=self.engine_configuration.ne_image_tag
         )
-        self.project_name = project_name
 
         if self.include_peripherals:
             for peripheral in self.peripherals:
                 cmd_arg = f' --set peripheralManager{peripheral}=true '
                 install_image_cmd = install_image_cmd + cmd_arg
+        return install_image_cmd
+
+    def _seed_images(self, install_command: str, envs: dict) -> None:
+        """
+        Transfers the images of the chart missing in the cluster from the runner image
+        cache, if enabled, so the cluster does not pull them
+        :param install_command: Helm install command of the engine
+        :param envs: Environmental variables of the install command
+        """
+        if not image_cache.enabled:
+            return
+        template_command: str = install_command.replace('helm install', 'helm template', 1)
+        try:
+            manifests: str = self.device.run_sudo_command(template_command, envs=envs).stdout
+            present: str = self.device.run_sudo_command('sudo k3s ctr images ls -q').stdout
+        except invoke.exceptions.UnexpectedExit as ex:
+            self.logger.warning(f'Unable to resolve the images of the engine chart: {ex}')
+            return
 
+        present_images: set[tuple] = {parse_image(reference) for reference in present.split()}
+        missing: list[str] = [i for i in chart_images(manifests) if parse_image(i) not in present_images]
+        if missing:
+            image_cache.seed(self.device, missing, K3S_LOADER)
+
+    def _engine_envs(self, extra_envs: dict = None) -> dict:
         envs_configuration: dict = self.engine_configuration.model_dump(by_alias=True)
         if extra_envs:
             envs_configuration.update(extra_envs)
@@ -91,18 +182,7 @@ class KubernetesCOE(COEBase):
         self.logger.info(f'Starting NuvlaEdge with UUID: {self.nuvla_uuid} with'
                          f' configuration: '
                          f'\n\n {json.dumps(envs_configuration, indent=4)} \n')
-        self.device.run_sudo_command(install_image_cmd, envs=envs_configuration)
-
-        self.namespace = self.__get_current_nuvlaedge_namespace_running()
-
-        if self.cred_check_thread is None:
-            self.cred_check_thread = CertificateSignCheck(device_config=self.device.target_config,
-                                                          uuid=self.nuvla_uuid,
-                                                          namespace=self.namespace, 
-                                                          logger=self.logger)
-            self.cred_check_thread.start()
-
-        self.logger.info('Device start command executed')
+        return envs_configuration
 
     def add_peripheral(self):
         pass
@@ -111,55 +191,60 @@ class KubernetesCOE(COEBase):
         pass
 
     def stop_engine(self):
+        self._run_batch(self._stop_commands(self.cluster.snapshot()))
+        self.cluster.invalidate()
+
+    def _stop_commands(self, snapshot: ClusterSnapshot) -> list[str]:
+        """
+        Scales down, in a single call per namespace, the deployments of the engine
+        namespaces with active deployments
+        """
         if not self.namespaces_running:
-            self.namespaces_running = self.__get_namespaces_running()
-        for namespace in self.namespaces_running:
-            if namespace.__contains__('kube') or namespace == 'default':
-                continue
-            deployments = self.__get_deployments_running(namespace)
-            for deployment in deployments:
-                stop_cmd = (f'sudo kubectl scale -n {namespace} deployment '
-                            f'{deployment} --replicas=0')
-                try:
-                    self.device.run_sudo_command(stop_cmd, envs=_KUBECONFIG_ENV)
-                except invoke.exceptions.UnexpectedExit as ex:
-                    self.logger.error(f'Unexpected exit on command {stop_cmd} : Exception : {ex}')
-                except Exception as ex:
-                    self.logger.error(f'Error while stopping deployment {deployment}: {ex}')
-
-    def get_authorized_keys(self):
-        return self.device.run_sudo_command("sudo cat /root/.ssh/authorized_keys")
-
-    def get_engine_logs(self):
-        self.logger.info(f'Retrieving Log files from engine run with UUID: {self.engine_configuration.nuvlaedge_uuid}')
-        get_pods_cmd = (f'sudo kubectl get pods -n {self.namespace} -o json | '
-                        'jq \'.items[] | select(.status.phase == "Running") | .metadata.name\'')
-        result: Result = self.device.run_sudo_command(get_pods_cmd, envs=_KUBECONFIG_ENV)
-        if result.failed or result.stdout == '':
+            # Namespaces of other engines sharing the cluster are left running
+            self.namespaces_running = [n for n in snapshot.namespaces
+                                       if not self.isolated or (self.nuvla_uuid and self.nuvla_uuid in n)]
+        stop_commands: list[str] = []
+        for namespace in filter(_is_engine_namespace, self.namespaces_running):
+            deployments: list[str] = snapshot.active_deployments(namespace)
+            if deployments:
+                self.logger.debug(f'Current deployments running {" ".join(deployments)}')
+                stop_commands.append(f'sudo kubectl scale -n {namespace} deployment --all --replicas=0')
+        return stop_commands
+
+    def _run_batch(self, commands: list[str]):
+        """
+        Runs the provided kubectl/helm commands in a single remote session logging the
+        failing ones
+        """
+        try:
+            results: list[BatchCommandResult] = self.device.run_batch(commands, envs=_KUBECONFIG_ENV,
+                                                                      sudo=True)
+        except Exception as ex:
+            self.logger.error(f'Unable to run commands on {self.device} {ex}')
             return
 
-        # 1. Get all pods in the concerned namespace
-        self.logger.debug(f'Extracting logs from: \n\n\t{result.stdout}\n')
-        pods = result.stdout.split('\n')
-
-        # 2. Iteratively copy logs from kubernetes pods
-        #    to /tmp/<new_folder> and chmod before transferring it to the running machine
-        self.device.run_sudo_command(
-            f'sudo mkdir -p /tmp/{self.engine_configuration.compose_project_name}/logs')
-        local_tmp_path: Path = Path(f'/tmp/{self.engine_configuration.compose_project_name}/logs')
-        local_tmp_path.mkdir(parents=True, exist_ok=True)
-
-        # 3. Provide permissions to the folder
-        self.device.run_sudo_command(
-            f'sudo chmod 777 /tmp/{self.engine_configuration.compose_project_name}/logs')
-
-        for pod in pods:
-            if pod != '':
-                pod = pod.replace('"', '')
-                try:
-                    self.get_container_logs(pod)
-                except Exception as ex:
-                    self.logger.warning(f'Error while downloading logs for pod {pod} : {ex}')
+        self._log_batch_failures(results)
+
+    def _log_batch_failures(self, results: list[BatchCommandResult]):
+        for result in results:
+            if result.failed:
+                self.logger.error(f'Unexpected exit ({result.exit_code}) on command '
+                                  f'{result.command} : {result.stderr}')
+
+    def _agent_options(self) -> dict:
+        return {'sudo': True,
+                'envs': {**_KUBECONFIG_ENV, 'AGENT_KEYS_FILE': '/root/.ssh/authorized_keys'}}
+
+    def _pod_logs_commands(self) -> tuple[str, str]:
+        list_command: str = (f'kubectl get pods -n {self.namespace} --field-selector=status.phase=Running '
+                             "-o jsonpath='{.items[*].metadata.name}'")
+        logs_command: str = f'kubectl logs -n {self.namespace} "$name" --all-containers'
+        return list_command, logs_command
+
+    def get_engine_logs(self, path: Path = None) -> dict[str, Path]:
+        self.logger.info(f'Retrieving Log files from engine run with UUID: {self.engine_configuration.nuvlaedge_uuid}')
+        list_command, logs_command = self._pod_logs_commands()
+        return self._stream_logs(list_command, logs_command, path, sudo=True, envs=_KUBECONFIG_ENV)
 
     def get_container_logs(self, pod, download_to_local=False, path: Path = None):
         get_logs_cmd = (f'sudo kubectl logs -n {self.namespace} {pod} >> '
@@ -174,208 +259,103 @@ class KubernetesCOE(COEBase):
         return "kubernetes"
 
     def engine_running(self) -> bool:
-        check_pods_cmd = f'sudo kubectl get pods -n {self.namespace} --no-headers'
-        result: Result = None
         try:
-            result = self.device.run_sudo_command(check_pods_cmd, envs=_KUBECONFIG_ENV)
-            if result.failed or result.stdout.__contains__('No resources found'):
-                return False
+            pods: list[ClusterPodState] = self.cluster.snapshot().pods
         except Exception as ex:
             self.logger.warning(f'Exception occurred {ex}')
             return False
-        return True
+        return any(pod.namespace == self.namespace for pod in pods)
 
     def finish_tasks(self):
-        if self.cred_check_thread:
-            self.logger.debug("Waiting for credentials check thread to close")
-            self.cred_check_thread.join(50)
-
-    def remove_engine(self, uuid: NuvlaUUID = None, black_list: list = None):
+        if self.csr_approver:
+            self.logger.debug("Waiting for certificate approver to finish")
+            self.csr_approver.stop()
+            self._report_csr_approvals()
+
+    def _report_csr_approvals(self):
+        approvals: dict[str, float] = self.csr_approver.report()
+        if not approvals:
+            self.logger.warning(f'No certificate of engine {self.nuvla_uuid} was approved')
+        for name, latency in approvals.items():
+            self.logger.info(f'Certificate {name} commissioned {latency:.0f}s after its creation')
+        self.csr_approver = None
+
+    def remove_engine(self, uuid: NuvlaUUID = None, black_list: list = None) -> PurgeReport:
+        """
+        Uninstalls the engine Helm releases together with their namespaces and cluster
+        role bindings. Other namespaces of the cluster are kept
+        :return: Report of the removed resources
+        """
         self.logger.debug(f'Removing engine in device {self.device}')
         self.finish_tasks()
 
-        if not self.nuvla_uuid:
-            self.nuvla_uuid = uuid
-        ne_id = self.nuvla_uuid.split('/')
-        if len(ne_id) > 1:
-            ne_id = ne_id[1]
-        else:
-            self.logger.warning(f"Invalid NuvlaEdge UUID {self.nuvla_uuid}")
-            return
+        engine_id: str = self._purge_scope(uuid)
+        if self.isolated and not engine_id:
+            self.logger.warning('NuvlaEdge id of the engine unknown, the releases of other engines are kept')
+            return PurgeReport(project=_RELEASE_PREFIX)
 
-        self.namespaces_running = self.__get_namespaces_running()
-        commands: list = ['sudo kubectl delete '
-                          'clusterrolebindings.rbac.authorization.k8s.io '
-                          'nuvla-crb '
-                          f'nuvlaedge-service-account-cluster-role-binding-{ne_id}']
-
-        for namespace in self.namespaces_running:
-            if namespace.__contains__('kube') or namespace == 'default':
-                continue
-            commands.append(f'sudo kubectl delete ns {namespace}')
-            commands.append(f'helm uninstall {namespace}')
-
-        for cmd in commands:
-            try:
-                self.device.run_sudo_command(cmd, envs=_KUBECONFIG_ENV)
-            except invoke.exceptions.UnexpectedExit as ex:
-                self.logger.error(f'Unexpected exit on command {cmd} : Exception : {ex}')
-            except Exception as ex:
-                self.logger.error(f'Unable to run commands on {self.device} {ex}')
+        start_time: float = time.perf_counter()
+        try:
+            result: Result = self.device.run_sudo_command(self._purge_command(engine_id))
+        except Exception as ex:
+            self.logger.error(f'Unable to run commands on {self.device} {ex}')
+            return PurgeReport(project=_RELEASE_PREFIX, errors=[str(ex)])
+        finally:
+            self.cluster.invalidate()
 
-    def peripherals_running(self, peripherals: set) -> bool:
-        get_all_pods_running_cmd = (f'sudo kubectl get -n {self.namespace} pods -o json | '
-                                    'jq \'.items[] | select(.status.phase == "Running") | '
-                                    '.metadata.name | select(contains("peripheral-manager"))\'')
+        self.namespaces_running = []
+        return self._purge_report(result, time.perf_counter() - start_time)
 
-        result: Result = self.device.run_sudo_command(get_all_pods_running_cmd, envs=_KUBECONFIG_ENV)
-        if result.failed or result.stdout == '':
+    def _purge_scope(self, uuid: NuvlaUUID | None) -> str:
+        """
+        :return: NuvlaEdge id of the only release to purge if the engine shares the
+        cluster with other engines, empty to purge all the engine releases
+        """
+        if not self.isolated:
+            return ''
+        return uuid.split('/')[-1] if uuid else self.nuvla_uuid
+
+    @staticmethod
+    def _purge_command(engine_id: str = '') -> str:
+        # sudo resets the environment, variables are passed through env instead
+        envs: str = ' '.join(f'{k}={v}' for k, v in _KUBECONFIG_ENV.items())
+        return f'sudo env {envs} {kubernetes_purge_command(_RELEASE_PREFIX, engine_id=engine_id)}'
+
+    def _purge_report(self, result: Result, duration: float) -> PurgeReport:
+        report: PurgeReport = PurgeReport.from_output(_RELEASE_PREFIX, result.stdout, result.stderr, duration)
+        metrics.record('coe.purge.time', report.duration)
+        metrics.increment('coe.purge.removed', report.total_removed)
+        for resource, seconds in report.timings.items():
+            metrics.record(f'coe.purge.{resource.split("/")[0]}_time', seconds)
+        self.logger.info(report.summary())
+        for error in report.errors:
+            self.logger.debug(f'Purge error: {error}')
+        return report
+
+    def peripherals_running(self, peripherals: set) -> bool:
+        list_pods: list[str] = [pod for pod in self.cluster.snapshot().running_pods(self.namespace)
+                                if 'peripheral-manager' in pod]
+        if not list_pods:
             return False
 
-        list_pods = result.stdout.strip().split('\n')
         pattern = 'peripheral-manager-([a-z]+)-deployment.+'
         for pod in list_pods:
-            pod = pod.strip().replace('"', '')
             res = re.search(pattern, pod)
             if peripherals.__contains__(res.group(1)):
                 peripherals.remove(res.group(1))
         return not bool(peripherals)
 
-    def purge_engine(self, uuid: NuvlaUUID = None):
+    def purge_engine(self, uuid: NuvlaUUID = None) -> PurgeReport:
         """
-            This will remove all pods and namespaces for kubernetes
-        :return:
+            This will remove the engine releases and their namespaces
+        :return: Report of the removed resources
         """
         self.stop_engine()
-        self.remove_engine(uuid)
+        return self.remove_engine(uuid)
+
+    def _current_namespace(self, snapshot: ClusterSnapshot) -> str:
+        namespaces: list[str] = [n for n in snapshot.namespaces if self.nuvla_uuid in n]
+        return namespaces[0] if namespaces else ''
 
     def __get_current_nuvlaedge_namespace_running(self):
-        get_curr_nuvlaedge_namespace_cmd = ('sudo kubectl get namespaces -o json | jq '
-                                            '\'.items[].metadata.labels."kubernetes.io/metadata.name"'
-                                            f' | select(contains("{self.nuvla_uuid}"))\'')
-        result: Result = self.device.run_sudo_command(get_curr_nuvlaedge_namespace_cmd, envs=_KUBECONFIG_ENV)
-        namespaces = result.stdout.split('\n')
-        namespace = namespaces[0].replace('"', '')
-        return namespace
-
-    def __get_namespaces_running(self) -> list:
-        get_nuvla_namespaces_cmd = ('sudo kubectl get namespaces -o json | jq '
-                                    '\'.items[].metadata.labels."kubernetes.io/metadata.name"\'')
-        result: Result = self.device.run_sudo_command(get_nuvla_namespaces_cmd, envs=_KUBECONFIG_ENV)
-        namespaces = result.stdout
-        list_namespaces = namespaces.split('\n')
-
-        output = []
-        for namespace in list_namespaces:
-            if namespace:
-                output.append(namespace.replace('"', ''))
-        running_namespaces = ' '.join([str(item) for item in output])
-        self.logger.debug(f'Current namespaces running {running_namespaces}')
-        return output
-
-    def __get_deployments_running(self, namespace):
-        get_deployments_cmd = (f'sudo kubectl get deployments -n {namespace} -o json | '
-                               'jq \'.items[] | select(.spec.replicas != 0) | .metadata.name\'')
-        result: Result = self.device.run_sudo_command(get_deployments_cmd, envs=_KUBECONFIG_ENV)
-        output = []
-        if result.failed or result.stdout == '':
-            return output
-        deployments = result.stdout
-        list_deployments = deployments.split('\n')
-
-        for deployment in list_deployments:
-            if deployment:
-                output.append(deployment.replace('"', ''))
-        running_deployments = ' '.join([str(item) for item in output])
-        self.logger.debug(f'Current deployments running {running_deployments}')
-        return output
-
-
-def get_pod_name(device: TargetDevice, namespace, app_name, status: str = 'Running'):
-    get_pod_cmd = (f'sudo kubectl get -n {namespace} pods -o json |'
-                   f' jq \'.items[] | select(.status.phase == "{status}") | '
-                   f'.metadata.name | select(contains("{app_name}"))\'')
-    result: Result = device.run_sudo_command(get_pod_cmd, envs=_KUBECONFIG_ENV)
-    if result.failed or result.stdout == '':
-        return ''
-    list_names = result.stdout.strip().split('\n')
-    return list_names[0].replace('"', '')
-
-
-def get_environmental_value(device, namespace, pod_name, key, logger):
-    get_pod_details = f'sudo kubectl get pod -n {namespace} {pod_name} -o json'
-    result: Result = device.run_sudo_command(get_pod_details, envs=_KUBECONFIG_ENV)
-    if result.failed or result.stdout == '':
-        logger.warning(f'Unable to get details of the pod {pod_name} in namespace {namespace}')
-        return ''
-    json_output = json.loads(result.stdout)
-    container_info_list: list = json_output["spec"]["containers"]
-    for container_info in container_info_list:
-        env_list: list = container_info["env"]
-        for envs in env_list:
-            if envs["name"] == key:
-                return envs["value"]
-    logger.error(f'Key {key} not present in {pod_name}')
-
-
-class CertificateSignCheck(Thread):
-    
-    def __init__(self, device_config: TargetDeviceConfig, uuid, namespace, logger: logging.Logger):
-        super(CertificateSignCheck, self).__init__()
-        self.device = SSHTarget(device_config)
-        self.exit_event: Event = Event()
-        self.namespace = namespace
-        self.logger = logger
-        self.uuid = uuid
-
-    def join(self, timeout: float | None = 0):
-        self.logger.debug('Exiting Certificate sign check thread')
-        self.exit_event.set()
-        super(CertificateSignCheck, self).join(timeout)
-
-    def debug(self, msg, *args, **kwargs):
-        self.logger.debug(f'{self.__class__.__name__}: {msg}', *args, **kwargs)
-
-    def run(self):
-        credentials_pod = ''
-        while credentials_pod == '':
-            credentials_pod = get_pod_name(self.device, self.namespace, cte.NUVLAEDGE_KUBE_CERTIFICATE_MANAGER)
-            time.sleep(0.5)
-
-        csr_name = get_environmental_value(self.device, self.namespace, credentials_pod,
-                                           cte.NUVLAEDGE_KUBE_CSR_NAME_KEY, self.logger)
-
-        if csr_name == 'nuvlaedge-csr':
-            csr_name += '-' + self.uuid
-
-        time_to_sleep = 2
-        while not self.exit_event.is_set():
-            get_csr_cmd = (f'sudo kubectl get certificatesigningrequests.certificates.k8s.io -o json | jq \'.items[] | '
-                           f'select(.metadata.name == "{csr_name}") | '
-                           '.status.conditions[0].type\'')
-
-            self.exit_event.wait(time_to_sleep)
-
-            if not self.device.is_reachable():
-                self.debug('Device not reachable.')
-                continue
-
-            result: Result = self.device.run_sudo_command(get_csr_cmd, envs=_KUBECONFIG_ENV)
-            if result.failed:
-                self.debug(f'Running following command failed: {get_csr_cmd}')
-                continue
-
-            status = result.stdout
-            status = status.strip().replace('"', '')
-            if status == "Approved":
-                time_to_sleep = 50
-                self.debug('Certificate is approved')
-                continue
-
-            # approve certificate
-            approve_csr_cmd = f'sudo kubectl certificate approve {csr_name}'
-            try:
-                self.device.run_sudo_command(approve_csr_cmd, envs=_KUBECONFIG_ENV)
-            except Exception as ex:
-                self.logger.warning(f'Approval of csr command failed : {ex}')
-            self.logger.info(f'Approved certificate {csr_name}')
+        return self._current_namespace(self.cluster.snapshot())
@@ -0,0 +1,95 @@
+"""
+Single-stream collection of the engine logs.
+
+All the container (or pod) logs of an engine are written by one remote shell loop to its
+standard output, each of them preceded by a header line carrying a random token, and the
+whole stream is gzip compressed on the device. The runner decompresses and splits the
+stream on the fly into one file per container, so there are no remote temporary files
+nor per container round trips.
+"""
+import logging
+import shlex
+import uuid
+import zlib
+from pathlib import Path
+from typing import BinaryIO
+
+
+def build_log_stream_script(list_command: str, logs_command: str) -> tuple[str, str]:
+    """
+    Builds the shell command streaming the logs of several containers
+    :param list_command: Command printing the names of the containers, separated by
+    whitespaces
+    :param logs_command: Command printing the logs of the container stored in $name
+    :return: A tuple with the shell command to execute and the token of the headers
+    """
+    token: str = uuid.uuid4().hex
+    # awk 1 terminates the last line of each log, so headers always start a new line
+    script: str = (f'for name in $({list_command}); do '
+                   f"printf '%s %s\\n' '{_header(token)}' \"$name\"; "
+                   f'{logs_command} 2>&1 < /dev/null | awk 1; '
+                   'done | gzip -c')
+    return f'sh -c {shlex.quote(script)}', token
+
+
+def _header(token: str) -> str:
+    return f'__VF_LOG_{token}__'
+
+
+class LogStreamWriter:
+    """
+    Binary sink receiving the compressed stream and writing each log into its own file
+    """
+
+    def __init__(self, token: str, destination: Path):
+        """
+        :param token: Header token returned by build_log_stream_script
+        :param destination: Folder where the <name>.log files are created
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.destination: Path = destination
+        self.files: dict[str, Path] = {}
+        self.compressed_bytes: int = 0
+
+        self._header: bytes = (_header(token) + ' ').encode()
+        self._decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        self._pending: bytes = b''
+        self._current: BinaryIO | None = None
+
+    def __enter__(self):
+        self.destination.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, data: bytes) -> int:
+        self.compressed_bytes += len(data)
+        self._feed(self._decompressor.decompress(data))
+        return len(data)
+
+    def _feed(self, data: bytes) -> None:
+        lines: list[bytes] = (self._pending + data).split(b'\n')
+        self._pending = lines.pop()
+        for line in lines:
+            if line.startswith(self._header):
+                self._open(line[len(self._header):].decode(errors='replace'))
+            elif self._current is not None:
+                self._current.write(line + b'\n')
+
+    def _open(self, name: str) -> None:
+        if self._current is not None:
+            self._current.close()
+        file_path: Path = self.destination / f'{name}.log'
+        self.logger.debug(f'Writing logs of {name} into {file_path}')
+        self.files[name] = file_path
+        self._current = file_path.open('wb')
+
+    def close(self) -> None:
+        self._feed(self._decompressor.flush())
+        if self._pending and self._current is not None:
+            self._current.write(self._pending)
+        self._pending = b''
+        if self._current is not None:
+            self._current.close()
+            self._current = None
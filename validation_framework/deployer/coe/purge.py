@@ -0,0 +1,124 @@
+"""
+Engine purge scoped to the resources of the validation project, so caches (e.g. images)
+and other tenants of the device survive between tests.
+
+The purge runs as a single shell script in the device which deletes the resources of
+each kind concurrently and reports every removed resource in a line '<kind> <name>'.
+Scripts may also report the seconds taken to tear down a resource in a line
+'time <kind>/<name> <seconds>'.
+"""
+import shlex
+from dataclasses import dataclass, field
+
+# Concurrent removals of each kind of resource
+PURGE_PARALLELISM: int = 8
+# Seconds the Kubernetes teardown waits for the engine namespaces to be deleted
+PURGE_DEADLINE: int = 120
+
+
+@dataclass
+class PurgeReport:
+    """
+    Resources removed by a purge, by kind, and the errors reported while removing them
+    """
+    project: str
+    removed: dict[str, list[str]] = field(default_factory=dict)
+    errors: list[str] = field(default_factory=list)
+    duration: float = 0.0
+    # <kind>/<name>: seconds until the resource was torn down
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def total_removed(self) -> int:
+        return sum(len(names) for names in self.removed.values())
+
+    @classmethod
+    def from_output(cls, project: str, stdout: str, stderr: str, duration: float) -> 'PurgeReport':
+        report: PurgeReport = cls(project=project, duration=round(duration, 2))
+        for line in stdout.splitlines():
+            kind, _, name = line.strip().partition(' ')
+            if kind == 'time':
+                resource, _, seconds = name.partition(' ')
+                report.timings[resource] = float(seconds or 0)
+            elif kind and name:
+                report.removed.setdefault(kind, []).append(name)
+        report.errors = [line for line in stderr.splitlines() if line.strip()]
+        return report
+
+    def summary(self) -> str:
+        removed: str = ', '.join(f'{len(v)} {k}s' for k, v in self.removed.items()) or 'nothing'
+        summary: str = f'Purged {removed} of {self.project} in {self.duration}s ({len(self.errors)} errors)'
+        if self.timings:
+            summary += '. ' + ', '.join(f'{k} {v:.0f}s' for k, v in sorted(self.timings.items(),
+                                                                        key=lambda t: -t[1]))
+        return summary
+
+
+def _remove_lines(kind: str, list_command: str, remove_command: str) -> str:
+    """
+    Runs the remove command concurrently on each of the names listed, reporting the
+    removed ones as '<kind> <name>'
+    """
+    return f'{list_command} | xargs -r -n 1 -P {PURGE_PARALLELISM} sh -c ' + \
+        shlex.quote(f'{remove_command} "$0" >/dev/null && printf "%s %s\\n" {kind} "$0"')
+
+
+def docker_purge_command(project: str) -> str:
+    """
+    Containers (and their anonymous volumes) are removed first, as networks and volumes
+    in use cannot be removed. Networks and volumes are then removed concurrently
+    :param project: Compose project name
+    :return: The purge command
+    """
+    label: str = f'label=com.docker.compose.project={project}'
+    script: str = '\n'.join([
+        _remove_lines('container', f"docker ps -a --filter {label} --format '{{{{.Names}}}}'",
+                      'docker rm -f -v'),
+        _remove_lines('network', f"docker network ls --filter {label} --format '{{{{.Name}}}}'",
+                      'docker network rm') + ' &',
+        _remove_lines('volume', f"docker volume ls --filter {label} --format '{{{{.Name}}}}'",
+                      'docker volume rm') + ' &',
+        'wait'])
+    return f'sh -c {shlex.quote(script)}'
+
+
+def kubernetes_purge_command(release_prefix: str, deadline: int = PURGE_DEADLINE, engine_id: str = '') -> str:
+    """
+    Uninstalls the Helm releases of the engine and deletes, concurrently, their
+    namespaces (the ones containing the NuvlaEdge id) and cluster role bindings. The
+    deletion of all the namespaces is then awaited with a single kubectl wait, sharing
+    the deadline with the uninstalls. The seconds taken by each release and namespace
+    are reported
+    :param release_prefix: Prefix of the engine releases (nuvlaedge-<id>)
+    :param deadline: Seconds to wait for the releases and namespaces to be removed
+    :param engine_id: NuvlaEdge id of the only release to purge, keeping the cluster
+    resources shared with other engines. All the releases if empty
+    :return: The purge command, to be run as super user with access to the cluster
+    """
+    release_filter: str = f'^{release_prefix}{engine_id}$' if engine_id else f'^{release_prefix}'
+    # The Nuvla cluster role binding is shared by all the engines, removed along with all of them
+    shared_removal: str = '' if engine_id else \
+        '[ -z "$_vf_found" ] || (kubectl delete clusterrolebinding nuvla-crb >/dev/null 2>&1 && ' \
+        'echo "clusterrolebinding nuvla-crb") &'
+    script: str = '\n'.join([
+        '_vf_start=$(date +%s)',
+        '_vf_namespaces=""',
+        f"for _vf_release in $(helm list -A -q --filter '{release_filter}'); do",
+        f'    _vf_id=${{_vf_release#{release_prefix}}}',
+        f'    (helm uninstall "$_vf_release" --timeout {deadline}s >/dev/null && echo "release $_vf_release" && '
+        'echo "time release/$_vf_release $(($(date +%s) - _vf_start))") &',
+        '    (kubectl delete clusterrolebinding '
+        'nuvlaedge-service-account-cluster-role-binding-"$_vf_id" >/dev/null && '
+        'echo "clusterrolebinding nuvlaedge-service-account-cluster-role-binding-$_vf_id") &',
+        '    for _vf_ns in $(kubectl get namespaces -o name | grep "$_vf_id"); do',
+        '        (kubectl delete "$_vf_ns" --wait=false >/dev/null && echo "namespace ${_vf_ns#namespace/}") &',
+        '        _vf_namespaces="$_vf_namespaces $_vf_ns"',
+        '    done',
+        '    _vf_found=1',
+        'done',
+        shared_removal,
+        # Namespaces are reported by kubectl wait as their deletion completes
+        f'[ -z "$_vf_namespaces" ] || kubectl wait --for=delete $_vf_namespaces --timeout={deadline}s | '
+        'while read -r _vf_ns _; do echo "time $_vf_ns $(($(date +%s) - _vf_start))"; done &',
+        'wait'])
+    return f'sh -c {shlex.quote(script)}'
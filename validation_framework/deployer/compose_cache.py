@@ -0,0 +1,251 @@
+"""
+Runner-side, content-addressed cache of the engine deployment (compose) files.
+
+Files are fetched once per release version, or per deployment branch commit, stored by
+their sha256 and pushed to the devices through the existing target connection. Pushes
+are skipped when the device already holds a file with the same hash. Branch commits are
+resolved once per run, and branch files downloaded from that commit.
+
+In offline mode (air-gapped runners) nothing is fetched, files must already be in the
+cache, which can be pre-seeded by running the validation once with connectivity.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Callable
+
+import invoke
+import requests
+
+from validation_framework.common import constants as cte
+from validation_framework.common.metrics import metrics
+from validation_framework.deployer.target_device.target import TargetDevice
+
+
+class ComposeCacheMiss(FileNotFoundError):
+    """
+    Raised in offline mode when the requested file is not cached
+    """
+
+
+class ComposeCache:
+    """
+    Cache layout:
+        <cache_path>/objects/<sha256>   File contents
+        <cache_path>/index.json         {<key>/<file name>: <sha256>}
+    """
+    # Prefix of the cache metrics
+    metrics_name: str = 'compose_cache'
+
+    def __init__(self, cache_path: Path = cte.COMPOSE_CACHE_PATH, offline: bool = False):
+        """
+        :param cache_path: Local folder of the cache
+        :param offline: If true, never reaches the network
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.cache_path: Path = cache_path
+        self.offline: bool = offline
+        self._lock: threading.Lock = threading.Lock()
+        # Cache key of the deployment branches resolved in this run
+        self._branch_keys: dict[str, str] = {}
+        self._branch_lock: threading.Lock = threading.Lock()
+
+    @property
+    def _objects_path(self) -> Path:
+        return self.cache_path / 'objects'
+
+    @property
+    def _index_path(self) -> Path:
+        return self.cache_path / 'index.json'
+
+    def _read_index(self) -> dict[str, str]:
+        if not self._index_path.is_file():
+            return {}
+        return json.loads(self._index_path.read_text())
+
+    def _write_index(self, index: dict[str, str]) -> None:
+        # Unique per process, the cache may be shared by several validation processes
+        tmp_path: Path = self._index_path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_text(json.dumps(index, indent=4, sort_keys=True))
+        tmp_path.replace(self._index_path)
+
+    @staticmethod
+    def release_key(version: str) -> str:
+        return f'release/{version}'
+
+    @staticmethod
+    def branch_sha(key: str) -> str:
+        """
+        :param key: Cache key of a deployment branch
+        :return: The commit of the key
+        """
+        return key.rsplit('@', 1)[1]
+
+    def branch_key(self, branch: str) -> str | None:
+        """
+        Deployment branches are keyed by their head commit, so new commits are fetched
+        while unchanged branches are served from the cache. The commit is resolved once per
+        run. Offline, or if the commit cannot be resolved (e.g. GitHub API rate limit), the
+        latest cached commit of the branch is used
+        :param branch: Deployment repository branch
+        :return: The cache key of the branch. None if unresolved and not cached
+        """
+        with self._branch_lock:
+            key: str | None = self._branch_keys.get(branch)
+            if key is not None:
+                return key
+
+            if self.offline:
+                # Most recently fetched commit of the branch
+                key = self._latest_key(f'branch/{branch}@')
+                if key is None:
+                    raise ComposeCacheMiss(f'Deployment branch {branch} not cached and running offline')
+            else:
+                key = self._resolve_branch(branch)
+
+            if key is not None:
+                self._branch_keys[branch] = key
+            return key
+
+    def _resolve_branch(self, branch: str) -> str | None:
+        try:
+            response: requests.Response = requests.get(cte.DEPLOYMENT_BRANCH_COMMIT_LINK.format(branch=branch),
+                                                       timeout=10)
+            response.raise_for_status()
+            return f'branch/{branch}@{response.json()["sha"]}'
+        except (requests.RequestException, ValueError, KeyError) as ex:
+            metrics.increment(f'{self.metrics_name}.unresolved')
+            latest: str | None = self._latest_key(f'branch/{branch}@')
+            self.logger.warning(f'Unable to resolve the head commit of deployment branch {branch}, '
+                                f'{f"using cached {latest}" if latest else "fetching it uncached"}: {ex}')
+            return latest
+
+    def _latest_key(self, prefix: str) -> str | None:
+        """
+        :param prefix: Prefix of the cache keys
+        :return: The key starting with prefix most recently stored, None if not cached
+        """
+        with self._lock:
+            entries: dict[str, str] = {k: v for k, v in self._read_index().items()
+                                       if k.startswith(prefix) and (self._objects_path / v).is_file()}
+        if not entries:
+            return None
+        latest: str = max(entries, key=lambda k: (self._objects_path / entries[k]).stat().st_mtime)
+        return latest.rsplit('/', 1)[0]
+
+    def _cached_object(self, entry: str) -> Path | None:
+        with self._lock:
+            digest: str | None = self._read_index().get(entry)
+        if digest is None:
+            return None
+
+        object_path: Path = self._objects_path / digest
+        if object_path.is_file() and hashlib.sha256(object_path.read_bytes()).hexdigest() == digest:
+            return object_path
+
+        self.logger.warning(f'Cached file {entry} is missing or corrupted, discarding it')
+        object_path.unlink(missing_ok=True)
+        return None
+
+    def fetch(self, link: str, key: str | None, file_name: str) -> Path:
+        """
+        Returns the local cached copy of the file, downloading it if needed
+        :param link: Download link of the file
+        :param key: Cache key (see release_key and branch_key). If None, the file is
+        downloaded and not indexed
+        :param file_name: Name of the file
+        :return: Local path of the verified file
+        """
+        def download() -> bytes:
+            self.logger.info(f'Fetching {file_name} from {link}')
+            content: bytes = self._download(link)
+            if b'services' not in content:
+                raise ValueError(f'Downloaded file {link} is not a compose file')
+            return content
+
+        return self._fetch(f'{key}/{file_name}' if key is not None else None, download)
+
+    def fetch_branch(self, branch: str, file_name: str, link: str) -> Path:
+        """
+        Returns the local cached copy of a deployment branch file, downloaded from the
+        commit the branch is keyed by
+        :param branch: Deployment repository branch
+        :param file_name: Name of the file
+        :param link: Download link of the file in the branch head, only used if the
+        branch commit is unresolved
+        :return: Local path of the verified file
+        """
+        key: str | None = self.branch_key(branch)
+        if key is not None:
+            link = cte.DEPLOYMENT_FILES_LINK.format(branch_name=self.branch_sha(key), file=file_name)
+        return self.fetch(link, key, file_name)
+
+    @staticmethod
+    def _download(link: str) -> bytes:
+        response: requests.Response = requests.get(link, timeout=30)
+        response.raise_for_status()
+        return response.content
+
+    def _fetch(self, entry: str | None, download: Callable[[], bytes]) -> Path:
+        """
+        Returns the cached object of the entry, storing the downloaded content if missing
+        :param entry: Cache entry, <key>/<file name>. If None, the content is always
+        downloaded and its object not indexed
+        :param download: Provides the content of the entry. Only called on cache misses
+        :return: Local path of the verified object
+        """
+        object_path: Path | None = self._cached_object(entry) if entry is not None else None
+        if object_path is not None:
+            metrics.increment(f'{self.metrics_name}.hits')
+            return object_path
+
+        if self.offline:
+            raise ComposeCacheMiss(f'{entry} not cached and running offline')
+
+        metrics.increment(f'{self.metrics_name}.misses' if entry is not None else f'{self.metrics_name}.uncached')
+        content: bytes = download()
+        digest: str = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            self._objects_path.mkdir(parents=True, exist_ok=True)
+            object_path = self._objects_path / digest
+            tmp_path: Path = object_path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp_path.write_bytes(content)
+            tmp_path.replace(object_path)
+            if entry is None:
+                return object_path
+
+            index: dict[str, str] = self._read_index()
+            index[entry] = digest
+            self._write_index(index)
+        return object_path
+
+    @staticmethod
+    def _hash_command(remote_file: str) -> str:
+        return f"sha256sum {remote_file} 2>/dev/null | cut -d ' ' -f 1"
+
+    def push(self, device: TargetDevice, local_file: Path, remote_file: str) -> bool:
+        """
+        Transfers the cached file to the device unless it already holds the same content
+        :param device: Target device
+        :param local_file: Cached file, as returned by fetch
+        :param remote_file: Destination in the device
+        :return: True if the file was transferred, False if skipped
+        """
+        try:
+            remote_digest: str = device.run_command(self._hash_command(remote_file)).stdout.strip()
+        except invoke.exceptions.UnexpectedExit:
+            remote_digest = ''
+
+        if remote_digest == local_file.name:
+            metrics.increment(f'{self.metrics_name}.push_skipped')
+            self.logger.debug(f'{remote_file} already up to date in {device}')
+            return False
+
+        device.send_file(str(local_file), remote_file)
+        metrics.increment(f'{self.metrics_name}.pushed')
+        return True
+
+compose_cache: ComposeCache = ComposeCache()
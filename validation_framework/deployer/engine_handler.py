@@ -29,7 +29,8 @@ class EngineHandler:
                  nuvlaedge_branch: str = '',
                  deployment_branch: str = '',
                  include_peripherals: bool = False,
-                 peripherals: list[str] = None):
+                 peripherals: list[str] = None,
+                 project_name: str = cte.PROJECT_NAME):
         """
         Engine handler constructor. It is in charge of assessing if the targets are
         passed as index or path to file. If an index is passed has to find the
@@ -38,6 +39,8 @@ class EngineHandler:
         :param target_device: Index or path to target device file
         :param nuvlaedge_version: Release version. Synchronized between NuvlaEdge and
         Deployment repository
+        :param project_name: Compose project of the engine. Engines with a project other
+        than the default one share the device and only purge their own resources
         """
         self.logger: logging.Logger = logging.getLogger(__name__)
         self.logger.debug(f'Creating Engine Handler for device {target_device}')
@@ -55,7 +58,8 @@ class EngineHandler:
                                          deployment_branch=deployment_branch,
                                          nuvlaedge_branch=nuvlaedge_branch,
                                          include_peripherals=include_peripherals,
-                                         peripherals=peripherals)
+                                         peripherals=peripherals,
+                                         project_name=project_name)
 
         self.engine_configuration: EngineEnvsConfiguration = EngineEnvsConfiguration()
 
@@ -91,7 +95,8 @@ class EngineHandler:
 
         # 2. Start Engine
         self.logger.info('Download NuvlaEdge related files and images')
-        self.coe.start_engine(nuvlaedge_uuid, remove_old_installation, extra_envs)
+        self.coe.start_engine(nuvlaedge_uuid, remove_old_installation=remove_old_installation,
+                              extra_envs=extra_envs)
 
     def get_system_up_time_in_engine(self) -> float:
         return self.coe.get_system_up_time()
@@ -99,10 +104,14 @@ class EngineHandler:
     def restart_engine(self) -> Result:
         return self.coe.restart_system()
 
-    def stop_engine(self, retrieve_logs: bool = False, uuid: NuvlaUUID = None) -> bool:
+    def stop_engine(self, retrieve_logs: bool = False, uuid: NuvlaUUID = None,
+                    logs_path: Path = None) -> bool:
         """
 
-        :return:
+        :param retrieve_logs: Whether to download the engine logs before purging it
+        :param uuid: NuvlaEdge UUID of the engine
+        :param logs_path: Local folder for the engine logs
+        :return: True if the engine was purged without errors
         """
         if not self.coe.engine_running():
             self.logger.info('Engine not running')
@@ -110,9 +119,9 @@ class EngineHandler:
             return True
 
         if retrieve_logs:
-            self.coe.get_engine_logs()
+            self.coe.get_engine_logs(logs_path)
 
-        self.coe.purge_engine(uuid)
+        return not self.coe.purge_engine(uuid).errors
 
     def check_if_peripherals_running(self, peripherals: set) -> bool:
         """
@@ -122,3 +131,13 @@ class EngineHandler:
         :return:
         """
         return self.coe.peripherals_running(peripherals)
+
+    def wait_for_peripherals(self, peripherals: set, timeout: float = 60) -> bool:
+        """
+            Waits until all the peripherals are running in the device
+            peripherals need to be given in lowercase
+        :param peripherals:
+        :param timeout: Maximum seconds to wait
+        :return: True if all of them are running within the timeout
+        """
+        return self.coe.wait_for_peripherals(peripherals, timeout)
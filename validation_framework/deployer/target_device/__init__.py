@@ -0,0 +1,39 @@
+import logging
+
+from validation_framework.common.schemas.target_device import TargetDeviceConfig
+from validation_framework.deployer.target_device.async_target import AsyncTargetDevice
+from validation_framework.deployer.target_device.async_ssh_target import AsyncSSHTarget
+from validation_framework.deployer.target_device.local_target import AsyncLocalTarget, LocalTarget
+from validation_framework.deployer.target_device.ssh_target import SSHTarget
+from validation_framework.deployer.target_device.target import TargetDevice
+
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def target_factory(device_configuration: TargetDeviceConfig) -> TargetDevice:
+    match device_configuration.transport:
+        case 'ssh':
+            return SSHTarget(device_configuration)
+
+        case 'local':
+            return LocalTarget(device_configuration)
+
+        case _:
+            logger.info(f'Transport {device_configuration.transport} not implemented')
+            raise NotImplementedError(f'Transport {device_configuration.transport} not supported '
+                                      f'by validation')
+
+
+def async_target_factory(device_configuration: TargetDeviceConfig) -> AsyncTargetDevice:
+    match device_configuration.transport:
+        case 'ssh':
+            return AsyncSSHTarget(device_configuration)
+
+        case 'local':
+            return AsyncLocalTarget(device_configuration)
+
+        case _:
+            logger.info(f'Transport {device_configuration.transport} not implemented')
+            raise NotImplementedError(f'Transport {device_configuration.transport} not supported '
+                                      f'by validation')
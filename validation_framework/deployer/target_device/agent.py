@@ -0,0 +1,103 @@
+"""
+Device agent. A small POSIX shell script (device_agent.sh) installed once per session in
+the deployer folder of the device, which gathers the requested state sections (uptime,
+containers, pods...) and reports them in a single JSON document. Replaces the several
+ad-hoc shell pipelines, and round trips, needed to inspect the device.
+"""
+import base64
+import hashlib
+import json
+import logging
+import shlex
+import threading
+from pathlib import Path
+
+import fabric
+
+from validation_framework.common import constants as cte
+from validation_framework.common.metrics import metrics
+from validation_framework.common.schemas.device_snapshot import DeviceSnapshot
+from validation_framework.deployer.target_device.target import TargetDevice
+
+AGENT_SCRIPT: bytes = (Path(__file__).parent / 'device_agent.sh').read_bytes()
+AGENT_VERSION: str = hashlib.sha256(AGENT_SCRIPT).hexdigest()[:12]
+AGENT_REMOTE_PATH: str = f'{cte.ROOT_PATH}{cte.DEPLOYER_PATH}device_agent_{AGENT_VERSION}.sh'
+
+SNAPSHOT_SECTIONS: tuple = ('uptime', 'boot_id', 'containers', 'authorized_keys',
+                            'namespaces', 'pods', 'deployments')
+
+# Devices where the agent has already been installed during this session
+_installed: set[tuple[str, str]] = set()
+_install_lock: threading.Lock = threading.Lock()
+
+
+class DeviceAgent:
+    """
+    Takes device snapshots through the agent script
+    """
+
+    def __init__(self, device: TargetDevice, sudo: bool = False, envs: dict | None = None):
+        """
+        :param device: Device where the agent runs
+        :param sudo: Whether to run the agent as super user (e.g. to access kubectl)
+        :param envs: Environmental variables of the agent
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.device: TargetDevice = device
+        self.sudo: bool = sudo
+        self.envs: dict | None = envs
+
+    @property
+    def _device_key(self) -> tuple[str, str]:
+        return self.device.user, self.device.address
+
+    def install(self, force: bool = False) -> None:
+        """
+        Uploads the agent to the device, unless already done during this session. The
+        version is part of the file name, so different framework versions never share it
+        :param force: Uploads the agent even if it was already installed
+        :return: None
+        """
+        with _install_lock:
+            if not force and self._device_key in _installed:
+                return
+
+            self.logger.info(f'Installing device agent {AGENT_VERSION} in {self.device}')
+            encoded: str = base64.b64encode(AGENT_SCRIPT).decode()
+            self.device.run_command(f'mkdir -p {cte.ROOT_PATH}{cte.DEPLOYER_PATH} && '
+                                    f"printf '%s' '{encoded}' | base64 -d > {AGENT_REMOTE_PATH}")
+            _installed.add(self._device_key)
+
+    def snapshot(self, *sections: str) -> DeviceSnapshot:
+        """
+        Gathers the requested sections of the device state in a single round trip
+        :param sections: Any of SNAPSHOT_SECTIONS. All of them if none provided
+        :return: The device snapshot
+        """
+        sections = sections if sections else SNAPSHOT_SECTIONS
+        self.install()
+
+        command: str = f'sh {AGENT_REMOTE_PATH} {" ".join(sections)}'
+        if self.sudo:
+            # sudo resets the environment, variables are passed through env instead
+            envs: str = ' '.join(f'{k}={shlex.quote(str(v))}' for k, v in (self.envs or {}).items())
+            command = f'sudo env {envs} {command}'
+
+        with metrics.timer('agent.snapshot_time'):
+            result: fabric.Result = self._run(command)
+        metrics.increment('agent.snapshots')
+        return DeviceSnapshot.from_agent(json.loads(result.stdout))
+
+    def _run(self, command: str) -> fabric.Result:
+        def run() -> fabric.Result:
+            if self.sudo:
+                return self.device.run_sudo_command(command)
+            return self.device.run_command(command, envs=self.envs)
+
+        try:
+            return run()
+        except Exception as ex:
+            # The agent might have been removed from the device (e.g. reinstalled OS)
+            self.logger.debug(f'Device agent failed in {self.device}, reinstalling: {ex}')
+            self.install(force=True)
+            return run()
@@ -0,0 +1,185 @@
+"""
+Target Device asyncio SSH implementation
+"""
+import asyncio
+import logging
+import os
+import re
+from pathlib import Path
+from typing import BinaryIO
+
+import asyncssh
+import invoke
+
+from validation_framework.common.metrics import metrics
+from validation_framework.common.schemas.target_device import TargetDeviceConfig
+from validation_framework.deployer.target_device.async_target import AsyncTargetDevice
+from validation_framework.deployer.target_device.target import inline_envs
+
+
+class AsyncSSHTarget(AsyncTargetDevice):
+    """
+    Keeps a single SSH connection per device and multiplexes every command on it as a
+    separate session channel. The connection is lazily (re)opened, so devices coming
+    back from a reboot are reconnected on the next command.
+    """
+    SUDO_PROMPT = re.compile(r'\[sudo\] password.*?')
+    SUDO_RESPONSE: str = 'pi\n'
+
+    # OpenSSH servers default MaxSessions to 10 channels per connection
+    MAX_SESSIONS: int = 8
+
+    def __init__(self, target_config: TargetDeviceConfig):
+        """
+        :param target_config: Target device configuration stored in the parent class
+        """
+        super().__init__(target_config, logging.getLogger(__name__))
+        self._port: int = target_config.port if target_config.port else 22
+        self._key_filename: str = os.path.expanduser(target_config.private_key_path or '')
+
+        self._connection: asyncssh.SSHClientConnection | None = None
+        self._connect_lock: asyncio.Lock = asyncio.Lock()
+        self._sessions: asyncio.Semaphore = asyncio.Semaphore(self.MAX_SESSIONS)
+
+    async def connect(self) -> asyncssh.SSHClientConnection:
+        """
+        :return: The open connection to the device. Callers use it for the whole
+        operation, as a failing one may meanwhile drop it
+        """
+        async with self._connect_lock:
+            if self._connection is not None and not self._connection.is_closed():
+                return self._connection
+
+            self.logger.debug(f'Opening asyncio SSH connection to {self.address}')
+            metrics.increment('ssh.async.connects')
+            self._connection = await asyncssh.connect(
+                self.address,
+                port=self._port,
+                username=self.user,
+                client_keys=[self._key_filename] if self._key_filename else None,
+                known_hosts=None,
+                connect_timeout=30,
+                keepalive_interval=15)
+            return self._connection
+
+    async def close(self) -> None:
+        connection: asyncssh.SSHClientConnection | None = self._connection
+        self._connection = None
+        if connection is not None:
+            connection.close()
+            await connection.wait_closed()
+
+    async def _drop_connection(self, connection: asyncssh.SSHClientConnection) -> None:
+        """
+        :param connection: Broken connection. Left alone if already replaced by a new one
+        """
+        self.logger.debug(f'Dropping broken SSH connection to {self.address}')
+        if self._connection is connection:
+            self._connection = None
+        connection.abort()
+
+    async def is_reachable(self) -> bool:
+        try:
+            result: invoke.Result = await self.run_command('hostname')
+            self.hostname = result.stdout.strip()
+            return True
+        except Exception as ex:
+            self.logger.error(f'Host address {self.address} not reachable {ex}')
+            return False
+
+    async def _run_with_sudo_watcher(self, connection: asyncssh.SSHClientConnection,
+                                     command: str) -> tuple[str, str, int]:
+        """
+        Runs the command answering the sudo password prompt, if it shows up, the same way
+        the synchronous SSHTarget does with its invoke Responder
+        """
+        async with connection.create_process(command) as process:
+            async def pump(stream, chunks: list[str]):
+                answered: bool = False
+                while True:
+                    data: str = await stream.read(4096)
+                    if not data:
+                        break
+                    chunks.append(data)
+                    if not answered and self.SUDO_PROMPT.search(data):
+                        process.stdin.write(self.SUDO_RESPONSE)
+                        answered = True
+
+            stdout: list[str] = []
+            stderr: list[str] = []
+            await asyncio.gather(pump(process.stdout, stdout), pump(process.stderr, stderr))
+            await process.wait()
+            exit_code: int | None = process.exit_status
+            return ''.join(stdout), ''.join(stderr), exit_code if exit_code is not None else -1
+
+    async def _run(self, command: str, envs: dict | None, sudo: bool) -> invoke.Result:
+        full_command: str = inline_envs(command, envs)
+        connection: asyncssh.SSHClientConnection = await self.connect()
+
+        async with self._sessions:
+            try:
+                if sudo:
+                    stdout, stderr, exit_code = await self._run_with_sudo_watcher(connection, full_command)
+                else:
+                    completed: asyncssh.SSHCompletedProcess = await connection.run(full_command, check=False)
+                    stdout, stderr = completed.stdout or '', completed.stderr or ''
+                    exit_code = completed.exit_status if completed.exit_status is not None else -1
+            except (OSError, asyncssh.Error):
+                await self._drop_connection(connection)
+                raise
+
+        result: invoke.Result = invoke.Result(command=command,
+                                              stdout=stdout,
+                                              stderr=stderr,
+                                              exited=exit_code)
+        if result.failed:
+            raise invoke.exceptions.UnexpectedExit(result)
+        return result
+
+    async def run_command(self, command: str, envs: dict | None = None) -> invoke.Result:
+        self.logger.debug(f'Running {command} in {self.address}')
+        return await self._run(command, envs, sudo=False)
+
+    async def run_sudo_command(self, command: str, envs: dict | None = None) -> invoke.Result:
+        self.logger.debug(f'Running {command} as SuperUser in {self.address}')
+        return await self._run(command, envs, sudo=True)
+
+    async def stream_command(self, command: str, sink: BinaryIO, envs: dict | None = None,
+                             sudo: bool = False) -> int:
+        self.logger.debug(f'Streaming {command} from {self.address}')
+        connection: asyncssh.SSHClientConnection = await self.connect()
+
+        async with self._sessions:
+            try:
+                async with connection.create_process(inline_envs(command, envs),
+                                                           encoding=None) as process:
+                    async def pump_stderr():
+                        answered: bool = False
+                        while data := await process.stderr.read(4096):
+                            if sudo and not answered and self.SUDO_PROMPT.search(data.decode(errors='replace')):
+                                process.stdin.write(self.SUDO_RESPONSE.encode())
+                                answered = True
+
+                    stderr_task: asyncio.Task = asyncio.create_task(pump_stderr())
+                    while data := await process.stdout.read(65536):
+                        sink.write(data)
+                    await stderr_task
+                    await process.wait()
+            except (OSError, asyncssh.Error):
+                await self._drop_connection(connection)
+                raise
+        return process.exit_status if process.exit_status is not None else -1
+
+    async def send_file(self, local_file: str, remote_path: str) -> None:
+        self.logger.debug(f'Transferring {local_file} to {remote_path}')
+        connection: asyncssh.SSHClientConnection = await self.connect()
+        async with self._sessions:
+            async with connection.start_sftp_client() as sftp:
+                # SFTP paths are relative to the home folder, ~ is not expanded
+                await sftp.put(local_file, remote_path.removeprefix('~/'))
+
+    async def download_remote_file(self, remote_file_path: str, local_file_path: Path) -> None:
+        connection: asyncssh.SSHClientConnection = await self.connect()
+        async with self._sessions:
+            async with connection.start_sftp_client() as sftp:
+                await sftp.get(remote_file_path, str(local_file_path))
@@ -0,0 +1,169 @@
+"""
+Asyncio counterpart of the TargetDevice interface. Allows a single event loop to drive
+many devices, and many concurrent commands on each of them, without dedicating a
+thread per device.
+
+Commands return the same invoke.Result objects as the synchronous targets and raise
+invoke.exceptions.UnexpectedExit on non-zero exit codes, so the COE logic can be shared
+between both worlds.
+"""
+import logging
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO
+
+import invoke
+
+from validation_framework.common.metrics import metrics
+from validation_framework.common.schemas.target_device import TargetDeviceConfig
+from validation_framework.deployer.target_device.batch import (BatchCommandResult,
+                                                                build_batch_script,
+                                                                parse_batch_output)
+from validation_framework.deployer.target_device.target import inline_envs
+
+
+class AsyncTargetDevice(ABC):
+    """
+    Asynchronous device interface. Implementations must allow concurrent calls of all
+    the coroutines on the same instance
+    """
+
+    def __init__(self, target_config: TargetDeviceConfig, logger: logging.Logger):
+        self.logger: logging.Logger = logger
+
+        # General configuration from file
+        self.target_config: TargetDeviceConfig = target_config
+
+        # Easy access configuration
+        self.hostname: str = self.target_config.hostname
+        self.address: str = self.target_config.address
+        self.user: str = self.target_config.user
+
+    def __str__(self):
+        return f'{self.user}@{self.hostname if self.hostname else self.address}'
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @abstractmethod
+    async def connect(self) -> None:
+        """
+        Establishes the connection with the device if not already connected
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        """
+        Closes the connection with the device
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    async def is_reachable(self) -> bool:
+        """
+        Checks whether the device is reachable from the framework standpoint
+        :return: True is reachable, false otherwise
+        """
+        pass
+
+    @abstractmethod
+    async def run_command(self, command: str, envs: dict | None = None) -> invoke.Result:
+        """
+        Executes a shell command in the device
+        :param command: Command to be executed
+        :param envs: Environmental variables to run within the command shell context
+        :return: The command result. Raises UnexpectedExit if the command fails
+        """
+        pass
+
+    @abstractmethod
+    async def run_sudo_command(self, command: str, envs: dict | None = None) -> invoke.Result:
+        """
+        Executes a shell command answering to the sudo password prompt
+        :param command: Command to be executed
+        :param envs: Environmental variables to run within the command shell context
+        :return: The command result. Raises UnexpectedExit if the command fails
+        """
+        pass
+
+    @abstractmethod
+    async def stream_command(self, command: str, sink: BinaryIO, envs: dict | None = None,
+                             sudo: bool = False) -> int:
+        """
+        Executes a shell command writing its raw standard output into sink as it arrives.
+        See TargetDevice.stream_command
+        """
+        pass
+
+    @abstractmethod
+    async def send_file(self, local_file: str, remote_path: str) -> None:
+        """
+        Transfers a local file to the device
+        :param local_file: Local file location
+        :param remote_path: Destination in the device
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    async def download_remote_file(self, remote_file_path: str, local_file_path: Path) -> None:
+        """
+        Transfers a file from the device to the local machine
+        :param remote_file_path: File location in the device
+        :param local_file_path: Local destination
+        :return: None
+        """
+        pass
+
+    async def run_command_within_folder(self, command: str, folder: str,
+                                        envs: dict | None = None) -> invoke.Result:
+        """
+        Executes a shell command within a provided folder
+        :param command: Command to be executed
+        :param folder: Context folder in which to run the provided command
+        :param envs: Environmental variables to run within the command shell context
+        :return: The command result. Raises UnexpectedExit if the command fails
+        """
+        return await self.run_command(f'cd {folder} && {command}', envs=envs)
+
+    async def download_file(self, link: str, file_name: str, directory: str) -> bool:
+        """
+        Downloads a file into directory/file_name from the provided link
+        :return: True if successfully downloaded, false otherwise
+        """
+        try:
+            await self.run_command(f'wget {link} -t 3 -T 5 -O {directory}/{file_name}')
+        except invoke.exceptions.UnexpectedExit:
+            return False
+        return True
+
+    async def run_batch(self,
+                        commands: list[str],
+                        stop_on_failure: bool = False,
+                        envs: dict | None = None,
+                        sudo: bool = False) -> list[BatchCommandResult]:
+        """
+        Executes a list of commands in a single shell session of the device. See
+        TargetDevice.run_batch
+        """
+        if not commands:
+            return []
+
+        script, token = build_batch_script(commands, stop_on_failure)
+        start_time: float = time.perf_counter()
+        if sudo:
+            result: invoke.Result = await self.run_sudo_command(script, envs=envs)
+        else:
+            result: invoke.Result = await self.run_command(script, envs=envs)
+        metrics.record('target.batch.time', time.perf_counter() - start_time)
+        metrics.increment('target.batch.commands', len(commands))
+
+        return parse_batch_output(commands, token, result.stdout, result.stderr)
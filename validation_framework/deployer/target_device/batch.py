@@ -0,0 +1,106 @@
+"""
+Batched execution of shell commands in a single remote shell session.
+
+The commands are wrapped into one POSIX shell script that delimits the output of each
+command with unique markers and reports its exit code and start/end times. The script
+is sent to the device in a single round trip and its output is split back into one
+result per command.
+"""
+import re
+import shlex
+import uuid
+from dataclasses import dataclass
+
+
+@dataclass
+class BatchCommandResult:
+    """
+    Outcome of a single command of a batch. exit_code is None when the command was
+    not executed because a previous one failed and the batch was stopped
+    """
+    command: str
+    exit_code: int | None = None
+    stdout: str = ''
+    stderr: str = ''
+    duration: float | None = None
+
+    @property
+    def skipped(self) -> bool:
+        return self.exit_code is None
+
+    @property
+    def failed(self) -> bool:
+        return self.exit_code != 0
+
+
+# Reads the time from /proc/uptime (shell builtins only, no fork) falling back to date
+_TIME_FUNCTION: str = ('_vf_now() { if [ -r /proc/uptime ]; then read _vf_t _vf_r < /proc/uptime; '
+                       'else _vf_t=$(date +%s); fi; }')
+
+
+def _begin_marker(token: str, index: int) -> str:
+    return f'__VF_BEGIN_{token}_{index}__'
+
+
+def _end_marker(token: str, index: int) -> str:
+    return f'__VF_END_{token}_{index}'
+
+
+def build_batch_script(commands: list[str], stop_on_failure: bool = False) -> tuple[str, str]:
+    """
+    Builds the shell command that runs all the provided commands in a single session
+    :param commands: Commands to execute, in order
+    :param stop_on_failure: If true, stops executing commands after the first failure
+    :return: A tuple with the shell command to execute and the token of its markers
+    """
+    token: str = uuid.uuid4().hex
+    lines: list[str] = [_TIME_FUNCTION]
+
+    for index, command in enumerate(commands):
+        begin: str = _begin_marker(token, index)
+        end: str = _end_marker(token, index)
+        lines.extend([
+            f"printf '%s\\n' '{begin}'; printf '%s\\n' '{begin}' >&2",
+            '_vf_now; _vf_s=$_vf_t',
+            f'( {command}\n) < /dev/null',
+            '_vf_rc=$?',
+            '_vf_now',
+            f"printf '\\n%s_%s_%s_%s__\\n' '{end}' \"$_vf_rc\" \"$_vf_s\" \"$_vf_t\"",
+            f"printf '\\n%s__\\n' '{end}' >&2"
+        ])
+        if stop_on_failure:
+            lines.append('[ "$_vf_rc" -eq 0 ] || exit 0')
+
+    lines.append('exit 0')
+    script: str = '\n'.join(lines)
+    return f'sh -c {shlex.quote(script)}', token
+
+
+def parse_batch_output(commands: list[str], token: str, stdout: str, stderr: str) -> list[BatchCommandResult]:
+    """
+    Splits the output of a batch script into the results of each of its commands
+    :param commands: Commands used to build the batch
+    :param token: Marker token returned by build_batch_script
+    :param stdout: Standard output of the batch
+    :param stderr: Standard error of the batch
+    :return: One result per command, in the same order
+    """
+    results: list[BatchCommandResult] = []
+    for index, command in enumerate(commands):
+        begin: str = re.escape(_begin_marker(token, index))
+        end: str = re.escape(_end_marker(token, index))
+
+        out_match = re.search(f'{begin}\n(.*?)\n{end}_(-?\\d+)_([\\d.]+)_([\\d.]+)__\n', stdout, re.DOTALL)
+        if not out_match:
+            results.append(BatchCommandResult(command=command))
+            continue
+
+        err_match = re.search(f'{begin}\n(.*?)\n{end}__\n', stderr, re.DOTALL)
+        results.append(BatchCommandResult(
+            command=command,
+            exit_code=int(out_match.group(2)),
+            stdout=out_match.group(1),
+            stderr=err_match.group(1) if err_match else '',
+            duration=round(float(out_match.group(4)) - float(out_match.group(3)), 2)))
+
+    return results
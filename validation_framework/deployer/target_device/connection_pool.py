@@ -0,0 +1,186 @@
+"""
+Pool of authenticated SSH connections shared by every SSHTarget of the process.
+
+Opening a fabric Connection implies a TCP handshake, the key exchange and the
+authentication against the device. Instead of paying that price on every command, the
+connections are kept open (with keepalive) once used and handed to the next caller
+targeting the same device. Connections are exclusively borrowed, so a single one is
+never used by two threads at the same time.
+"""
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, NamedTuple
+
+import paramiko
+from fabric import Connection
+
+from validation_framework.common.metrics import metrics
+
+
+class PoolKey(NamedTuple):
+    """
+    Identifies the connections that can be reused between each other
+    """
+    user: str
+    address: str
+    port: int
+    key_filename: str
+
+
+class _PooledConnection(NamedTuple):
+    connection: Connection
+    last_used: float
+
+
+# Exceptions raised when the SSH transport itself is broken (e.g. device rebooted)
+CONNECTION_ERRORS: tuple = (OSError, EOFError, paramiko.SSHException)
+
+
+class SSHConnectionPool:
+    """
+    Keeps idle authenticated connections per target. Connections are health checked
+    before being handed out and transparently replaced when the device dropped them.
+    """
+
+    def __init__(self,
+                 max_idle: int = 4,
+                 health_check_interval: float = 30.0,
+                 keepalive_interval: int = 15):
+        """
+        :param max_idle: Maximum number of idle connections kept per target
+        :param health_check_interval: Connections idle for longer than this many seconds
+        are probed (opening a session channel) before being reused
+        :param keepalive_interval: SSH keepalive period of the pooled transports
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.max_idle: int = max_idle
+        self.health_check_interval: float = health_check_interval
+        self.keepalive_interval: int = keepalive_interval
+
+        self._lock: threading.Lock = threading.Lock()
+        self._idle: dict[PoolKey, list[_PooledConnection]] = {}
+        self._stats: dict[PoolKey, dict[str, int]] = {}
+
+    def _count(self, key: PoolKey, counter: str) -> None:
+        with self._lock:
+            key_stats: dict[str, int] = self._stats.setdefault(
+                key, {'hits': 0, 'misses': 0, 'reconnects': 0, 'discarded': 0})
+            key_stats[counter] += 1
+        metrics.increment(f'ssh.pool.{counter}')
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        connection: Connection = pooled.connection
+        if not connection.is_connected:
+            return False
+
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return True
+
+        # Long idle connections might have been silently dropped (e.g. after a reboot).
+        # Opening a session channel is a single round trip on the existing transport.
+        try:
+            channel: paramiko.Channel = connection.transport.open_session(timeout=5)
+            channel.close()
+            return True
+        except CONNECTION_ERRORS as ex:
+            self.logger.debug(f'Pooled connection to {connection.host} is not healthy: {ex}')
+            return False
+
+    def _acquire(self, key: PoolKey, factory: Callable[[], Connection]) -> Connection:
+        while True:
+            with self._lock:
+                idle: list[_PooledConnection] = self._idle.get(key, [])
+                pooled: _PooledConnection | None = idle.pop() if idle else None
+
+            if pooled is None:
+                break
+
+            if self._is_healthy(pooled):
+                self._count(key, 'hits')
+                return pooled.connection
+
+            self._count(key, 'reconnects')
+            self._close(pooled.connection)
+
+        self._count(key, 'misses')
+        connection: Connection = factory()
+        with metrics.timer('ssh.pool.connect_time'):
+            connection.open()
+        connection.transport.set_keepalive(self.keepalive_interval)
+        return connection
+
+    def _release(self, key: PoolKey, connection: Connection, healthy: bool) -> None:
+        if not healthy or not connection.is_connected:
+            self._count(key, 'discarded')
+            self._close(connection)
+            return
+
+        with self._lock:
+            idle: list[_PooledConnection] = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(_PooledConnection(connection, time.monotonic()))
+                return
+        self._close(connection)
+
+    @contextmanager
+    def connection(self, key: PoolKey, factory: Callable[[], Connection]):
+        """
+        Borrows a connection for the target identified by key, creating it with factory
+        if there is no healthy idle connection. Connections failing at transport level
+        while borrowed are not returned to the pool.
+        :param key: Target identification
+        :param factory: Builds a new (not yet opened) connection for the target
+        """
+        connection: Connection = self._acquire(key, factory)
+        healthy: bool = True
+        try:
+            yield connection
+        except CONNECTION_ERRORS:
+            healthy = False
+            raise
+        finally:
+            self._release(key, connection, healthy)
+
+    def discard(self, key: PoolKey) -> None:
+        """
+        Closes all the idle connections of a target. Used when the device is known to
+        drop its connections, e.g. on reboot
+        :param key: Target identification
+        :return: None
+        """
+        with self._lock:
+            idle: list[_PooledConnection] = self._idle.pop(key, [])
+        for pooled in idle:
+            self._count(key, 'discarded')
+            self._close(pooled.connection)
+
+    def close_all(self) -> None:
+        """
+        Closes every idle connection of the pool
+        :return: None
+        """
+        with self._lock:
+            keys: list[PoolKey] = list(self._idle.keys())
+        for key in keys:
+            self.discard(key)
+
+    def stats(self, key: PoolKey) -> dict[str, int]:
+        """
+        :param key: Target identification
+        :return: Hit, miss, reconnect and discarded counters of the target
+        """
+        with self._lock:
+            return dict(self._stats.get(key, {'hits': 0, 'misses': 0, 'reconnects': 0, 'discarded': 0}))
+
+    def _close(self, connection: Connection) -> None:
+        try:
+            connection.close()
+        except Exception as ex:
+            self.logger.debug(f'Error closing connection to {connection.host}: {ex}')
+
+
+ssh_pool: SSHConnectionPool = SSHConnectionPool()
+atexit.register(ssh_pool.close_all)
@@ -0,0 +1,80 @@
+#!/bin/sh
+# NuvlaEdge validation device agent.
+#
+# Answers a batched query about the device state with a single JSON document, so the
+# framework gathers everything it needs in one round trip. Usage:
+#
+#   sh device_agent.sh [uptime] [boot_id] [containers] [authorized_keys]
+#                      [namespaces] [pods] [deployments]
+#
+# Sections that cannot be gathered (e.g. no docker or kubectl in the device) are null.
+# AGENT_KEYS_FILE overrides the authorized keys file (default ~/.ssh/authorized_keys).
+# Only POSIX sh and awk are required.
+
+# JSON string escaping, character by character as gsub backslash handling is not portable
+_vf_escape='function esc(s,    out, i, c) {
+    out = ""
+    for (i = 1; i <= length(s); i++) {
+        c = substr(s, i, 1)
+        if (c == "\\" || c == "\"") out = out "\\" c
+        else if (c == "\t") out = out "\\t"
+        else if (c == "\r") out = out "\\r"
+        else out = out c
+    }
+    return out
+}'
+
+_vf_uptime() {
+    [ -r /proc/uptime ] || { printf 'null'; return; }
+    read _vf_up _vf_idle < /proc/uptime
+    printf '%s' "$_vf_up"
+}
+
+_vf_boot_id() {
+    [ -r /proc/sys/kernel/random/boot_id ] || { printf 'null'; return; }
+    printf '"%s"' "$(cat /proc/sys/kernel/random/boot_id)"
+}
+
+_vf_containers() {
+    command -v docker > /dev/null 2>&1 || { printf 'null'; return; }
+    _vf_out=$(docker ps -a --no-trunc --format '{{json .}}' 2> /dev/null) || { printf 'null'; return; }
+    printf '%s\n' "$_vf_out" | awk 'BEGIN { printf "[" } NF { if (n++) printf ","; printf "%s", $0 } END { printf "]" }'
+}
+
+_vf_authorized_keys() {
+    _vf_keys="${AGENT_KEYS_FILE:-$HOME/.ssh/authorized_keys}"
+    [ -r "$_vf_keys" ] || { printf 'null'; return; }
+    awk "$_vf_escape"' BEGIN { printf "\"" } { printf "%s\\n", esc($0) } END { printf "\"" }' "$_vf_keys"
+}
+
+# Prints the kubectl custom columns output of the resource as a JSON list of objects
+# with the given (space separated) field names
+_vf_kubectl() {
+    command -v kubectl > /dev/null 2>&1 || { printf 'null'; return; }
+    _vf_out=$(kubectl get $1 -o custom-columns=$2 --no-headers 2> /dev/null) || { printf 'null'; return; }
+    printf '%s\n' "$_vf_out" | awk -v fields="$3" "$_vf_escape"'
+        BEGIN { n_fields = split(fields, names, " "); printf "[" }
+        NF {
+            if (n++) printf ","
+            printf "{"
+            for (i = 1; i <= n_fields; i++) printf "%s\"%s\":\"%s\"", (i > 1 ? "," : ""), names[i], esc($i)
+            printf "}"
+        }
+        END { printf "]" }'
+}
+
+printf '{"timestamp":%s' "$(date +%s)"
+for _vf_section in "$@"; do
+    printf ',"%s":' "$_vf_section"
+    case "$_vf_section" in
+        uptime) _vf_uptime ;;
+        boot_id) _vf_boot_id ;;
+        containers) _vf_containers ;;
+        authorized_keys) _vf_authorized_keys ;;
+        namespaces) _vf_kubectl namespaces 'NAME:.metadata.name' 'name' ;;
+        pods) _vf_kubectl 'pods -A' 'NS:.metadata.namespace,NAME:.metadata.name,PHASE:.status.phase' 'namespace name phase' ;;
+        deployments) _vf_kubectl 'deployments -A' 'NS:.metadata.namespace,NAME:.metadata.name,REPLICAS:.spec.replicas' 'namespace name replicas' ;;
+        *) printf 'null' ;;
+    esac
+done
+printf '}\n'
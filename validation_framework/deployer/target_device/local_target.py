@@ -0,0 +1,209 @@
+"""
+Target Device local implementation. Runs the engine in the same host (or container) as
+the framework, executing the commands as local subprocesses and transferring files with
+plain copies.
+"""
+import asyncio
+import logging
+import os
+import re
+import shutil
+import socket
+import subprocess
+import threading
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+import fabric
+import invoke
+import requests
+
+from validation_framework.common.constants import ROOT_PATH, DEPLOYER_PATH, ENGINE_PATH
+from validation_framework.common.metrics import metrics
+from validation_framework.common.schemas.target_device import TargetDeviceConfig
+from validation_framework.deployer.target_device.async_target import AsyncTargetDevice
+from validation_framework.deployer.target_device.target import TargetDevice, inline_envs
+
+# Commands are written for the devices, where sudo is always present. When the framework
+# runs as root in a minimal container, sudo is replaced by a function running the command
+_SUDO_SHIM: str = 'sudo() { while [ "${1#-}" != "$1" ]; do shift; done; "$@"; }; '
+
+
+def _needs_sudo_shim() -> bool:
+    return os.geteuid() == 0 and shutil.which('sudo') is None
+
+
+def _local_command(command: str, envs: dict | None, sudo: bool) -> str:
+    command = inline_envs(command, envs)
+    if sudo and _needs_sudo_shim():
+        command = _SUDO_SHIM + command
+    return command
+
+
+class LocalTarget(TargetDevice):
+    # Rebooting the target would reboot the host running the validation
+    supports_reboot: bool = False
+
+    SUDO_PASS = invoke.Responder(pattern=r'\[sudo\] password.*?',
+                                 response='pi\n')
+
+    def __init__(self, target_config: TargetDeviceConfig):
+        """
+        Local target_device constructor
+        :param target_config: Target device configuration stored in the parent class
+        """
+        super().__init__(target_config, logging.getLogger(__name__))
+        if not self.hostname:
+            self.hostname = socket.gethostname()
+        self._context: invoke.Context = invoke.Context(
+            config=invoke.Config(overrides={'run': {'shell': '/bin/sh'}}))
+
+        self.logger.info(f'Device {self.target_config.alias} running locally in {self.hostname}')
+        self.build_directory_tree()
+
+    def is_reachable(self, silent=True, level=None) -> bool:
+        return True
+
+    def build_directory_tree(self) -> None:
+        for folder in [ROOT_PATH, ROOT_PATH + DEPLOYER_PATH, ROOT_PATH + ENGINE_PATH]:
+            os.makedirs(os.path.expanduser(folder), exist_ok=True)
+
+    def send_file(self, local_file: str, remote_path: str):
+        self.logger.debug(f'Copying {local_file} to {remote_path}')
+        shutil.copy(os.path.expanduser(local_file), os.path.expanduser(remote_path))
+
+    def download_remote_file(self, remote_file_path: str, local_file_path: Path) -> str | None:
+        shutil.copy(os.path.expanduser(remote_file_path), local_file_path)
+        return None
+
+    def run_sudo_command(self, command: str, envs: dict | None = None, hide: bool = True) -> fabric.Result:
+        self.logger.debug(f'Running {command} as SuperUser locally')
+        return self._context.run(_local_command(command, envs, sudo=True), hide=hide, pty=False,
+                                 watchers=[self.SUDO_PASS])
+
+    def run_command(self, command: str, envs: dict | None = None, hide: bool = True) -> fabric.Result:
+        self.logger.debug(f'Running {command} locally')
+        return self._context.run(_local_command(command, envs, sudo=False), hide=hide)
+
+    def run_command_within_folder(self, command: str, folder: str, envs: dict | None = None) -> fabric.Result:
+        self.logger.debug(f'Running {command} locally within {folder} folder')
+        with self._context.cd(folder):
+            return self._context.run(_local_command(command, envs, sudo=False), hide=True)
+
+    def stream_command(self, command: str, sink: BinaryIO, envs: dict | None = None,
+                       sudo: bool = False) -> int:
+        self.logger.debug(f'Streaming {command} locally')
+        process: subprocess.Popen = subprocess.Popen(['/bin/sh', '-c', _local_command(command, envs, sudo)],
+                                                     stdin=subprocess.PIPE,
+                                                     stdout=subprocess.PIPE,
+                                                     stderr=subprocess.PIPE)
+
+        def pump_stderr():
+            answered: bool = False
+            while data := process.stderr.read1(4096):
+                if sudo and not answered and re.search(self.SUDO_PASS.pattern, data.decode(errors='replace')):
+                    process.stdin.write(self.SUDO_PASS.response.encode())
+                    process.stdin.flush()
+                    answered = True
+
+        stderr_thread: threading.Thread = threading.Thread(target=metrics.bind(pump_stderr), daemon=True)
+        stderr_thread.start()
+        while data := process.stdout.read1(65536):
+            sink.write(data)
+        stderr_thread.join()
+        return process.wait()
+
+    def feed_command(self, command: str, source: Iterable[bytes], envs: dict | None = None) -> int:
+        self.logger.debug(f'Feeding {command} locally')
+        process: subprocess.Popen = subprocess.Popen(['/bin/sh', '-c', _local_command(command, envs, sudo=True)],
+                                                     stdin=subprocess.PIPE,
+                                                     stdout=subprocess.DEVNULL,
+                                                     stderr=subprocess.DEVNULL)
+        try:
+            for chunk in source:
+                process.stdin.write(chunk)
+            process.stdin.close()
+        except BrokenPipeError:
+            self.logger.debug(f'Input of {command} closed before the end')
+        return process.wait()
+
+    def open_docker_socket(self) -> socket.socket:
+        docker_host: str = os.environ.get('DOCKER_HOST', 'unix:///var/run/docker.sock')
+        if not docker_host.startswith('unix://'):
+            raise NotImplementedError(f'Only unix socket docker hosts supported, found {docker_host}')
+        sock: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(docker_host.removeprefix('unix://'))
+        return sock
+
+    def download_file(self, link: str, file_name: str, directory: str) -> bool:
+        try:
+            response: requests.Response = requests.get(link, timeout=5)
+            response.raise_for_status()
+        except requests.RequestException as ex:
+            self.logger.error(f'Unable to download {link}: {ex}')
+            return False
+
+        Path(os.path.expanduser(directory), file_name).write_bytes(response.content)
+        return True
+
+
+class AsyncLocalTarget(AsyncTargetDevice):
+    """
+    Asyncio counterpart of LocalTarget, running the commands as asyncio subprocesses
+    """
+
+    def __init__(self, target_config: TargetDeviceConfig):
+        super().__init__(target_config, logging.getLogger(__name__))
+        if not self.hostname:
+            self.hostname = socket.gethostname()
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def is_reachable(self) -> bool:
+        return True
+
+    async def _run(self, command: str, envs: dict | None, sudo: bool) -> invoke.Result:
+        process: asyncio.subprocess.Process = await asyncio.create_subprocess_exec(
+            '/bin/sh', '-c', _local_command(command, envs, sudo),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await process.communicate()
+
+        result: invoke.Result = invoke.Result(command=command,
+                                              stdout=stdout.decode(errors='replace'),
+                                              stderr=stderr.decode(errors='replace'),
+                                              exited=process.returncode)
+        if result.failed:
+            raise invoke.exceptions.UnexpectedExit(result)
+        return result
+
+    async def run_command(self, command: str, envs: dict | None = None) -> invoke.Result:
+        self.logger.debug(f'Running {command} locally')
+        return await self._run(command, envs, sudo=False)
+
+    async def run_sudo_command(self, command: str, envs: dict | None = None) -> invoke.Result:
+        self.logger.debug(f'Running {command} as SuperUser locally')
+        return await self._run(command, envs, sudo=True)
+
+    async def stream_command(self, command: str, sink: BinaryIO, envs: dict | None = None,
+                             sudo: bool = False) -> int:
+        self.logger.debug(f'Streaming {command} locally')
+        process: asyncio.subprocess.Process = await asyncio.create_subprocess_exec(
+            '/bin/sh', '-c', _local_command(command, envs, sudo),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL)
+        while data := await process.stdout.read(65536):
+            sink.write(data)
+        return await process.wait()
+
+    async def send_file(self, local_file: str, remote_path: str) -> None:
+        await asyncio.to_thread(shutil.copy, os.path.expanduser(local_file), os.path.expanduser(remote_path))
+
+    async def download_remote_file(self, remote_file_path: str, local_file_path: Path) -> None:
+        await asyncio.to_thread(shutil.copy, os.path.expanduser(remote_file_path), local_file_path)
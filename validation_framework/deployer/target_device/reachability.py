@@ -0,0 +1,155 @@
+"""
+Layered reachability probing of the target devices.
+
+Checking that a device is reachable with a full SSH login and command is expensive. The
+probe escalates through increasingly costly levels, stopping at the first failure:
+    1. TCP connect to the SSH port
+    2. SSH protocol banner read
+    3. Full command execution, only when the caller needs it
+
+Results are cached for a short time, so hot loops checking the device do not hammer it,
+and waits are retried with exponential backoff and jitter within a time budget.
+"""
+import logging
+import socket
+import threading
+import time
+from enum import IntEnum
+from typing import Callable
+
+from validation_framework.common.metrics import metrics
+from validation_framework.common.polling import PollResult, poll_until
+
+
+class ProbeLevel(IntEnum):
+    TCP = 1
+    BANNER = 2
+    COMMAND = 3
+
+
+class ReachabilityProbe:
+    """
+    Reachability probe of a single SSH endpoint
+    """
+
+    def __init__(self,
+                 address: str,
+                 port: int = 22,
+                 cache_ttl: float = 5.0,
+                 timeout: float = 3.0):
+        """
+        :param address: Device address
+        :param port: SSH port of the device
+        :param cache_ttl: Seconds a probe result is reused
+        :param timeout: Timeout of the TCP and banner probes
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.address: str = address
+        self.port: int = port
+        self.cache_ttl: float = cache_ttl
+        self.timeout: float = timeout
+
+        self._lock: threading.Lock = threading.Lock()
+        self._cache: dict[ProbeLevel, tuple[float, bool]] = {}
+
+    def _check_tcp(self) -> bool:
+        try:
+            with socket.create_connection((self.address, self.port), timeout=self.timeout):
+                return True
+        except OSError as ex:
+            self.logger.debug(f'TCP probe to {self.address}:{self.port} failed: {ex}')
+            return False
+
+    def _check_banner(self) -> bool:
+        try:
+            with socket.create_connection((self.address, self.port), timeout=self.timeout) as sock:
+                banner: bytes = sock.recv(256)
+        except OSError as ex:
+            self.logger.debug(f'SSH banner probe to {self.address}:{self.port} failed: {ex}')
+            return False
+        return banner.startswith(b'SSH-')
+
+    def _cached(self, level: ProbeLevel) -> bool | None:
+        with self._lock:
+            entry: tuple[float, bool] | None = self._cache.get(level)
+        if entry is not None and time.monotonic() - entry[0] < self.cache_ttl:
+            metrics.increment('target.reachability.cache_hits')
+            return entry[1]
+        return None
+
+    def _store(self, level: ProbeLevel, reachable: bool) -> None:
+        now: float = time.monotonic()
+        with self._lock:
+            self._cache[level] = (now, reachable)
+            # Reaching a level implies reaching the cheaper ones
+            if reachable:
+                for lower in ProbeLevel:
+                    if lower < level:
+                        self._cache[lower] = (now, True)
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached results, e.g. when the device is known to be rebooting
+        :return: None
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def probe(self,
+              level: ProbeLevel = ProbeLevel.BANNER,
+              command: Callable[[], bool] | None = None,
+              use_cache: bool = True) -> bool:
+        """
+        Probes the device up to the requested level
+        :param level: Deepest level to check
+        :param command: Check run for the COMMAND level. Required for that level
+        :param use_cache: Whether to reuse recent results
+        :return: True if the device is reachable at the requested level
+        """
+        checks: dict[ProbeLevel, Callable[[], bool]] = {ProbeLevel.TCP: self._check_tcp,
+                                                        ProbeLevel.BANNER: self._check_banner,
+                                                        ProbeLevel.COMMAND: command}
+        if level == ProbeLevel.COMMAND and command is None:
+            raise ValueError('A command check is required to probe at COMMAND level')
+
+        for current in ProbeLevel:
+            if current > level:
+                break
+            # The banner read implies the TCP connection, no need to open two sockets
+            if current == ProbeLevel.TCP and level > ProbeLevel.TCP:
+                continue
+
+            reachable: bool | None = self._cached(current) if use_cache else None
+            if reachable is None:
+                with metrics.timer(f'target.reachability.{current.name.lower()}'):
+                    reachable = checks[current]()
+                self._store(current, reachable)
+
+            if not reachable:
+                return False
+        return True
+
+    def wait_until_reachable(self,
+                             budget: float,
+                             level: ProbeLevel = ProbeLevel.BANNER,
+                             command: Callable[[], bool] | None = None,
+                             initial_delay: float = 0.5,
+                             max_delay: float = 10.0) -> bool:
+        """
+        Probes the device until it is reachable or the time budget is exhausted, waiting
+        an exponentially increasing, jittered, delay between attempts
+        :param budget: Maximum time, in seconds, to wait for the device
+        :param level: Deepest level to check
+        :param command: Check run for the COMMAND level
+        :param initial_delay: Delay after the first failed attempt
+        :param max_delay: Upper bound of the delay between attempts
+        :return: True if the device became reachable within the budget
+        """
+        # Jitter avoids retrying in lockstep when probing many devices at once
+        result: PollResult[bool] = poll_until(lambda: self.probe(level, command, use_cache=False),
+                                              timeout=budget, name='target.reachability',
+                                              interval=initial_delay, max_interval=max_delay,
+                                              factor=2, jitter=0.5)
+        if not result:
+            self.logger.debug(f'Device {self.address} not reachable after {result.attempts} attempts')
+        return result.success
@@ -4,17 +4,42 @@ Target Device SSH implementation
 import json
 import os
 import logging
-import time
+import re
+import threading
 from contextlib import contextmanager
+from typing import BinaryIO, Iterable
 
 import fabric
 from fabric import Connection, Result
 import invoke
+import paramiko
 
 from validation_framework.common.constants import *
+from validation_framework.common.metrics import metrics
 from validation_framework.common.nuvla_uuid import NuvlaUUID
 from validation_framework.common.schemas.target_device import TargetDeviceConfig
-from validation_framework.deployer.target_device.target import TargetDevice
+from validation_framework.deployer.target_device.connection_pool import PoolKey, ssh_pool
+from validation_framework.deployer.target_device.reachability import ProbeLevel, ReachabilityProbe
+from validation_framework.deployer.target_device.target import TargetDevice, inline_envs
+
+
+class _OwnedChannel:
+    """
+    Channel running on a connection of its own, closed along with the channel
+    """
+
+    def __init__(self, channel: paramiko.Channel, connection: Connection):
+        self._channel: paramiko.Channel = channel
+        self._connection: Connection = connection
+
+    def __getattr__(self, item):
+        return getattr(self._channel, item)
+
+    def close(self) -> None:
+        try:
+            self._channel.close()
+        finally:
+            self._connection.close()
 
 
 class SSHTarget(TargetDevice):
@@ -30,57 +55,82 @@ class SSHTarget(TargetDevice):
         self.logger.info(f'Starting SSH target with configuration '
                          f'{json.dumps(target_config.dict(), indent=4)}')
         self._port: int = target_config.port if target_config.port else 22
+        self._pool_key: PoolKey = PoolKey(user=self.user,
+                                          address=self.address,
+                                          port=self._port,
+                                          key_filename=os.path.expanduser(
+                                              self.target_config.private_key_path or ''))
 
-        retrials = 0
-        maxretrials = 5
-        timeout = 3
-        while not self.is_reachable():
-            self.logger.debug(f'Device {self.target_config.alias} not reachable in {self.target_config.address}. '
-                              f'Retrying... retrail({retrials}) ')
-            if retrials == maxretrials:
-                raise ConnectionError(f'Device {self.target_config.alias} not reachable in {self.target_config.address} ')
-            time.sleep(timeout)
-            retrials += 1
+        self.reachability: ReachabilityProbe = ReachabilityProbe(
+            self.address, self._port, cache_ttl=self.target_config.reachability_cache_ttl)
+
+        if not self.reachability.wait_until_reachable(self.target_config.reachability_budget,
+                                                      level=ProbeLevel.COMMAND,
+                                                      command=self._check_login):
+            raise ConnectionError(f'Device {self.target_config.alias} not reachable in {self.target_config.address} ')
 
         self.logger.info(f'Device {self.target_config.alias} online and ready')
         self.build_directory_tree()
 
-    @contextmanager
-    def connection(self) -> Connection:
-        new_connection: Connection = Connection(
+    def _new_connection(self) -> Connection:
+        return Connection(
             host=self.address,
             user=self.user,
             port=self._port,
             connect_timeout=30,
             connect_kwargs={
-                "key_filename":
-                    os.path.expanduser(self.target_config.private_key_path)
+                "key_filename": self._pool_key.key_filename
             }
         )
-        yield new_connection
-        new_connection.close()
 
-    def is_reachable(self, silent=True) -> bool:
+    @contextmanager
+    def connection(self) -> Connection:
+        """
+        Borrows an authenticated connection to the device from the SSH connection pool
+        """
+        with ssh_pool.connection(self._pool_key, self._new_connection) as connection:
+            yield connection
+
+    def reset_connections(self) -> None:
+        self.logger.debug(f'Discarding pooled connections to {self.address}. '
+                          f'Pool stats: {self.pool_stats}')
+        ssh_pool.discard(self._pool_key)
+        self.reachability.invalidate()
+
+    @property
+    def pool_stats(self) -> dict[str, int]:
+        """
+        :return: Connection pool hit, miss and reconnect counters for this device
+        """
+        return ssh_pool.stats(self._pool_key)
+
+    def _check_login(self) -> bool:
         try:
-            if not silent:
-                self.logger.info('Running connection')
             it_result: fabric.Result = self.run_command('hostname')
             self.hostname = it_result.stdout.strip()
-            if not silent:
-                self.logger.info(f'Host {self.hostname} reachable')
             return not it_result.failed
         except Exception as ex:
             self.logger.error(f'Host address {self.address} not reachable {ex}')
             return False
 
-    def build_directory_tree(self) -> None:
-        # check main folder
-        with self.connection() as connection:
-            connection.run(f'mkdir -p {ROOT_PATH}')
+    def is_reachable(self, silent=True, level: ProbeLevel = ProbeLevel.COMMAND) -> bool:
+        """
+        Checks the device reachability escalating from a TCP connect to the SSH port up to
+        the requested level. Results are cached for reachability_cache_ttl seconds
+        :param silent: Whether to log the check
+        :param level: Deepest probe level. COMMAND runs a command through SSH
+        :return: True is reachable, false otherwise
+        """
+        if not silent:
+            self.logger.info('Running connection')
+        reachable: bool = self.reachability.probe(level, command=self._check_login)
+        if reachable and not silent:
+            self.logger.info(f'Host {self.hostname} reachable')
+        return reachable
 
-            # check subdirectories
-            connection.run(f'mkdir -p {ROOT_PATH + DEPLOYER_PATH}')
-            connection.run(f'mkdir -p {ROOT_PATH + ENGINE_PATH}')
+    def build_directory_tree(self) -> None:
+        # Main folder and subdirectories in a single call
+        self.run_command(f'mkdir -p {ROOT_PATH} {ROOT_PATH + DEPLOYER_PATH} {ROOT_PATH + ENGINE_PATH}')
 
     def send_file(self, local_file: str, remote_path: str):
         """
@@ -90,6 +140,8 @@ class SSHTarget(TargetDevice):
         :return: None
         """
         self.logger.debug(f'Transferring {local_file} to {remote_path}')
+        # SFTP paths are relative to the home folder, ~ is not expanded
+        remote_path = remote_path.removeprefix('~/')
         with self.connection() as connection:
             result: fabric.Result = connection.put(local_file, remote=remote_path)
 
@@ -119,6 +171,68 @@ class SSHTarget(TargetDevice):
         with self.connection() as connection:
             return connection.run(command, env=envs, hide=hide)
 
+    def stream_command(self, command: str, sink: BinaryIO, envs: dict | None = None,
+                       sudo: bool = False) -> int:
+        self.logger.debug(f'Streaming {command} from {self.target_config.address}')
+        with self.connection() as connection:
+            channel: paramiko.Channel = connection.transport.open_session()
+            try:
+                channel.exec_command(inline_envs(command, envs))
+
+                def pump_stderr():
+                    answered: bool = False
+                    while data := channel.recv_stderr(4096):
+                        if sudo and not answered and re.search(self.SUDO_PASS.pattern,
+                                                               data.decode(errors='replace')):
+                            channel.sendall(self.SUDO_PASS.response.encode())
+                            answered = True
+
+                stderr_thread: threading.Thread = threading.Thread(target=metrics.bind(pump_stderr), daemon=True)
+                stderr_thread.start()
+                while data := channel.recv(65536):
+                    sink.write(data)
+                stderr_thread.join()
+                return channel.recv_exit_status()
+            finally:
+                channel.close()
+
+    def feed_command(self, command: str, source: Iterable[bytes], envs: dict | None = None) -> int:
+        self.logger.debug(f'Feeding {command} in {self.target_config.address}')
+        with self.connection() as connection:
+            channel: paramiko.Channel = connection.transport.open_session()
+            try:
+                channel.exec_command(inline_envs(command, envs))
+                try:
+                    for chunk in source:
+                        channel.sendall(chunk)
+                except OSError as ex:
+                    # The command exited before consuming its input, its exit code tells why
+                    self.logger.debug(f'Input of {command} closed: {ex}')
+                channel.shutdown_write()
+                exit_code: int = channel.recv_exit_status()
+                if exit_code != 0:
+                    stderr: str = channel.makefile_stderr('rb').read().decode(errors='replace')
+                    self.logger.debug(f'{command} failed: {stderr}')
+                return exit_code
+            finally:
+                channel.close()
+
+    def open_docker_socket(self) -> _OwnedChannel:
+        """
+        Session channel proxying the daemon socket through docker system dial-stdio, the
+        same way the docker CLI reaches ssh:// hosts. The channel outlives any command, so
+        it runs on a dedicated connection out of the pool, closed along with the channel
+        """
+        connection: Connection = self._new_connection()
+        try:
+            connection.open()
+            channel: paramiko.Channel = connection.transport.open_session()
+            channel.exec_command('docker system dial-stdio')
+        except BaseException:
+            connection.close()
+            raise
+        return _OwnedChannel(channel, connection)
+
     def run_command_within_folder(self, command: str, folder: str, envs: dict | None = None) -> fabric.Result:
 
         self.logger.debug(f'Running {command} in {self.target_config.address} within {folder} folder')
@@ -5,11 +5,32 @@ remote with other techniques
 """
 import json
 import logging
+import shlex
+import time
 from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterable
 
 import fabric
 
+from validation_framework.common.metrics import metrics
 from validation_framework.common.schemas.target_device import TargetDeviceConfig
+from validation_framework.deployer.target_device.batch import (BatchCommandResult,
+                                                                build_batch_script,
+                                                                parse_batch_output)
+
+
+def inline_envs(command: str, envs: dict | None) -> str:
+    """
+    Prefixes the command with the export of the provided environmental variables, the
+    same way fabric does when the SSH server does not accept environment requests
+    :param command: Command to be executed
+    :param envs: Environmental variables
+    :return: The command with the variables exported
+    """
+    if not envs:
+        return command
+    exports: str = ' '.join(f'{k}={shlex.quote(str(v))}' for k, v in envs.items())
+    return f'export {exports} && {command}'
 
 
 class TargetDevice(ABC):
@@ -17,6 +38,8 @@ class TargetDevice(ABC):
     Device is considered any receptor of a NuvlaEdge engine, either via
     installer or via direct deployment
     """
+    # Whether the device can be rebooted by the validation
+    supports_reboot: bool = True
 
     def __init__(self, target_config: TargetDeviceConfig, logger: logging.Logger):
         self.logger: logging.Logger = logger
@@ -51,6 +74,32 @@ class TargetDevice(ABC):
         """
         pass
 
+    @abstractmethod
+    def stream_command(self, command: str, sink: BinaryIO, envs: dict | None = None,
+                       sudo: bool = False) -> int:
+        """
+        Executes a shell command writing its raw standard output into sink as it arrives,
+        without keeping it in memory nor decoding it
+        :param command: Command to be executed
+        :param sink: Binary file-like object receiving the standard output
+        :param envs: Environmental variables to run within the command shell context
+        :param sudo: Answers the sudo password prompt as run_sudo_command does
+        :return: Exit code of the command
+        """
+        pass
+
+    @abstractmethod
+    def feed_command(self, command: str, source: Iterable[bytes], envs: dict | None = None) -> int:
+        """
+        Executes a shell command writing the chunks of source into its standard input as
+        they are produced, e.g. to transfer large archives without temporary files
+        :param command: Command to be executed
+        :param source: Chunks of the standard input
+        :param envs: Environmental variables to run within the command shell context
+        :return: Exit code of the command
+        """
+        pass
+
     @abstractmethod
     def run_command_within_folder(self, command: str, folder: str, envs: dict | None = None) -> fabric.Result:
         """
@@ -73,6 +122,42 @@ class TargetDevice(ABC):
         """
         pass
 
+    def run_batch(self,
+                  commands: list[str],
+                  stop_on_failure: bool = False,
+                  envs: dict | None = None,
+                  sudo: bool = False) -> list[BatchCommandResult]:
+        """
+        Executes a list of commands in a single shell session of the device
+        :param commands: Commands to be executed, in order
+        :param stop_on_failure: If true, the commands following a failing one are not
+        executed (reported as skipped)
+        :param envs: Environmental variables to run within the session context
+        :param sudo: Runs the session as run_sudo_command does (commands still have to
+        prepend sudo themselves)
+        :return: Exit code, stdout, stderr and duration of each command
+        """
+        if not commands:
+            return []
+
+        script, token = build_batch_script(commands, stop_on_failure)
+        self.logger.debug(f'Running batch of {len(commands)} commands in {self.address}')
+
+        start_time: float = time.perf_counter()
+        if sudo:
+            result: fabric.Result = self.run_sudo_command(script, envs=envs)
+        else:
+            result: fabric.Result = self.run_command(script, envs=envs)
+        metrics.record('target.batch.time', time.perf_counter() - start_time)
+        metrics.increment('target.batch.commands', len(commands))
+
+        results: list[BatchCommandResult] = parse_batch_output(commands, token,
+                                                               result.stdout, result.stderr)
+        for r in results:
+            self.logger.debug(f'Batch command "{r.command}" exited with {r.exit_code} '
+                              f'in {r.duration}s')
+        return results
+
     def get_remote_containers(self, containers_filter: dict = None) -> list:
         json_format: dict = containers_filter if containers_filter is not None else {"{{ .ID }}":
                                                                                          {"Image": "{{ .Image }}",
@@ -90,6 +175,13 @@ class TargetDevice(ABC):
 
         return containers
 
+    def open_docker_socket(self):
+        """
+        Opens a new connection to the Docker Engine API of the device
+        :return: Socket like object (sendall, recv, makefile, settimeout, close)
+        """
+        raise NotImplementedError(f'Docker Engine API not reachable through {type(self).__name__}')
+
     @abstractmethod
     def build_directory_tree(self) -> None:
         """
@@ -100,3 +192,11 @@ class TargetDevice(ABC):
     @abstractmethod
     def run_sudo_command(self, command: str, envs: dict | None = None, hide: bool = True) -> fabric.Result:
         pass
+
+    def reset_connections(self) -> None:
+        """
+        Drops any connection kept open towards the device. Must be called when the
+        device is known to lose its connections (e.g. reboot)
+        :return: None
+        """
+        pass
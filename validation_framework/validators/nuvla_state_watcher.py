@@ -0,0 +1,213 @@
+"""
+Shared poller of the state of the NuvlaEdges under validation. Every tracked NuvlaEdge
+is polled once per interval, whatever the number of tests waiting on it: the state and
+capabilities of all of them are read in a single nuvlabox search and their status in a
+single nuvlabox-status search, both restricted to the selected fields.
+
+Waiters subscribe to a predicate on the last known state of a NuvlaEdge and are woken
+up as soon as a poll satisfies it, or when their deadline expires.
+"""
+import copy
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable
+
+from nuvla.api import Api as NuvlaClient
+from nuvla.api.models import CimiResource
+
+from validation_framework.common import constants as cte
+from validation_framework.common.metrics import metrics
+
+UNKNOWN: str = 'UNKNOWN'
+
+
+@dataclass
+class NuvlaEdgeState:
+    """
+    Last known state of a NuvlaEdge. state is managed by Nuvla, status is reported by
+    the engine once started
+    """
+    id: str
+    state: str = UNKNOWN
+    status: str = UNKNOWN
+    capabilities: list[str] = field(default_factory=list)
+    status_id: str | None = None
+    # Runner time of the poll the values were read in
+    updated: float = 0
+
+
+def state_is(state: str) -> Callable[[NuvlaEdgeState], bool]:
+    return lambda edge: edge.state == state
+
+
+def status_is(status: str) -> Callable[[NuvlaEdgeState], bool]:
+    return lambda edge: edge.status == status
+
+
+def has_capabilities(capabilities: list[str]) -> Callable[[NuvlaEdgeState], bool]:
+    return lambda edge: set(capabilities) <= set(edge.capabilities)
+
+
+def _any_of(field_name: str, values: list[str]) -> str:
+    return ' or '.join(f'{field_name}="{v}"' for v in values)
+
+
+class NuvlaStateWatcher:
+    """
+    Polls the NuvlaEdges with subscribed waiters from a daemon thread, started on the
+    first subscription
+    """
+
+    def __init__(self, interval: float = cte.NUVLA_STATE_POLL_INTERVAL):
+        """
+        :param interval: Seconds between two polls
+        """
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.interval: float = interval
+        self.client: NuvlaClient | None = None
+
+        # NuvlaEdge id: number of waiters subscribed to it
+        self._subscribers: dict[str, int] = {}
+        self._edges: dict[str, NuvlaEdgeState] = {}
+        self._condition: threading.Condition = threading.Condition()
+        self._wake: threading.Event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def attach(self, client: NuvlaClient) -> None:
+        """
+        :param client: Authenticated Nuvla client used by the following polls
+        """
+        self.client = client
+
+    # ------------------------------------------------------------------------
+    # Polling
+    # ------------------------------------------------------------------------
+    def _search(self, resource_type: str, filter_: str, select: list[str], count: int) -> list[CimiResource]:
+        metrics.increment('nuvla.watcher.requests')
+        with metrics.timer('nuvla.watcher.request_time'):
+            return self.client.search(resource_type, filter=filter_, select=select, last=count).resources
+
+    def poll(self, uuids: list[str] | None = None) -> dict[str, NuvlaEdgeState]:
+        """
+        Reads the state of the NuvlaEdges in two searches, whatever their number, and
+        notifies the waiters
+        :param uuids: NuvlaEdges to poll. The subscribed ones if None
+        :return: State of the polled NuvlaEdges found in Nuvla
+        """
+        with self._condition:
+            uuids = list(self._subscribers) if uuids is None else uuids
+        if not uuids or self.client is None:
+            return {}
+
+        timestamp: float = time.time()
+        edges: list[CimiResource] = self._search('nuvlabox', _any_of('id', uuids),
+                                                 ['id', 'state', 'capabilities', 'nuvlabox-status'], len(uuids))
+        # Statuses are looked up by parent, so they do not depend on the previous search
+        statuses: dict[str, CimiResource] = {s.data.get('parent'): s for s in self._search(
+            'nuvlabox-status', _any_of('parent', uuids), ['id', 'parent', 'status'], len(uuids))}
+        metrics.increment('nuvla.watcher.polls')
+
+        polled: dict[str, NuvlaEdgeState] = {}
+        with self._condition:
+            for edge in edges:
+                uuid: str = edge.data['id']
+                status: CimiResource | None = statuses.get(uuid)
+                polled[uuid] = NuvlaEdgeState(
+                    id=uuid,
+                    state=edge.data.get('state', UNKNOWN),
+                    status=status.data.get('status', UNKNOWN) if status else UNKNOWN,
+                    capabilities=edge.data.get('capabilities') or [],
+                    status_id=edge.data.get('nuvlabox-status'),
+                    updated=timestamp)
+            # Only the subscribed NuvlaEdges are kept, one-off polls are not cached
+            self._edges.update({k: v for k, v in polled.items() if k in self._subscribers})
+            self._condition.notify_all()
+        return copy.deepcopy(polled)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._subscribers:
+                    self._thread = None
+                    break
+            self._wake.clear()
+            try:
+                self.poll()
+            except Exception as ex:
+                metrics.increment('nuvla.watcher.errors')
+                self.logger.debug(f'Nuvla state poll failed ({ex}), retrying in {self.interval}s')
+            self._wake.wait(self.interval)
+        self.logger.debug('No NuvlaEdge tracked, state watcher finished')
+
+    # ------------------------------------------------------------------------
+    # Waiters
+    # ------------------------------------------------------------------------
+    def _subscribe(self, uuid: str) -> None:
+        with self._condition:
+            self._subscribers[uuid] = self._subscribers.get(uuid, 0) + 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name='nuvla-state-watcher')
+                self._thread.start()
+        # Poll right away instead of waiting for the running interval to end
+        self._wake.set()
+
+    def _unsubscribe(self, uuid: str) -> None:
+        with self._condition:
+            self._subscribers[uuid] -= 1
+            if not self._subscribers[uuid]:
+                del self._subscribers[uuid]
+                self._edges.pop(uuid, None)
+
+    @contextmanager
+    def tracking(self, uuid: str):
+        """
+        Keeps the NuvlaEdge polled within the context, its state being read with last_state
+        :param uuid: NuvlaEdge id
+        """
+        self._subscribe(uuid)
+        try:
+            yield self
+        finally:
+            self._unsubscribe(uuid)
+
+    def wait_for(self, uuid: str, predicate: Callable[[NuvlaEdgeState], bool], timeout: float,
+                 description: str = '') -> NuvlaEdgeState | None:
+        """
+        Blocks until a poll of the NuvlaEdge satisfies the predicate
+        :param uuid: NuvlaEdge id
+        :param predicate: Condition on the state of the NuvlaEdge
+        :param timeout: Maximum seconds to wait
+        :param description: Condition description for the logs
+        :return: The state satisfying the predicate, None if the deadline expired
+        """
+        self.logger.info(f'Waiting up to {timeout}s until NuvlaEdge {uuid} {description or "matches"}')
+        start: float = time.perf_counter()
+        self._subscribe(uuid)
+        try:
+            with self._condition:
+                matched: bool = self._condition.wait_for(
+                    lambda: uuid in self._edges and predicate(self._edges[uuid]), timeout)
+                edge: NuvlaEdgeState | None = copy.deepcopy(self._edges.get(uuid))
+        finally:
+            self._unsubscribe(uuid)
+
+        metrics.record('nuvla.watcher.wait_time', time.perf_counter() - start)
+        if not matched:
+            metrics.increment('nuvla.watcher.timeouts')
+            self.logger.warning(f'NuvlaEdge {uuid} did not match {description or "the condition"} within {timeout}s, '
+                                f'last state {edge}')
+            return None
+        return edge
+
+    def last_state(self, uuid: str) -> NuvlaEdgeState | None:
+        """
+        :return: Last polled state of a subscribed NuvlaEdge, None if not yet polled
+        """
+        with self._condition:
+            return copy.deepcopy(self._edges.get(uuid))
+
+
+nuvla_state_watcher: NuvlaStateWatcher = NuvlaStateWatcher()
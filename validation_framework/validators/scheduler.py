@@ -0,0 +1,224 @@
+"""
+Cost aware ordering of the validators of a target.
+
+Each validator declares its requirements: the engine version and peripherals it
+installs, the COE it is limited to, whether it reboots the device and whether it
+destroys the state of the engine. Validators are then grouped and ordered so the
+expensive transitions between them (engine installations, version changes and reboots)
+happen as rarely as possible:
+
+ - Validators of the same engine configuration run one after the other, so the ones
+   not destroying the state share their engine (--shared_engine).
+ - The version under validation runs first, other versions (e.g. update origins) later.
+ - Reboots run last, alone in the device.
+ - Within a group, and among concurrent validators, the longest ones start first, as
+   measured in the previous runs of the target.
+"""
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from validation_framework.common.metrics import metrics
+
+# Expected seconds of a validator never run in the target
+DEFAULT_DURATION: float = 15 * 60
+# Weight of the last measurement in the expected duration
+DURATION_SMOOTHING: float = 0.5
+
+scheduler_logger: logging.Logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TestRequirements:
+    """
+    Declared requirements of a validator
+    """
+    # Engine version installed, None for the version under validation
+    version: str | None = None
+    # COE the validator is limited to, None for any
+    coe: str | None = None
+    peripherals: tuple[str, ...] = ()
+    # Reboots the device (or the engine host), so it runs alone
+    reboots: bool = False
+    # Leaves the engine unusable for other validators, which then need a new one
+    destroys_state: bool = True
+    # Disrupts the whole device for other reasons than a reboot
+    exclusive: bool = False
+
+    @property
+    def engine(self) -> tuple:
+        """
+        :return: Engine configuration the validator runs on
+        """
+        return self.version, self.peripherals
+
+    @property
+    def runs_alone(self) -> bool:
+        return self.reboots or self.exclusive
+
+
+class DurationHistory:
+    """
+    Expected duration of the validators of a target, smoothed over its previous runs
+    and stored in the runner cache
+    """
+
+    def __init__(self, path: Path, smoothing: float = DURATION_SMOOTHING):
+        """
+        :param path: History file of the target
+        :param smoothing: Weight (0 to 1) of the last measurement
+        """
+        self.path: Path = path
+        self.smoothing: float = smoothing
+        self._durations: dict[str, float] = {}
+        self._lock: threading.Lock = threading.Lock()
+        try:
+            self._durations = json.loads(path.read_text())
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as ex:
+            scheduler_logger.warning(f'Unable to read the durations history {path}: {ex}')
+
+    def expected(self, name: str) -> float:
+        """
+        :return: Expected seconds of the validator
+        """
+        with self._lock:
+            return self._durations.get(name, DEFAULT_DURATION)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            previous: float | None = self._durations.get(name)
+            self._durations[name] = seconds if previous is None else \
+                self.smoothing * seconds + (1 - self.smoothing) * previous
+        # Measured out of the scope of the test, which would hand it to the tests
+        # running in other engine slots
+        metrics.record(f'scheduler.duration.{name}', seconds, scoped=False)
+
+    def save(self) -> None:
+        with self._lock:
+            content: str = json.dumps(self._durations, indent=4, sort_keys=True)
+        # Unique per process, several targets may be validated at once
+        tmp_path: Path = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(content)
+            tmp_path.replace(self.path)
+        except OSError as ex:
+            scheduler_logger.warning(f'Unable to save the durations history {self.path}: {ex}')
+
+
+@dataclass
+class Transitions:
+    """
+    Expensive transitions of a sequence of validators run one after the other
+    """
+    installs: int = 0
+    version_changes: int = 0
+    reboots: int = 0
+
+    def __str__(self) -> str:
+        return f'{self.installs} installs, {self.version_changes} version changes, {self.reboots} reboots'
+
+
+def transitions(order: list[str], requirements: dict[str, TestRequirements], shared_engine: bool) -> Transitions:
+    """
+    :param order: Validators, in running order
+    :param requirements: Requirements by validator
+    :param shared_engine: Whether validators not destroying the state share their engine
+    :return: The transitions of running the validators in that order
+    """
+    count: Transitions = Transitions()
+    kept: tuple | None = None
+    version: str | None = None
+    for position, name in enumerate(order):
+        r: TestRequirements = requirements[name]
+        if not (shared_engine and kept == r.engine):
+            count.installs += 1
+        if position and r.version != version:
+            count.version_changes += 1
+        kept = r.engine if shared_engine and not r.destroys_state and not r.reboots else None
+        version = r.version
+        count.reboots += r.reboots
+    return count
+
+
+@dataclass
+class Schedule:
+    """
+    Running plan of the validators of a target
+    """
+    # Run concurrently, each one with its own engine, in this order
+    concurrent: list[str] = field(default_factory=list)
+    # Run one after the other, once the concurrent ones finished
+    sequential: list[str] = field(default_factory=list)
+    # Not applicable to the target
+    skipped: list[str] = field(default_factory=list)
+    # Expected seconds of the concurrent and sequential validators
+    expected: float = 0
+
+
+def _sequence(names: list[str], requirements: dict[str, TestRequirements], history: DurationHistory) -> list[str]:
+    """
+    Groups the validators by engine configuration, the version under validation first
+    and then the longest groups. Within a group, the validators sharing their engine run
+    one after the other, and the longest first
+    """
+    groups: dict[tuple, list[str]] = {}
+    for name in names:
+        groups.setdefault(requirements[name].engine, []).append(name)
+
+    def longest_first(group: list[str]) -> list[str]:
+        return sorted(group, key=history.expected, reverse=True)
+
+    order: list[str] = []
+    for engine in sorted(groups, key=lambda e: (e[0] is not None, -sum(map(history.expected, groups[e])))):
+        group: list[str] = groups[engine]
+        order.extend(longest_first([n for n in group if not requirements[n].destroys_state]))
+        order.extend(longest_first([n for n in group if requirements[n].destroys_state]))
+    return order
+
+
+def schedule(requirements: dict[str, TestRequirements], history: DurationHistory, coe: str,
+             max_engines: int = 1, shared_engine: bool = False) -> Schedule:
+    """
+    :param requirements: Requirements of the validators to run, in declaration order
+    :param history: Expected durations of the validators in the target
+    :param coe: COE of the target
+    :param max_engines: Engines the target runs at once
+    :param shared_engine: Whether validators not destroying the state share their engine
+    :return: The running plan
+    """
+    plan: Schedule = Schedule()
+    names: list[str] = []
+    for name, r in requirements.items():
+        if r.coe is not None and r.coe != coe:
+            plan.skipped.append(name)
+        else:
+            names.append(name)
+
+    alone: list[str] = [n for n in names if requirements[n].runs_alone]
+    others: list[str] = [n for n in names if not requirements[n].runs_alone]
+    # Reboots last, so no other validator depends on the state they leave
+    alone = _sequence([n for n in alone if not requirements[n].reboots], requirements, history) + \
+        _sequence([n for n in alone if requirements[n].reboots], requirements, history)
+
+    if max_engines > 1:
+        # Longest first, so the shortest fill the engine slots at the end of the run
+        plan.concurrent = sorted(others, key=history.expected, reverse=True)
+        plan.sequential = alone
+    else:
+        plan.sequential = _sequence(others, requirements, history) + alone
+    plan.expected = sum(map(history.expected, plan.concurrent + plan.sequential))
+
+    planned: Transitions = transitions(plan.sequential, requirements, shared_engine)
+    declared: Transitions = transitions([n for n in names if n in plan.sequential], requirements, shared_engine)
+    scheduler_logger.info(f'Scheduled {len(plan.concurrent)} concurrent and {len(plan.sequential)} sequential '
+                          f'validators, expected {plan.expected:.0f}s. Sequential transitions: {planned} '
+                          f'(declaration order: {declared})')
+    metrics.increment('scheduler.installs', planned.installs, scoped=False)
+    metrics.increment('scheduler.reboots', planned.reboots, scoped=False)
+    return plan
@@ -0,0 +1,95 @@
+"""
+Commissioned engines shared by the non-destructive tests of a run. Instead of being
+purged and decommissioned, the engine of a passing test is kept for the next test with
+the same engine configuration, which skips the installation and commissioning.
+
+A kept engine is used by one test at a time. Tests check its health before using it and
+fall back to a fresh installation if it is not healthy. Kept engines are disposed of
+when a test installs a new engine in the same project, which would purge them, and at
+the end of the run.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+from validation_framework.common.metrics import metrics
+from validation_framework.common.nuvla_uuid import NuvlaUUID
+from validation_framework.deployer.engine_handler import EngineHandler
+
+
+@dataclass
+class SharedEngine:
+    """
+    Commissioned engine kept between tests
+    """
+    engine_handler: EngineHandler
+    uuid: NuvlaUUID
+    project_name: str
+    # Stops the engine and removes its NuvlaEdge from Nuvla
+    dispose: Callable[[], None]
+    # Tests run on the engine
+    tests: int = 1
+
+
+class SharedEngines:
+    """
+    Thread safe registry of the kept engines, by engine configuration
+    """
+
+    def __init__(self):
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        # Enabled from the command line (--shared_engine)
+        self.enabled: bool = False
+        self._engines: dict[tuple, SharedEngine] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def acquire(self, key: tuple) -> SharedEngine | None:
+        """
+        :param key: Engine configuration
+        :return: The kept engine of the configuration, removed from the registry until
+        released. None if there is none
+        """
+        with self._lock:
+            engine: SharedEngine | None = self._engines.pop(key, None)
+        metrics.increment('shared_engine.hits' if engine else 'shared_engine.misses')
+        return engine
+
+    def release(self, key: tuple, engine: SharedEngine) -> None:
+        """
+        Keeps the engine for the next test with the same configuration. An engine already
+        kept for the configuration is disposed of
+        """
+        with self._lock:
+            previous: SharedEngine | None = self._engines.get(key)
+            self._engines[key] = engine
+        if previous is not None and previous is not engine:
+            self.dispose(previous)
+        self.logger.info(f'Keeping engine {engine.uuid} ({engine.project_name}) after {engine.tests} tests')
+
+    def close(self, project_name: str | None = None) -> None:
+        """
+        Disposes of the kept engines
+        :param project_name: Only the engines of the project, all of them if None
+        """
+        with self._lock:
+            keys: list[tuple] = [k for k, e in self._engines.items()
+                                 if project_name is None or e.project_name == project_name]
+            engines: list[SharedEngine] = [self._engines.pop(k) for k in keys]
+        for engine in engines:
+            self.dispose(engine)
+
+    def dispose(self, engine: SharedEngine) -> None:
+        """
+        Stops the engine and removes its NuvlaEdge, logging any failure
+        """
+        self.logger.info(f'Disposing of shared engine {engine.uuid} ({engine.project_name}) '
+                         f'after {engine.tests} tests')
+        metrics.record('shared_engine.tests', engine.tests)
+        try:
+            engine.dispose()
+        except Exception as ex:
+            self.logger.error(f'Unable to dispose of engine {engine.uuid}: {ex}')
+
+
+shared_engines: SharedEngines = SharedEngines()
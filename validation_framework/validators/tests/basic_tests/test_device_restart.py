@@ -6,6 +6,7 @@ import time
 import invoke
 from fabric import Result
 
+from validation_framework.common.polling import PollResult, poll_until
 from validation_framework.validators import ValidationBase
 from validation_framework.validators.tests.basic_tests import validator
 
@@ -15,6 +16,7 @@ class TestDeviceRestart(ValidationBase):
     """
 
     """
+    REBOOTS: bool = True
     operational_time: float = 60*3  # Give 3 minutes for the device to restart and come back up
     STATE_LIST: list[str] = ['NEW', 'ACTIVATED', 'COMMISSIONED', 'DECOMMISSIONED']
 
@@ -49,17 +51,14 @@ class TestDeviceRestart(ValidationBase):
         time_to_sleep = 100 if coe_type == 'docker' else 200
         time_to_wait_for_reboot = 180 if coe_type == 'docker' else 400
 
-        # Give some time for the reboot to execute
-        time.sleep(time_to_sleep)
+        # The device is probed from the start, with a slowly growing interval, so a fast
+        # reboot is detected early. Probes fail while the device is down
+        later_up_time: PollResult[float] = poll_until(
+            self.get_system_up_time, lambda up_time: 0 < up_time < initial_up_time,
+            time_to_sleep + time_to_wait_for_reboot, 'target.reboot.wait', interval=5, max_interval=20,
+            errors=(Exception,))
+        if not later_up_time:
+            self.logger.error(f"Device didn't reboot in {(time_to_sleep + time_to_wait_for_reboot)/60}")
 
-        later_up_time: float = self.get_system_up_time()
-        start_time: float = time.time()
-        while later_up_time > initial_up_time:
-            later_up_time = self.get_system_up_time()
-            if time.time() - start_time > time_to_wait_for_reboot:
-                self.logger.error(f"Device didn't reboot in {time_to_wait_for_reboot/60}")
-                break
-            time.sleep(1)
-
-        self.assertTrue(later_up_time < time_to_wait_for_reboot)
+        self.assertTrue(later_up_time and later_up_time.value < time_to_wait_for_reboot)
 
@@ -23,6 +23,7 @@ For this test, the NuvlaEdge engine is started after asserting the initial state
 import time
 
 from validation_framework.validators import ValidationBase
+from validation_framework.validators.nuvla_state_watcher import NuvlaEdgeState, nuvla_state_watcher
 from validation_framework.validators.tests.basic_tests import validator
 
 
@@ -46,13 +47,16 @@ class TestStandardEngineRun(ValidationBase):
         start_time: float = time.time()
         self.logger.info(f'Starting longer run of  {self.TEST_RUN_TIME}s')
         try:
-            while self.TEST_RUN_TIME > (time.time() - start_time):
-                last_update = self.get_nuvlaedge_status()
-
-                self.assertTrue(last_update[0] in [self.STATE_LIST[1], self.STATE_LIST[2]],
-                                'Run State must be Commissioned')
-
-                time.sleep(5)
+            # The state is read from the shared watcher instead of polling Nuvla here
+            with nuvla_state_watcher.tracking(self.uuid):
+                while self.TEST_RUN_TIME > (time.time() - start_time):
+                    time.sleep(5)
+                    last_update: NuvlaEdgeState | None = nuvla_state_watcher.last_state(self.uuid)
+                    if last_update is None:
+                        continue
+
+                    self.assertTrue(last_update.state in [self.STATE_LIST[1], self.STATE_LIST[2]],
+                                    'Run State must be Commissioned')
 
         except Exception as ex:
             # Capture all the exception so the teardown is always executed and cleans Nuvla and the device
@@ -5,7 +5,9 @@ import time
 
 from nuvla.api.resources import Deployment
 
+from validation_framework.common.polling import PollResult, poll_until
 from validation_framework.validators import ValidationBase
+from validation_framework.validators.validation_base import NUVLA_ERRORS
 from validation_framework.validators.tests.nuvla_operations import validator
 from validation_framework.common.constants import DEFAULT_DEPLOYMENTS_TIMEOUT
 from nuvla.api.models import CimiResource, CimiCollection
@@ -15,6 +17,7 @@ from nuvla.api.models import CimiResource, CimiCollection
 class TestBasicAppDeployment(ValidationBase):
     APP_NAME: str = 'Nginx App in Kubernetes'
     MODULE_ID: str = 'module/95e17c68-11e5-482e-b887-b34b1a322e7d'
+    SINGLE_SETUP_FLAG: bool = True
 
     STATE_PENDING: str = 'PENDING'
     STATE_STARTED: str = 'STARTED'
@@ -28,17 +31,18 @@ class TestBasicAppDeployment(ValidationBase):
         :return: App data structure
         """
 
+    def _deployment_state(self, deployment_id) -> str:
+        return self.nuvla_client.get(deployment_id, select=['state']).data.get('state')
+
     def wait_for_deployment_start(self, deployment_id):
-        state: str = self.nuvla_client.get(deployment_id).data.get('state')
         self.logger.info(f'Waiting for deployment {deployment_id} to start')
-        start_time: float = time.time()
-        while state != self.STATE_STARTED:
-            time.sleep(1)
-            state = self.nuvla_client.get(deployment_id).data.get('state')
-
-            if time.time() > start_time + DEFAULT_DEPLOYMENTS_TIMEOUT or state == self.STATE_ERROR:
-                self.logger.error(f'Deployment {deployment_id} did not start in time. State {state}')
-                self.assertTrue(False, f'Deployment {deployment_id} did not start in time')
+        state: PollResult[str] = poll_until(lambda: self._deployment_state(deployment_id),
+                                            lambda s: s == self.STATE_STARTED, DEFAULT_DEPLOYMENTS_TIMEOUT,
+                                            'nuvla.deployment.wait',
+                                            terminal=lambda s: s == self.STATE_ERROR, errors=NUVLA_ERRORS)
+        if not state:
+            self.logger.error(f'Deployment {deployment_id} did not start in time. State {state.value}')
+            self.assertTrue(False, f'Deployment {deployment_id} did not start in time')
 
         self.logger.info('Deployment Started')
 
@@ -46,17 +50,11 @@ class TestBasicAppDeployment(ValidationBase):
         deployment_resource: Deployment = Deployment(self.nuvla_client)
         deployment_resource.stop(deployment_id)
 
-        state: str = self.nuvla_client.get(deployment_id).data.get('state')
-
         self.logger.info(f'Waiting for deployment {deployment_id} to stop')
-        start_time: float = time.time()
-        while state != self.STATE_STOPPED:
-            time.sleep(1)
-            state = self.nuvla_client.get(deployment_id).data.get('state')
-
-            if time.time() > start_time + DEFAULT_DEPLOYMENTS_TIMEOUT:
-                self.logger.error(f'Deployment {deployment_id} did not stop in time. Cannot remove remaining ')
-                return
+        if not poll_until(lambda: self._deployment_state(deployment_id), lambda s: s == self.STATE_STOPPED,
+                          DEFAULT_DEPLOYMENTS_TIMEOUT, 'nuvla.deployment.wait', errors=NUVLA_ERRORS):
+            self.logger.error(f'Deployment {deployment_id} did not stop in time. Cannot remove remaining ')
+            return
 
         self.logger.info(f'Trying to remove {deployment_id}')
         deployment_resource.delete(deployment_id)
@@ -68,10 +66,10 @@ class TestBasicAppDeployment(ValidationBase):
         :return:
         """
 
-        nuvlabox_res: CimiResource = self.nuvla_client.get(self.uuid)
+        nuvlabox_res: CimiResource = self.nuvla_cache.get(self.uuid, select=['infrastructure-service-group'])
         nuvlabox_data: dict = nuvlabox_res.data
         nuvlabox_isg_id: str = nuvlabox_data['infrastructure-service-group']
-        nuvlabox_isg: dict = self.nuvla_client.get(nuvlabox_isg_id).data
+        nuvlabox_isg: dict = self.nuvla_cache.get(nuvlabox_isg_id, select=['infrastructure-services']).data
         nuvlabox_is_id = nuvlabox_isg['infrastructure-services'][0]['href']
 
         # Find credential
@@ -6,6 +6,7 @@ from nuvla.api.models import CimiResource, CimiResponse
 
 from validation_framework.validators.tests.nuvla_operations import validator
 from validation_framework.common.constants import DEFAULT_JOBS_TIMEOUT
+from validation_framework.common.polling import poll_until
 from validation_framework.validators import ValidationBase
 
 EKINOPS_DEVICES_ALIASES = ['one_2560']
@@ -14,6 +15,7 @@ EKINOPS_DEVICES_ALIASES = ['one_2560']
 @validator('SSHKeysManagement')
 class TestSSHKeyManagement(ValidationBase):
     VALIDATION_SSH_ID: str = "credential/41f3180e-dcee-434a-a3f8-88e7520245f8"
+    SINGLE_SETUP_FLAG: bool = True
 
     def _is_skip(self) -> bool:
         return self.engine_handler.device_config.alias in EKINOPS_DEVICES_ALIASES
@@ -24,7 +26,7 @@ class TestSSHKeyManagement(ValidationBase):
 
         returns: true if successfully added (From Nuvla Job perspective). False otherwise
         """
-        nuvlabox: CimiResource = self.nuvla_client.get(self.uuid)
+        nuvlabox: CimiResource = self.nuvla_cache.get(self.uuid, select=['name'])
         self.logger.debug(f"Running {operation} operation into {nuvlabox.data.get('name')}")
 
         payload = {
@@ -39,16 +41,8 @@ class TestSSHKeyManagement(ValidationBase):
                               f"status 202")
             return False
         job_id: str = res.data.get('location')
-        job_resource: CimiResource = self.nuvla_client.get(job_id)
-        start_time: float = time.time()
-        self.logger.info(f'Waiting {DEFAULT_JOBS_TIMEOUT} seconds for job {job_id} to reach SUCCESS state')
-        while job_resource.data.get('state') != "SUCCESS":
-            time.sleep(3)
-            if time.time() - start_time > DEFAULT_JOBS_TIMEOUT:
-                self.logger.error("Job not completed in time")
-                return False
-
-            job_resource = self.nuvla_client.get(job_id)
+        if self.wait_job(job_id, DEFAULT_JOBS_TIMEOUT) != 'SUCCESS':
+            return False
         self.logger.info(f'Job successfully ran in Nuvla')
         return True
 
@@ -62,13 +56,13 @@ class TestSSHKeyManagement(ValidationBase):
         ssh_key: str = ('ssh-rsa AAAAB3NzaC1yc2EAAAADAQABAAABgQC+OUPEq3qiLPye+oMQkGaTsEMgDbX/0oWGZQ359wWhVZRDCkdQMbkrPZWKAaVSOfJZZeGgmDGmuibuQy3fv0j8sOF4XgwkL6hldmOD1HclCqCe6jQClOhuz8r7xOH0i/DOxu9Iv425h20EygKQiqkQ8bgNLdDn67XSTn'
                         '9kr6oXITWmM0yWdhjPXPO4IyfhNQa7+hu1nj1HJ5mcVqzWlr57cbJdyHZroXXUQZ+yctgax+sLsYHlea5yzrtfwuota+o6bOiDk9Mbbd2729nXNMSxjpabPgz3+POXWwegkJNl4BZSdq4GUPFiYeo7Mz7M4H3r8l1gdHvjXaS2/gx3Or8UgJ3qCxW4ehjIJFC/LAhsqAvoUa'
                         'xAQ2BXp8lY42pCT3vOXnPVLyPEl6QBunUfC//PaROc+P+Nmra2o6DM4itv25er7J1WhifhhiMju6gqRR2iQO31PddAuTZhULcJibSgSYPCXcBB/z3jQ63DHaFaMKlCnSAJeh+ePNcv2MNY51s= random@sixsq')
-        command = self.engine_handler.coe.get_authorized_keys()
-        msg = 'command "{command.command}": \nstderr: {command.stderr} \nstdout: {command.stdout}'
-        if command.failed:
-            self.logger.error(f'Failed to run {msg}')
+        try:
+            authorized_keys: str = self.engine_handler.coe.get_authorized_keys()
+        except Exception as ex:
+            self.logger.error(f'Failed to gather authorized keys: {ex}')
             return False
-        self.logger.debug(f'Return of {msg}')
-        return ssh_key in command.stdout
+        self.logger.debug(f'Authorized keys: \n{authorized_keys}')
+        return ssh_key in authorized_keys
 
     def test_ssh_key_management(self):
         self.logger.info("Starting SSH key management validation tests")
@@ -85,18 +79,15 @@ class TestSSHKeyManagement(ValidationBase):
         deploy_ssh_result: bool = self.manipulate_ssh_key()
         self.assertTrue(deploy_ssh_result, "SSH not properly added from Nuvla "
                                            "perspective")
-        time.sleep(10)
-
-        self.assertTrue(self.is_ssh_key_present(),
+        self.assertTrue(poll_until(self.is_ssh_key_present, timeout=20, name='ssh.keys.wait', interval=2),
                         "Key not present in authorized keys ssh file")
 
         time.sleep(10)
         remove_ssh_result: bool = self.manipulate_ssh_key(operation='revoke-ssh-key')
         self.assertTrue(remove_ssh_result, "SSH not properly removed from Nuvla "
                                            "perspective")
-        time.sleep(20)
-
-        self.assertFalse(self.is_ssh_key_present(),
-                         "Key should be present in authorized keys ssh file")
+        self.assertTrue(poll_until(lambda: not self.is_ssh_key_present(), timeout=30, name='ssh.keys.wait',
+                                   interval=2),
+                        "Key should not be present in authorized keys ssh file")
 
 
@@ -15,11 +15,15 @@ from packaging.version import Version
 from pydantic import BaseModel, ConfigDict
 
 from validation_framework.common.constants import DEFAULT_JOBS_TIMEOUT
+from validation_framework.common.polling import PollResult, poll_until
+from validation_framework.common.nuvla_session import nuvla_sessions
 from validation_framework.common.nuvla_uuid import NuvlaUUID
 from validation_framework.deployer.engine_handler import EngineHandler
 from validation_framework.common import constants as cte, constants
 from validation_framework.validators.tests.nuvla_operations import validator
 from validation_framework.validators import ValidationBase
+from validation_framework.validators.validation_base import NUVLA_ERRORS
+from validation_framework.validators.nuvla_state_watcher import nuvla_state_watcher
 
 """
 Test engine update
@@ -41,6 +45,8 @@ class FutureResult:
 
 @validator('UpdateNuvlaEdge')
 class UpdateNuvlaEdge(ValidationBase):
+    # Installs the previous releases, updated to the version under validation
+    ENGINE_VERSION: str | None = 'releases'
     release_id: str
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -87,7 +93,7 @@ class UpdateNuvlaEdge(ValidationBase):
         assert type(update_payload) == dict
 
         self.logger.info(f"Updating with payload {json.dumps(update_payload, indent=4)}")
-        nuvlabox: CimiResource = self.nuvla_client.get(uuid)
+        nuvlabox: CimiResource = self.nuvla_cache.get(uuid, select=['name'])
         resp: CimiResponse = self.nuvla_client.operation(nuvlabox, 'update-nuvlabox', data=update_payload)
 
         self.logger.info(f"Update operation started:\n{json.dumps(resp.data, indent=4)}")
@@ -100,24 +106,22 @@ class UpdateNuvlaEdge(ValidationBase):
 
         self.assertTrue(online.count(True) > 0.8 * len(online), "NuvlaEdge was not online most of the time, something went wrong")
 
-        status_id = self.nuvla_client.get(uuid).data['nuvlabox-status']
-        final_version = self.nuvla_client.get(status_id, select=["nuvlabox-engine-version"]).data['nuvlabox-engine-version']
+        status_id = self.nuvla_cache.get(uuid, select=['nuvlabox-status']).data['nuvlabox-status']
+        final_version = self.nuvla_cache.get(status_id, select=["nuvlabox-engine-version"],
+                                             fresh=True).data['nuvlabox-engine-version']
         self.assertEqual(final_version, target, f"Final version is not the expected one {target}")
 
         # Here to allow tear down of ValidationBase to run without issues
         self.uuid = NuvlaUUID(uuid)
         self.engine_handler = engine
 
-    def gather_nuvla_version(self, timeout: int, uuid: str) -> list[str]:
-        status_id = self.nuvla_client.get(uuid).data['nuvlabox-status']
-        start_time: float = time.time()
-
-        while time.time() - start_time < timeout:
-            status = self.nuvla_client.get(status_id, select=["nuvlabox-engine-version"])
-            if status.data['status'] == 'UNKNOWN':
-                time.sleep(3)
-            else:
-                return status.data['status']
+    def gather_nuvla_version(self, timeout: int, uuid: str) -> str:
+        status_id = self.nuvla_cache.get(uuid, select=['nuvlabox-status']).data['nuvlabox-status']
+        version: PollResult[str] = poll_until(
+            lambda: self.nuvla_cache.get(status_id, select=["nuvlabox-engine-version"], fresh=True).data.get(
+                'nuvlabox-engine-version', 'UNKNOWN'),
+            lambda v: v != 'UNKNOWN', timeout, 'nuvla.version.wait', interval=3, errors=NUVLA_ERRORS)
+        return version.value
 
     def gather_online_data(self, timeout: int, uuid: str) -> list[bool]:
         online: list[bool] = []
@@ -133,18 +137,7 @@ class UpdateNuvlaEdge(ValidationBase):
 
 
     def wait_job_success(self, job_id: str) -> str:
-        start_time: float = time.time()
-        self.logger.info(f'Waiting {DEFAULT_JOBS_TIMEOUT} seconds for job {job_id} to reach SUCCESS state')
-        job_state = "UNKNOWN"
-        while job_state != "SUCCESS":
-            if time.time() - start_time > DEFAULT_JOBS_TIMEOUT:
-                self.logger.error("Job not completed in time")
-                return job_state
-
-            time.sleep(3)
-            job_state = self.nuvla_client.get(job_id, select=["state"]).data.get("state", "UNKNOWN")
-
-        return job_state
+        return self.wait_job(job_id, DEFAULT_JOBS_TIMEOUT)
 
     @staticmethod
     def _get_installation_parameters(params: dict) -> dict:
@@ -206,6 +199,7 @@ class UpdateNuvlaEdge(ValidationBase):
         self.engines[origin_version] = EngineHandler(
             cte.DEVICE_CONFIG_PATH / self.target_config_file,
             nuvlaedge_version=origin_version,
+            project_name=self.project_name,
         )
 
         self.uuids[origin_version] = self.create_nuvlaedge_in_nuvla(
@@ -214,8 +208,8 @@ class UpdateNuvlaEdge(ValidationBase):
     def setUp(self) -> None:
         self.logger: logging.Logger = logging.getLogger(__name__)
 
-        self.nuvla_client: NuvlaClient = NuvlaClient(reauthenticate=True)
-        self.nuvla_client.login_apikey(self.nuvla_api_key, self.nuvla_api_secret)
+        self.nuvla_client: NuvlaClient = nuvla_sessions.client(self.nuvla_api_key, self.nuvla_api_secret)
+        nuvla_state_watcher.attach(self.nuvla_client)
 
     def tearDown(self) -> None:
         if not self.is_skip:
@@ -6,14 +6,26 @@ import logging
 import time
 import unittest
 from logging import exception
+from pathlib import Path
 
 import requests
-from nuvla.api import Api as NuvlaClient
+from nuvla.api import Api as NuvlaClient, NuvlaError
 from nuvla.api.models import CimiResponse, CimiCollection, CimiResource
 
 from validation_framework.common import constants as cte
+from validation_framework.common.metrics import metrics, save_metrics
+from validation_framework.common.polling import PollResult, poll_until
+from validation_framework.common.nuvla_cache import NuvlaResourceCache, resource_cache
+from validation_framework.common.nuvla_session import nuvla_sessions
 from validation_framework.common.nuvla_uuid import NuvlaUUID
 from validation_framework.deployer.engine_handler import EngineHandler
+from validation_framework.validators.nuvla_state_watcher import (NuvlaEdgeState, nuvla_state_watcher, state_is,
+                                                                 status_is, has_capabilities)
+from validation_framework.validators.scheduler import TestRequirements
+from validation_framework.validators.shared_engine import SharedEngine, shared_engines
+
+# Nuvla failures handled as failed attempts when polling
+NUVLA_ERRORS: tuple = (NuvlaError, requests.RequestException)
 
 # Dynamically add methods to UpdateNuvlaEdge
 def create_update_method(release, target_branch):
@@ -31,7 +43,8 @@ class ParametrizedTests(unittest.TestCase):
                  nuvlaedge_version: str = '',
                  deployment_branch: str = '',
                  nuvlaedge_branch: str = '',
-                 retrieve_logs: bool = False):
+                 retrieve_logs: bool = False,
+                 project_name: str = cte.PROJECT_NAME):
 
         super().__init__(test_name)
 
@@ -43,6 +56,8 @@ class ParametrizedTests(unittest.TestCase):
         self.target_nuvlaedge_branch: str = nuvlaedge_branch
         self.target_deployment_branch: str = deployment_branch
         self.retrieve_logs: bool = retrieve_logs
+        # Compose project (or Helm release scope) of the engines of the test
+        self.project_name: str = project_name
 
     @staticmethod
     def parametrize(testcase_class,
@@ -52,7 +67,8 @@ class ParametrizedTests(unittest.TestCase):
                     nuvlaedge_version: str = '',
                     deployment_branch: str = '',
                     nuvlaedge_branch: str = '',
-                    retrieve_logs: bool = False):
+                    retrieve_logs: bool = False,
+                    project_name: str = cte.PROJECT_NAME):
         """
          Create a suite containing all tests taken from the given
         subclass, passing them the parameters.
@@ -66,6 +82,8 @@ class ParametrizedTests(unittest.TestCase):
             deployment_branch:
             nuvlaedge_branch:
             retrieve_logs:
+            project_name: Project of the engines of the tests, unique among the tests
+                running concurrently in the same device
 
         Returns:
             A test suite
@@ -93,7 +111,8 @@ class ParametrizedTests(unittest.TestCase):
                                          nuvlaedge_version,
                                          deployment_branch,
                                          nuvlaedge_branch,
-                                         retrieve_logs))
+                                         retrieve_logs,
+                                         project_name=project_name))
         return suite
 
 
@@ -103,6 +122,47 @@ class ValidationBase(ParametrizedTests):
     uuid: NuvlaUUID = ''
     STATE_HIST: list[str] = []
     STATE_LIST: list[str] = ['NEW', 'ACTIVATED', 'COMMISSIONED', 'DECOMMISSIONED']
+    JOB_FAILED_STATES: list[str] = ['FAILED', 'CANCELED', 'STOPPED']
+    # Tests disrupting the whole device never share it with other engines
+    EXCLUSIVE: bool = False
+    # Tests rebooting the device (or the engine host), run alone and last
+    REBOOTS: bool = False
+    # Engine version installed by the test, None for the version under validation
+    ENGINE_VERSION: str | None = None
+    # COE the test is limited to, None for any
+    COE: str | None = None
+    # Non-destructive tests, run on the engine kept by a previous passing test with the
+    # same engine configuration if enabled (--shared_engine)
+    SINGLE_SETUP_FLAG: bool = False
+    # Peripheral managers installed along with the engine
+    PERIPHERALS: list[str] = []
+    # Kept engine the test runs on, if any
+    shared_engine: SharedEngine | None = None
+    # Whether the engine of the test runs commissioned, so it can be kept
+    commissioned: bool = False
+
+    @classmethod
+    def requirements(cls) -> TestRequirements:
+        """
+        :return: Requirements of the test, used to schedule it along with the others
+        """
+        return TestRequirements(version=cls.ENGINE_VERSION,
+                                coe=cls.COE,
+                                peripherals=tuple(cls.PERIPHERALS),
+                                reboots=cls.REBOOTS,
+                                destroys_state=not cls.SINGLE_SETUP_FLAG,
+                                exclusive=cls.EXCLUSIVE)
+
+    def run(self, result=None):
+        """
+        Gathers the framework metrics (connections, timings...) of the whole test,
+        including setUp and tearDown, and stores them next to the test results
+        """
+        metrics.start_scope(self.id())
+        try:
+            return super(ValidationBase, self).run(result)
+        finally:
+            save_metrics(metrics.end_scope(), cte.METRICS_RESULTS_PATH / self.results_folder / f'{self.id()}.json')
 
     def wait_for_commissioned(self, engine: EngineHandler = None, uuid: NuvlaUUID = None):
         """
@@ -115,100 +175,117 @@ class ValidationBase(ParametrizedTests):
         if not uuid:
             uuid = self.uuid
 
-        engine.start_engine(uuid, remove_old_installation=True)
-        try:
-            last_state: str = self.get_nuvlaedge_status(uuid=uuid)[0]
-        except IndexError:
-            last_state: str = 'UNKNOWN'
+        if self.shared_engine is not None and engine is self.shared_engine.engine_handler:
+            # Commissioned by a previous test, as checked by the health check
+            self.logger.info(f'Shared engine {uuid} already running')
+        else:
+            engine.start_engine(uuid, remove_old_installation=True)
 
-        self.logger.info('Waiting until device is commissioned')
-        while last_state != self.STATE_LIST[2]:
-            time.sleep(2)
-            last_state: str = self.get_nuvlaedge_status(uuid=uuid)[0]
+        edge: NuvlaEdgeState | None = nuvla_state_watcher.wait_for(
+            uuid, state_is(self.STATE_LIST[2]), cte.COMMISSIONING_TIMEOUT, f'is {self.STATE_LIST[2]}')
+        self.assertIsNotNone(edge, f'NuvlaEdge {uuid} not commissioned within {cte.COMMISSIONING_TIMEOUT}s')
+        self.STATE_HIST.append(edge.state)
+        if engine is self.engine_handler and uuid == self.uuid:
+            self.commissioned = True
 
     def wait_for_operational(self, uuid: NuvlaUUID = None):
         """
 
         :return:
         """
-        self.logger.info('Waiting for status device: OPERATIONAL')
-        last_status: str = self.get_nuvlaedge_status()[1]
-        while last_status != "OPERATIONAL":
-            time.sleep(2)
-            last_status: str = self.get_nuvlaedge_status()[1]
-        self.wait_for_capabilities(['NUVLA_JOB_PULL'])
+        if not uuid:
+            uuid = self.uuid
+
+        edge: NuvlaEdgeState | None = nuvla_state_watcher.wait_for(
+            uuid, status_is('OPERATIONAL'), cte.OPERATIONAL_TIMEOUT, 'status is OPERATIONAL')
+        self.assertIsNotNone(edge, f'NuvlaEdge {uuid} not OPERATIONAL within {cte.OPERATIONAL_TIMEOUT}s')
+        self.wait_for_capabilities(['NUVLA_JOB_PULL'], uuid=uuid)
 
     def get_system_up_time(self) -> float:
         return self.engine_handler.get_system_up_time_in_engine()
 
-    def wait_for_capabilities(self, capabilities: list):
+    def wait_for_capabilities(self, capabilities: list, uuid: NuvlaUUID = None):
         """
         :param capabilities: Capabilities to match against the NuvlaBox resource
+        :param uuid: NuvlaEdge id, the one of the test if not provided
         """
-        self.logger.info(f'Waiting for capabilities {capabilities} in NuvlaEdge {self.uuid}')
-        nuvlabox: CimiResponse = self.nuvla_client.get(self.uuid)
-        t_time = time.time()
-
         if not capabilities:
             return
+        if not uuid:
+            uuid = self.uuid
 
-        while time.time() < t_time + cte.DEFAULT_JOBS_TIMEOUT:
-            time.sleep(5)
-            res_capabilities = nuvlabox.data.get('capabilities')
-            if not res_capabilities:
-                self.logger.debug(f'No capabilities in NuvlaBox {self.uuid}')
-                continue
-            cap_flag = True
-            for i in capabilities:
-                if i not in res_capabilities:
-                    self.logger.debug(f'Capability {i} not in NuvlaBox {self.uuid}')
-                    cap_flag = False
+        edge: NuvlaEdgeState | None = nuvla_state_watcher.wait_for(
+            uuid, has_capabilities(capabilities), cte.DEFAULT_JOBS_TIMEOUT, f'has capabilities {capabilities}')
+        self.assertIsNotNone(edge, f'NuvlaEdge {uuid} does not have {capabilities} capabilities')
+        self.logger.info(f'NuvlaEdge {uuid} ready with capabilities: {capabilities}')
 
-            if cap_flag:
-                self.logger.info(f'NuvlaEdge {self.uuid} ready with capabilities: {capabilities}')
-                return
-        self.logger.info(f'NuvlaEdge {self.uuid} does not have {capabilities} capabilities')
-        self.assertTrue(False, f'NuvlaEdge {self.uuid} does not have {capabilities} capabilities')
 
+    @property
+    def results_folder(self) -> str:
+        # Results of each target are kept apart, several targets may run at once
+        return Path(self.target_config_file).stem
 
-    def get_field_from_resource(self, res_id: str, field: str) -> str | dict:
+    @property
+    def nuvla_cache(self) -> NuvlaResourceCache:
+        return resource_cache(self.nuvla_client)
+
+    def get_field_from_resource(self, res_id: str, field: str, fresh: bool = False) -> str | dict:
         """
         Retrieve a field from a resource
 
         :param res_id:  ID
         :param field: Field to retrieve
+        :param fresh: Bypass the resource cache
         :return: Field value
         """
         try:
-            return self.nuvla_client.get(res_id).data[field]
+            return self.nuvla_cache.get(res_id, select=[field], fresh=fresh).data[field]
         except Exception:
             self.logger.debug(f'Could not retrieve {field} from {res_id}')
             return 'UNKNOWN'
 
     def wait_update_ready(self, uuid: NuvlaUUID = None) -> tuple[str, dict | None]:
-        t_time = time.time()
-        status = 'UNKNOWN'
-        while time.time() < t_time + cte.DEFAULT_JOBS_TIMEOUT:
-            time.sleep(1)
-            status = self.get_field_from_resource(uuid, 'nuvlabox-status')
-            if status and status != 'UNKNOWN':
-                break
-
-        if not status or status == 'UNKNOWN':
+        start: float = time.monotonic()
+        status: PollResult[str] = poll_until(
+            lambda: self.get_field_from_resource(uuid, 'nuvlabox-status', fresh=True),
+            lambda s: s and s != 'UNKNOWN', cte.DEFAULT_JOBS_TIMEOUT, 'nuvla.status.wait')
+        if not status:
             self.logger.error(f'Could not retrieve status from {uuid}')
             return 'UNKNOWN', None
 
-        while time.time() < t_time + cte.DEFAULT_JOBS_TIMEOUT:
-            time.sleep(1)
-            version = self.get_field_from_resource(status, 'nuvlabox-engine-version')
-            params = self.get_field_from_resource(status, 'installation-parameters')
-            ready = (version and params) and (version != 'UNKNOWN' and params != 'UNKNOWN')
-            if not ready:
-                self.logger.debug(f'Version or params  not yet available in NuvlaBox status {status}')
-                continue
-            return version, params
+        def status_fields() -> tuple:
+            # Both fields in a single request
+            data: dict = self.nuvla_cache.get(status.value, select=['nuvlabox-engine-version',
+                                                                    'installation-parameters'], fresh=True).data
+            return data.get('nuvlabox-engine-version'), data.get('installation-parameters')
+
+        def ready(fields: tuple) -> bool:
+            return all(f and f != 'UNKNOWN' for f in fields)
+
+        # Both waits share the jobs timeout
+        fields: PollResult[tuple] = poll_until(
+            status_fields, ready, cte.DEFAULT_JOBS_TIMEOUT - (time.monotonic() - start), 'nuvla.status.wait',
+            errors=NUVLA_ERRORS)
+        if not fields:
+            self.logger.debug(f'Version or params not available in NuvlaBox status {status.value}')
+            return 'UNKNOWN', None
+        return fields.value
 
-        return 'UNKNOWN', None
+    def wait_job(self, job_id: str, timeout: float = cte.DEFAULT_JOBS_TIMEOUT) -> str:
+        """
+        Waits until the Nuvla job succeeds, fails or the timeout expires
+        :param job_id: Job resource id
+        :param timeout: Maximum seconds to wait
+        :return: Last state of the job, UNKNOWN if it could not be read
+        """
+        self.logger.info(f'Waiting {timeout} seconds for job {job_id} to reach SUCCESS state')
+        result: PollResult[str] = poll_until(
+            lambda: self.nuvla_client.get(job_id, select=['state']).data.get('state', 'UNKNOWN'),
+            lambda state: state == 'SUCCESS', timeout, 'nuvla.job.wait',
+            terminal=lambda state: state in self.JOB_FAILED_STATES, errors=NUVLA_ERRORS)
+        if not result:
+            self.logger.error(f'Job {job_id} did not succeed in time, last state {result.value}')
+        return result.value or 'UNKNOWN'
 
     def get_nuvlaedge_status(self, uuid: NuvlaUUID = None) -> tuple[str, str]:
         """
@@ -221,15 +298,10 @@ class ValidationBase(ParametrizedTests):
         if not uuid:
             uuid = self.uuid
 
-        response: CimiResource = self.nuvla_client.get(uuid, select=['state', 'nuvlabox-status'])
-        try:
-            status_resource: CimiResource = self.nuvla_client.get(response.data['nuvlabox-status'], select=['status'])
-            status = status_resource.data.get('status','UNKNOWN')
-        except:
-            status = 'UNKNOWN'
+        edge: NuvlaEdgeState = nuvla_state_watcher.poll([uuid]).get(uuid, NuvlaEdgeState(id=uuid))
 
-        self.STATE_HIST.append(response.data['state'])
-        return response.data['state'], status
+        self.STATE_HIST.append(edge.state)
+        return edge.state, edge.status
 
     def create_nuvlaedge_in_nuvla(self, name: str = '', suffix: str = '') -> NuvlaUUID:
         """
@@ -238,13 +310,15 @@ class ValidationBase(ParametrizedTests):
         """
         if self.uuid:
             return self.uuid
-        self.nuvla_client.login_apikey(self.nuvla_api_key, self.nuvla_api_secret)
 
         it_release: int = 2
 
         if not name:
             name = cte.NUVLAEDGE_NAME.format(device=self.target_config_file.replace(".toml", ""))
 
+        if self.project_name != cte.PROJECT_NAME:
+            name = f'{name} ({self.project_name})'
+
         if suffix:
             name = f'{name}-{suffix}'
 
@@ -260,37 +334,128 @@ class ValidationBase(ParametrizedTests):
 
         return NuvlaUUID(response.data.get('resource-id'))
 
-    def remove_nuvlaedge_from_nuvla(self) -> None:
+    def remove_nuvlaedge_from_nuvla(self, uuid: NuvlaUUID = None) -> None:
         """
 
+        :param uuid: NuvlaEdge id, the one of the test if not provided
         :return:
         """
-        ne_state: str = self.get_nuvlaedge_status()[0]
+        if not uuid:
+            uuid = self.uuid
+
+        ne_state: str = self.get_nuvlaedge_status(uuid)[0]
 
         if ne_state in ['COMMISSIONED', 'ACTIVATED']:
-            self.nuvla_client.get(self.uuid + "/decommission")
+            self.nuvla_client.get(uuid + "/decommission")
+            self.nuvla_cache.invalidate(uuid)
 
-        while ne_state not in ['DECOMMISSIONED', 'NEW']:
-            time.sleep(1)
-            ne_state = self.get_nuvlaedge_status()[0]
+        nuvla_state_watcher.wait_for(uuid, lambda edge: edge.state in ['DECOMMISSIONED', 'NEW'],
+                                     cte.DEFAULT_JOBS_TIMEOUT, 'is decommissioned')
         self.logger.info('Decommissioning...')
-        self.nuvla_client.delete(self.uuid)
+        self.nuvla_client.delete(uuid)
+        self.nuvla_cache.invalidate(uuid)
 
-    def setUp(self) -> None:
-        super(ValidationBase, self).setUp()
-        self.logger: logging.Logger = logging.getLogger(__name__)
+    def dispose_engine(self, engine: EngineHandler, uuid: NuvlaUUID, retrieve_logs: bool = False,
+                       logs_path: Path = None) -> None:
+        """
+        Purges the engine from the device and removes its NuvlaEdge from Nuvla
+        """
+        engine.stop_engine(retrieve_logs=retrieve_logs, uuid=uuid, logs_path=logs_path)
+        self.remove_nuvlaedge_from_nuvla(uuid)
+
+    # ------------------------------------------------------------------------
+    # Shared engines
+    # ------------------------------------------------------------------------
+    @property
+    def shares_engine(self) -> bool:
+        return self.SINGLE_SETUP_FLAG and shared_engines.enabled
 
-        self.nuvla_client: NuvlaClient = NuvlaClient(reauthenticate=True)
+    def engine_key(self) -> tuple:
+        """
+        :return: Configuration of the engine of the test. Tests with the same one can
+        share their engine
+        """
+        return (self.target_config_file, self.project_name, self.nuvlaedge_version, self.target_nuvlaedge_branch,
+                self.target_deployment_branch, tuple(self.PERIPHERALS))
+
+    def engine_healthy(self, engine: EngineHandler, uuid: NuvlaUUID) -> bool:
+        """
+        :return: Whether the engine runs in the device and its NuvlaEdge is commissioned,
+        operational and pulling jobs
+        """
+        if not engine.coe.engine_running():
+            self.logger.warning(f'Engine of {uuid} not running in the device')
+            return False
 
+        def healthy(edge: NuvlaEdgeState) -> bool:
+            return (state_is(self.STATE_LIST[2])(edge) and status_is('OPERATIONAL')(edge)
+                    and has_capabilities(['NUVLA_JOB_PULL'])(edge))
+
+        return nuvla_state_watcher.wait_for(uuid, healthy, cte.SHARED_ENGINE_HEALTH_TIMEOUT,
+                                            'is healthy') is not None
+
+    def acquire_shared_engine(self) -> SharedEngine | None:
+        """
+        :return: The engine kept for the configuration of the test if healthy. Unhealthy
+        engines are disposed of
+        """
+        if not self.shares_engine:
+            return None
+        engine: SharedEngine | None = shared_engines.acquire(self.engine_key())
+        if engine is None:
+            return None
+        if self.engine_healthy(engine.engine_handler, engine.uuid):
+            return engine
+
+        self.logger.warning(f'Shared engine {engine.uuid} not healthy, installing a new one')
+        metrics.increment('shared_engine.unhealthy')
+        shared_engines.dispose(engine)
+        return None
+
+    def release_shared_engine(self) -> None:
+        """
+        Keeps the engine of the test for the next tests with the same configuration
+        """
+        engine, uuid = self.engine_handler, self.uuid
+        shared_engines.release(self.engine_key(), SharedEngine(
+            engine_handler=engine,
+            uuid=uuid,
+            project_name=self.project_name,
+            dispose=lambda: self.dispose_engine(engine, uuid),
+            tests=self.shared_engine.tests + 1 if self.shared_engine is not None else 1))
+
+    def create_engine_handler(self) -> EngineHandler:
         self.logger.info(f'Creating engine handler on deployment version: '
                          f'{self.nuvlaedge_version}')
-        self.engine_handler: EngineHandler = EngineHandler(
+        return EngineHandler(
             cte.DEVICE_CONFIG_PATH / self.target_config_file,
             nuvlaedge_version=self.nuvlaedge_version,
             nuvlaedge_branch=self.target_nuvlaedge_branch,
-            deployment_branch=self.target_deployment_branch)
+            deployment_branch=self.target_deployment_branch,
+            include_peripherals=bool(self.PERIPHERALS),
+            peripherals=self.PERIPHERALS,
+            project_name=self.project_name)
 
-        self.uuid: NuvlaUUID = self.create_nuvlaedge_in_nuvla()
+    def setUp(self) -> None:
+        super(ValidationBase, self).setUp()
+        self.logger: logging.Logger = logging.getLogger(__name__)
+
+        self.nuvla_client: NuvlaClient = nuvla_sessions.client(self.nuvla_api_key, self.nuvla_api_secret)
+        nuvla_state_watcher.attach(self.nuvla_client)
+
+        self.shared_engine = self.acquire_shared_engine()
+        # A kept engine passed its health check
+        self.commissioned = self.shared_engine is not None
+        if self.shared_engine is not None:
+            self.engine_handler: EngineHandler = self.shared_engine.engine_handler
+            self.uuid: NuvlaUUID = self.shared_engine.uuid
+            self.logger.info(f'Running on shared engine {self.uuid}, used by {self.shared_engine.tests} tests')
+            return
+
+        # Installing a new engine purges the ones kept in the same project
+        shared_engines.close(self.project_name)
+        self.engine_handler = self.create_engine_handler()
+        self.uuid = self.create_nuvlaedge_in_nuvla()
 
         self.logger.info(f'Target device: {self.engine_handler.device_config.hostname}')
 
@@ -298,23 +463,30 @@ class ValidationBase(ParametrizedTests):
         super(ValidationBase, self).tearDown()
         self.logger.info('ValidationBase tear down, stopping and cleaning engine')
 
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        # Compared by id, the XML runner results hold test infos instead of the tests
+        ok: bool = all(test.id() != self.id() for test, text in result.errors + result.failures)
+
         # Retrieve NuvlaEdge logs if UnitTest fail. If retrieve logs is selected as an
         # input, ignore whether tests fail and always download logs
-        if not self.retrieve_logs:
-            if hasattr(self._outcome, 'errors'):
-                # Python 3.4 - 3.10  (These two methods have no side effects)
-                result = self.defaultTestResult()
-                self._feedErrorsToResult(result, self._outcome.errors)
-            else:
-                # Python 3.11+
-                result = self._outcome.result
-            ok = all(test != self for test, text in result.errors + result.failures)
-
+        if not self.retrieve_logs and not ok:
             # Demo output:  (print short info immediately - not important)
-            if not ok:
-                self.retrieve_logs = True
-                self.logger.error(f'Test failed with exception: {self.failureException}')
+            self.retrieve_logs = True
+            self.logger.error(f'Test failed with exception: {self.failureException}')
 
         if self.engine_handler and self.uuid:
-            self.engine_handler.stop_engine(retrieve_logs=self.retrieve_logs, uuid=self.uuid)
-            self.remove_nuvlaedge_from_nuvla()
+            # Engines of failed tests are not trusted by the following ones, and those of
+            # skipped tests may never have been installed
+            if ok and self.shares_engine and self.commissioned:
+                self.release_shared_engine()
+            else:
+                self.dispose_engine(self.engine_handler, self.uuid, self.retrieve_logs,
+                                    cte.ENGINE_LOGS_RESULTS_PATH / self.results_folder / self.id())
+
+        self.logger.info(f'Nuvla resource cache: {self.nuvla_cache.report()}')